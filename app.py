@@ -1,168 +1,560 @@
-import os
-import json
-import logging
-import re
-from logging.handlers import RotatingFileHandler
-from flask import Flask, request, jsonify, render_template
-from modules import search_epub
-
-# ------------------------------------------
-# 常數與目錄設定
-# ------------------------------------------
-UPDATE_DATE = '2025/05/04'
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-CACHE_DIR = os.path.join(BASE_DIR, 'cache')
-EPUB_DIR = os.path.join(BASE_DIR, 'epubs')
-# 確保 cache 目錄存在
-os.makedirs(CACHE_DIR, exist_ok=True)
-
-# ------------------------------------------
-# Flask 應用與 Logger 設定
-# ------------------------------------------
-app = Flask(__name__)
-logger = logging.getLogger('app')
-logger.setLevel(logging.INFO)
-
-# Console Handler
-ch = logging.StreamHandler()
-ch.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
-logger.addHandler(ch)
-
-# File Handler（輪替）
-LOG_DIR = os.path.join(BASE_DIR, 'logs')
-os.makedirs(LOG_DIR, exist_ok=True)
-fh = RotatingFileHandler(os.path.join(LOG_DIR, 'app.log'), maxBytes=5*1024*1024, backupCount=3, encoding='utf-8')
-fh.setFormatter(ch.formatter)
-logger.addHandler(fh)
-
-# ------------------------------------------
-# 工具函式：移除重疊段落
-# ------------------------------------------
-def remove_overlap(prev: str, curr: str, keyword: str) -> str:
-    """
-    移除 prev 與 curr 之間的重疊片段，僅在 curr 前段(直到第一個 keyword 出現之前)完全與 prev 結尾重複時才去除，
-    確保關鍵字本身及其之後的內容完整保留。
-    """
-    # 找到 curr 中首個 keyword 的位置
-    first_idx = curr.find(keyword)
-    # 若首個 keyword 不在開頭，且 prev 結尾包含 curr[:first_idx]
-    if first_idx > 0 and prev.endswith(curr[:first_idx]):
-        # 移除從開頭到關鍵字之前的重疊部分
-        return curr[first_idx:]
-    # 否則完整返回 curr
-    return curr
-
-# ------------------------------------------
-# 載入 titles.json
-# ------------------------------------------
-titles_path = os.path.join(BASE_DIR, 'titles', 'titles.json')
-try:
-    with open(titles_path, 'r', encoding='utf-8') as f:
-        full_data = json.load(f)
-    # 判斷結構
-    if isinstance(full_data, dict) and full_data:
-        if len(full_data) == 1 and isinstance(list(full_data.values())[0], dict):
-            books_dict = list(full_data.values())[0]
-        else:
-            books_dict = full_data
-    else:
-        raise ValueError('titles.json 格式不正確')
-    logger.info('成功載入 titles.json，條目數：%d', len(books_dict))
-except Exception as e:
-    logger.error('讀取 titles.json 失敗：%s', e)
-    raise RuntimeError('初始化失敗：無法載入 titles.json')
-
-# ------------------------------------------
-# 首頁路由：使用模板
-# ------------------------------------------
-@app.route('/', methods=['GET'])
-def index():
-    logger.info('Render index.html，update_date=%s', UPDATE_DATE)
-    return render_template('index.html', update_date=UPDATE_DATE)
-
-# ------------------------------------------
-# AJAX 路由：關鍵字搜尋
-# ------------------------------------------
-@app.route('/search_ajax', methods=['POST'])
-def search_ajax():
-    keyword = request.form.get('keyword', '').strip()
-    if not keyword:
-        return jsonify({'error': '請輸入關鍵字'})
-    # 安全化檔名
-    safe_kw = search_epub.sanitize_filename(keyword)
-    cache_file = os.path.join(CACHE_DIR, f'{safe_kw}.json')
-    logger.info('搜尋關鍵字：%s，cache 檔案：%s', keyword, cache_file)
-
-    results = None
-    # 嘗試讀取快取
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                results = json.load(f)
-            logger.info('使用快取結果')
-        except Exception as e:
-            logger.warning('讀取快取失敗，移除檔案：%s', e)
-            os.remove(cache_file)
-    # 若無快取或讀取失敗，重新搜尋
-    if results is None:
-        epub_list = [os.path.join(EPUB_DIR, fn) for fn in os.listdir(EPUB_DIR) if fn.endswith('.epub')]
-        results = search_epub.search_wildcard_multiple_epubs_stat(epub_list, keyword, logger)
-        try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
-            logger.info('已儲存搜尋結果至快取')
-        except Exception as e:
-            logger.error('寫入快取失敗：%s', e)
-
-    # 轉換結果
-    transformed = {}
-    for key, value in results.items():
-        if key == '_stat_':
-            continue
-        entry = {}
-        entry['book_key'] = key
-        # 判斷經號對應書名
-        note, title = '', key
-        if key in books_dict and isinstance(books_dict[key], list) and len(books_dict[key]) >= 2:
-            note, title = books_dict[key][0], books_dict[key][1]
-        entry['note'] = note
-        entry['title'] = title
-        entry['count'] = value.get('total', 0)
-       # 收集段落
-        paras = []
-        for lst in value.get('sentences', {}).values():
-            paras.extend(lst)
-
-        # 去重：用 set + 簡易標準化
-        seen = set()
-        dedup = []
-        for p in paras:
-            # 標準化：壓縮多重空白、去除頭尾空格
-            norm = re.sub(r'\s+', ' ', p.strip())
-            if norm not in seen:
-                seen.add(norm)
-                dedup.append(p)
-        # 處理重疊
-        processed = []
-        prev = None
-        for p in dedup:
-            occ = [m.start() for m in re.finditer(re.escape(keyword), p)]
-            if len(occ) < 2 or prev is None:
-                processed.append(p)
-            else:
-                trimmed = remove_overlap(prev, p, keyword)
-                if trimmed.strip():
-                    processed.append(trimmed)
-            prev = p
-        entry['paragraphs'] = processed
-        entry['pages'] = value.get('pages', {})
-        transformed[key] = entry
-
-    return jsonify({'data': transformed})
-
-# ------------------------------------------
-# 啟動伺服器
-# ------------------------------------------
-if __name__ == '__main__':
-    logger.info('啟動 Flask 伺服器：0.0.0.0:5000')
-    app.run(host='0.0.0.0', port=5000, debug=False)
+import time
+# 啟動耗時 (import 與初始化) 由此起算
+STARTUP_T0 = time.perf_counter()
+import os
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+from flask import Flask, Response, request, jsonify, render_template
+from modules import search_epub
+from modules import corpus_store
+from modules import http_compress
+from modules import metrics
+from modules import request_profiler
+from modules import result_transform
+from modules import search_scope
+from modules import title_map
+from modules import result_cache as result_cache_mod
+from modules.result_cache import ResultCache
+from modules.single_flight import SingleFlight
+
+# ------------------------------------------
+# 常數與目錄設定
+# ------------------------------------------
+UPDATE_DATE = '2025/05/04'
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 結果快取與 log 的目錄可由環境變數改用其他位置 (例如 benchmark 的暫存複本，不改動專案內的檔案)
+CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or os.path.join(BASE_DIR, 'cache')
+EPUB_DIR = os.path.join(BASE_DIR, 'epubs')
+# 搜尋模式與 snippet 參數 (納入快取鍵，參數不同的結果不會互相覆用)
+SEARCH_MODE = 'wildcard'
+SEARCH_PARAMS = {'default_len': 60}
+# 設為 1 時，啟動時就把所有 epub 載入記憶體 (否則在第一次搜尋時才逐本載入)
+CORPUS_PRELOAD = os.environ.get('CORPUS_PRELOAD', '0') == '1'
+# 設為 1 時，以背景執行緒監看 epub 目錄：epub 變動時重新解析、重建索引，並只更新受影響的快取結果
+# (多個 worker 行程時，只應在其中一個啟用)
+CORPUS_WATCH = os.environ.get('CORPUS_WATCH', '0') == '1'
+# 確保 cache 目錄存在
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+# ------------------------------------------
+# Flask 應用與 Logger 設定
+# ------------------------------------------
+app = Flask(__name__)
+logger = logging.getLogger('app')
+logger.setLevel(logging.INFO)
+
+# Console Handler
+ch = logging.StreamHandler()
+ch.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+logger.addHandler(ch)
+
+# File Handler（輪替）
+LOG_DIR = os.environ.get('APP_LOG_DIR') or os.path.join(BASE_DIR, 'logs')
+os.makedirs(LOG_DIR, exist_ok=True)
+fh = RotatingFileHandler(os.path.join(LOG_DIR, 'app.log'), maxBytes=5*1024*1024, backupCount=3, encoding='utf-8')
+fh.setFormatter(ch.formatter)
+logger.addHandler(fh)
+
+# 每個 request 的各階段耗時 (搜尋路徑寫入 log)，並提供 Prometheus 格式的 /metrics
+# (須在 http_compress 之前註冊：after_request 依註冊的相反順序執行，回應壓縮也計入耗時)
+metrics.init_app(app, logger, gauges=lambda: metrics_gauges(),
+                 paths={'/search_ajax', '/search_summary', '/search_paragraphs', '/search_stream'})
+
+# 依 Accept-Encoding 以 gzip / brotli 壓縮回應
+http_compress.init_app(app, logger)
+
+# ------------------------------------------
+# 工具函式：將一本經的 (已轉換) 結果加上書名，成為前端使用的格式
+# ------------------------------------------
+def transform_entry(key: str, value: dict, offsets: bool = False) -> dict:
+    """
+    將單一經號的結果轉換成前端顯示用的 entry：對應書名並附上段落。
+    value 為 result_transform.transform_book 的結果 (段落已於搜尋時去除重複與重疊)。
+    offsets 為 True 時附上 paragraph_spans (每段的高亮範圍；結果中沒有時為 None，由前端自行比對)。
+    """
+    entry = {}
+    entry['book_key'] = key
+    # 判斷經號對應書名
+    note, title = '', key
+    if key in books_dict and isinstance(books_dict[key], list) and len(books_dict[key]) >= 2:
+        note, title = books_dict[key][0], books_dict[key][1]
+    entry['note'] = note
+    entry['title'] = title
+    entry['count'] = value.get('total', 0)
+    entry['paragraphs'] = value.get('paragraphs', [])
+    entry['pages'] = value.get('pages', {})
+    if offsets:
+        entry['paragraph_spans'] = value.get('paragraph_spans')
+    return entry
+
+# ------------------------------------------
+# 載入 titles.json (由預先編譯的 titles.pkl 讀取，titles.json 較新時才重新編譯)
+# titles_body 為精簡格式使用的書名表 {經號: [note, 書名]}，由 /titles 一次提供給前端
+# ------------------------------------------
+titles_path = os.path.join(BASE_DIR, 'titles', 'titles.json')
+try:
+    books_dict, titles_body = title_map.load_titles(titles_path, logger=logger)
+    logger.info('成功載入 titles.json，條目數：%d', len(books_dict))
+except Exception as e:
+    logger.error('讀取 titles.json 失敗：%s', e)
+    raise RuntimeError('初始化失敗：無法載入 titles.json')
+
+# ------------------------------------------
+# 搜尋結果快取 (有容量上限，epub 變動後自動失效；啟用語料庫監看時改由監看只更新受影響的結果)
+# ------------------------------------------
+result_cache = ResultCache(CACHE_DIR, EPUB_DIR, logger=logger, check_corpus=not CORPUS_WATCH)
+logger.info('搜尋結果快取：%d 筆', result_cache.stats()['entries'])
+# 相同快取鍵的並行冷搜尋只執行一次，其餘 request 等待並共用結果
+search_flights = SingleFlight()
+
+
+def all_epubs():
+    return [os.path.join(EPUB_DIR, fn) for fn in os.listdir(EPUB_DIR) if fn.endswith('.epub')]
+
+
+def search_params(scope=None):
+    """快取鍵與快取記錄使用的搜尋參數；指定搜尋範圍時納入範圍，與全語料庫的結果分開快取。"""
+    return dict(SEARCH_PARAMS, scope=scope) if scope else SEARCH_PARAMS
+
+
+def request_scope_key(keyword):
+    """由 request 的 scope 參數取得 (搜尋範圍, 快取鍵)；scope 格式錯誤時 raise ValueError。"""
+    scope = search_scope.parse_scope(request.form.get('scope', ''))
+    return scope, result_cache_mod.make_key(keyword, SEARCH_MODE, search_params(scope))
+
+
+def store_results(cache_key, results, keyword, scope=None):
+    """將已轉換的結果寫入快取，回傳結果檔的世代 (寫入失敗只記錄錯誤並回傳 None，不影響回應)。"""
+    try:
+        generation = result_cache.put(cache_key, results, keyword, SEARCH_MODE, search_params(scope),
+                                      fmt=result_transform.FORMAT)
+        logger.info('已儲存搜尋結果至快取')
+        return generation
+    except Exception as e:
+        logger.error('寫入快取失敗：%s', e)
+        return None
+
+
+def load_cached(keyword, cache_key, scope=None):
+    """
+    讀取快取中已轉換的結果，回傳 (結果, 結果檔的世代)；沒有快取時回傳 (None, None)。
+    舊格式 (原始搜尋結果) 的快取在第一次讀取時轉換並寫回，之後的命中只需讀取。
+    """
+    cached = result_cache.get_entry(cache_key)
+    if cached is None:
+        return None, None
+    results = cached['result']
+    generation = cached['generation']
+    if cached['format'] != result_transform.FORMAT:
+        with metrics.stage('transform'):
+            results = result_transform.transform_results(results, keyword)
+        generation = store_results(cache_key, results, keyword, scope)
+    return results, generation
+
+
+def search_and_cache(keyword, cache_key, scope=None):
+    """
+    執行搜尋 (全語料庫，或只搜尋 scope 範圍內的經)、轉換段落並寫入快取 (由 single-flight 的 leader 呼叫)。
+    進入前再檢查一次快取，避免剛完成的另一個 leader 的結果被重算。回傳 (結果, 結果檔的世代)。
+    """
+    results, generation = load_cached(keyword, cache_key, scope)
+    if results is not None:
+        return results, generation
+    results = run_search(keyword, scope)
+    return results, store_results(cache_key, results, keyword, scope)
+
+
+def run_search(keyword, scope=None):
+    """不經快取，搜尋全語料庫 (或 scope 範圍內的經) 並轉換段落。"""
+    epub_list = search_scope.filter_epubs(all_epubs(), scope, books_dict)
+    # 同時記錄每段的高亮範圍 (paragraph_spans)，前端不需再以 regex 重新比對
+    results = search_epub.search_wildcard_multiple_epubs_stat(
+        epub_list, keyword, logger, default_len=SEARCH_PARAMS['default_len'], with_offsets=True)
+    with metrics.stage('transform'):
+        results = result_transform.transform_results(results, keyword)
+    return results
+
+# ------------------------------------------
+# 預先載入語料庫、監看 epub 目錄 (選用)
+# ------------------------------------------
+if CORPUS_PRELOAD:
+    corpus_store.preload(all_epubs(), logger)
+if CORPUS_WATCH:
+    # 監看模組 (與其使用的 multi_search、n-gram 索引等) 只在啟用時才載入，不拖慢一般 worker 的啟動
+    from modules import corpus_watcher
+    corpus_watcher.start(result_cache, EPUB_DIR, logger=logger)
+
+
+def record_cache(result):
+    """記錄這次 request 的快取結果：hit (結果快取)、response (預先壓縮的回應)、shared (共用並行搜尋)、miss。"""
+    metrics.note('cache', result)
+    metrics.inc('search_cache_total', result=result)
+
+
+def get_results(keyword, cache_key, scope=None):
+    """
+    取得關鍵字的搜尋結果：先讀快取，沒有快取時才搜尋 (並行的相同查詢共用同一次搜尋)。
+    回傳 (結果, 結果檔的世代)；世代用來確認預先壓縮的回應是由目前快取中的結果產生 (見 cached_json_response)。
+    """
+    # 嘗試讀取快取
+    results, generation = load_cached(keyword, cache_key, scope)
+    if results is not None:
+        logger.info('使用快取結果')
+        record_cache('hit')
+    # 若無快取或讀取失敗，重新搜尋
+    else:
+        (results, generation), shared = search_flights.do(
+            cache_key, lambda: search_and_cache(keyword, cache_key, scope))
+        if shared:
+            logger.info('共用並行中的相同搜尋結果')
+        record_cache('shared' if shared else 'miss')
+    return results, generation
+
+
+def json_bytes(obj):
+    """精簡 JSON (不跳脫中文、鍵排序與 jsonify 相同)。"""
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def cached_json_response(cache_key, variant, build):
+    """
+    回傳 JSON 回應，並把壓縮後的 body 存入結果快取 (variant 為回應格式名稱)；
+    之後相同的請求直接送出快取中的壓縮 bytes，不再讀取、轉換與編碼搜尋結果。
+    build() 回傳 (回應物件, 所用結果的世代)，只在快取中沒有此格式時才呼叫；
+    結果在產生回應期間已被改寫 (世代不同) 時不儲存，避免之後的請求收到舊結果的回應。
+    """
+    encoding = http_compress.choose_encoding(request.headers.get('Accept-Encoding', ''))
+    # 不接受壓縮的用戶端：由 gzip 快取解壓縮後送出
+    store_encoding = encoding or 'gzip'
+    data = result_cache.get_response(cache_key, variant, store_encoding)
+    if data is None:
+        obj, generation = build()
+        with metrics.stage('json'):
+            body = json_bytes(obj)
+        with metrics.stage('compress'):
+            data = http_compress.compress(body, store_encoding)
+        result_cache.put_response(cache_key, variant, store_encoding, data, generation)
+    else:
+        record_cache('response')
+        if encoding is None:
+            with metrics.stage('compress'):
+                body = http_compress.decompress(data, store_encoding)
+    if encoding is None:
+        return Response(body, mimetype='application/json')
+    response = Response(data, mimetype='application/json')
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+# 精簡格式 (format=compact)：每本經為一個陣列，欄位依 fields 排列；書名由 /titles 查詢
+COMPACT_FIELDS = ['book_key', 'count', 'pages', 'paragraphs']
+COMPACT_SUMMARY_FIELDS = ['book_key', 'count', 'pages', 'paragraph_count']
+
+
+def compact_fields(summary=False, offsets=False):
+    """精簡格式的欄位；offsets (含段落時) 另加 paragraph_spans。"""
+    if summary:
+        return COMPACT_SUMMARY_FIELDS
+    return COMPACT_FIELDS + ['paragraph_spans'] if offsets else COMPACT_FIELDS
+
+
+def compact_entry(entry, fields):
+    """將 entry 轉成陣列；pages 由 dict 改為 [[頁面名稱, 筆數], ...]。"""
+    return [[[page, n] for page, n in entry['pages'].items()] if f == 'pages' else entry[f] for f in fields]
+
+
+def summarize_entry(entry):
+    """只保留 entry 的摘要 (不含段落)，段落改由 /search_paragraphs 分頁取得。"""
+    summary = {k: v for k, v in entry.items() if k not in ('paragraphs', 'paragraph_spans')}
+    summary['paragraph_count'] = len(entry.get('paragraphs', []))
+    return summary
+
+# ------------------------------------------
+# 首頁路由：使用模板
+# ------------------------------------------
+@app.route('/', methods=['GET'])
+def index():
+    logger.info('Render index.html，update_date=%s', UPDATE_DATE)
+    return render_template('index.html', update_date=UPDATE_DATE)
+
+# ------------------------------------------
+# AJAX 路由：關鍵字搜尋
+# ------------------------------------------
+@app.route('/search_ajax', methods=['POST'])
+def search_ajax():
+    # 正規化 (NFC) 後的關鍵字同時用於快取鍵與搜尋，確保兩者一致
+    keyword = result_cache_mod.normalize_query(request.form.get('keyword', ''))
+    if not keyword:
+        return jsonify({'error': '請輸入關鍵字'})
+    # 由查詢、搜尋參數與搜尋範圍 (scope) 計算快取鍵
+    try:
+        scope, cache_key = request_scope_key(keyword)
+    except ValueError as e:
+        return jsonify({'error': str(e)})
+    logger.info('搜尋關鍵字：%s，cache 檔案：%s', keyword, result_cache.path_for(cache_key))
+    compact = request.form.get('format') == 'compact'
+    # offsets=1 時每本經附上 paragraph_spans (每段的高亮範圍)
+    offsets = request.form.get('offsets') == '1'
+
+    def build(profiled=False):
+        if profiled:
+            results, generation = run_search(keyword, scope), None
+        else:
+            results, generation = get_results(keyword, cache_key, scope)
+        # 轉換結果
+        transformed = {}
+        for key, value in results.items():
+            if key == '_stat_':
+                continue
+            transformed[key] = transform_entry(key, value, offsets)
+        if compact:
+            fields = compact_fields(offsets=offsets)
+            rows = [compact_entry(transformed[key], fields) for key in sorted(transformed)]
+            return {'format': 'compact', 'fields': fields, 'data': rows}, generation
+        return {'data': transformed}, generation
+
+    # 帶有 X-Profile 標頭 (或 profile 參數) 且與 PROFILE_TOKEN 相同時：略過快取，在 profiler 下重新搜尋一次，
+    # 報告存於 logs/profiles/，檔名由 X-Profile-Report 標頭傳回
+    if request_profiler.requested(request.headers, request.values):
+        body, report_path = request_profiler.run(
+            lambda: json_bytes(build(profiled=True)[0]), keyword, logger=logger,
+            extra=lambda: dict(metrics.snapshot(), scope=scope, compact=compact))
+        response = Response(body, mimetype='application/json')
+        response.headers['X-Profile-Report'] = os.path.basename(report_path)
+        return response
+    variant = ('full-compact' if compact else 'full') + ('-offsets' if offsets else '')
+    return cached_json_response(cache_key, variant, build)
+
+# ------------------------------------------
+# 摘要優先：先回傳各經的筆數與 _stat_，段落再依經號 / 頁面分批取得
+# ------------------------------------------
+# 每次最多回傳的段落數
+PARAGRAPH_PAGE_SIZE = 50
+PARAGRAPH_PAGE_MAX = 500
+
+
+@app.route('/search_summary', methods=['POST'])
+def search_summary():
+    keyword = result_cache_mod.normalize_query(request.form.get('keyword', ''))
+    if not keyword:
+        return jsonify({'error': '請輸入關鍵字'})
+    try:
+        scope, cache_key = request_scope_key(keyword)
+    except ValueError as e:
+        return jsonify({'error': str(e)})
+    logger.info('搜尋摘要：%s，cache 檔案：%s', keyword, result_cache.path_for(cache_key))
+    compact = request.form.get('format') == 'compact'
+
+    def build():
+        results, generation = get_results(keyword, cache_key, scope)
+        summary = {}
+        for key, value in results.items():
+            if key == '_stat_':
+                continue
+            summary[key] = summarize_entry(transform_entry(key, value))
+        stat = results.get('_stat_') or search_epub.compute_stat(results)
+        if compact:
+            fields = compact_fields(summary=True)
+            rows = [compact_entry(summary[key], fields) for key in sorted(summary)]
+            return {'format': 'compact', 'fields': fields, 'data': rows, 'stat': stat}, generation
+        return {'data': summary, 'stat': stat}, generation
+
+    return cached_json_response(cache_key, 'summary-compact' if compact else 'summary', build)
+
+
+@app.route('/search_paragraphs', methods=['POST'])
+def search_paragraphs():
+    """
+    分批取得一本經的段落：book (經號)、offset、limit，可選 page (只取某一卷)。
+    回傳 next_offset 供下一批使用；已無更多段落時為 null。
+    offsets=1 時另外回傳 spans (與 paragraphs 一一對應的高亮範圍；結果中沒有時為 null)。
+    """
+    keyword = result_cache_mod.normalize_query(request.form.get('keyword', ''))
+    book = request.form.get('book', '')
+    if not keyword or not book:
+        return jsonify({'error': '請輸入關鍵字與經號'})
+    try:
+        offset = max(0, int(request.form.get('offset', 0)))
+        limit = min(PARAGRAPH_PAGE_MAX, max(1, int(request.form.get('limit', PARAGRAPH_PAGE_SIZE))))
+    except ValueError:
+        return jsonify({'error': 'offset / limit 格式不正確'})
+    page = request.form.get('page')
+    offsets = request.form.get('offsets') == '1'
+    try:
+        scope, cache_key = request_scope_key(keyword)
+    except ValueError as e:
+        return jsonify({'error': str(e)})
+
+    value = get_results(keyword, cache_key, scope)[0].get(book)
+    if value is None or book == '_stat_':
+        response = {'book': book, 'total': 0, 'offset': offset, 'paragraphs': [], 'next_offset': None}
+        if offsets:
+            response['spans'] = []
+        return jsonify(response)
+    paragraphs = value.get('paragraphs', [])
+    spans = value.get('paragraph_spans')
+    if page:
+        # 只取指定卷的段落
+        paragraph_pages = value.get('paragraph_pages', [])
+        paragraphs = [p for p, pg in zip(paragraphs, paragraph_pages) if pg == page]
+        if spans is not None:
+            spans = [sp for sp, pg in zip(spans, paragraph_pages) if pg == page]
+    chunk = paragraphs[offset:offset + limit]
+    next_offset = offset + len(chunk) if offset + len(chunk) < len(paragraphs) else None
+    response = {'book': book, 'page': page, 'total': len(paragraphs), 'offset': offset,
+                'paragraphs': chunk, 'next_offset': next_offset}
+    if offsets:
+        response['spans'] = spans[offset:offset + limit] if spans is not None else None
+    return jsonify(response)
+
+# ------------------------------------------
+# 串流搜尋：每找到一本經就立即送出 (NDJSON，一行一筆)
+# ------------------------------------------
+def ndjson_line(record):
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def prepend_line(line, body):
+    """在串流前加上一行；以 yield from 轉接，用戶端斷線時 close() 會傳到 body。"""
+    yield line
+    yield from body
+
+
+def entry_renderer(summary=False, compact=False, offsets=False):
+    """回傳將一本經的結果轉成 NDJSON 行的函式 (依 summary / compact / offsets 決定內容)。"""
+    fields = compact_fields(summary, offsets)
+
+    def render(key, value):
+        entry = transform_entry(key, value, offsets and not summary)
+        if summary:
+            entry = summarize_entry(entry)
+        if compact:
+            return ndjson_line({'type': 'entry', 'key': key, 'row': compact_entry(entry, fields)})
+        return ndjson_line({'type': 'entry', 'key': key, 'entry': entry})
+    return render
+
+
+def stream_results(results, render):
+    """依序送出已完成 (快取或共用) 的搜尋結果。"""
+    for key, value in results.items():
+        if key == '_stat_':
+            continue
+        yield render(key, value)
+    yield ndjson_line({'type': 'stat', 'stat': results.get('_stat_') or search_epub.compute_stat(results)})
+
+
+def stream_search(keyword, cache_key, render, scope=None):
+    """
+    由 single-flight 的 leader 呼叫：邊搜尋邊送出每本經的結果，全部完成後寫入快取並喚醒等待者。
+    若用戶端中途斷線 (generator 被關閉)，以例外結束這次計算，等待者會改為自行搜尋。
+    """
+    call, is_leader = search_flights.begin(cache_key)
+    if not is_leader:
+        try:
+            results, _ = call.wait(search_flights.timeout)
+            logger.info('共用並行中的相同搜尋結果')
+            record_cache('shared')
+        except Exception:
+            (results, _), shared = search_flights.do(cache_key, lambda: search_and_cache(keyword, cache_key, scope))
+            record_cache('shared' if shared else 'miss')
+        yield from stream_results(results, render)
+        return
+
+    finished = False
+    try:
+        # 進入前再檢查一次快取，避免剛完成的另一個 leader 的結果被重算
+        results, generation = load_cached(keyword, cache_key, scope)
+        if results is None:
+            record_cache('miss')
+            results = {}
+            epub_list = search_scope.filter_epubs(all_epubs(), scope, books_dict)
+            for key, value in search_epub.iter_wildcard_multiple_epubs(
+                    epub_list, keyword, logger, default_len=SEARCH_PARAMS['default_len'], with_offsets=True):
+                with metrics.stage('transform'):
+                    results[key] = result_transform.transform_book(value, keyword)
+                yield render(key, results[key])
+            results['_stat_'] = search_epub.compute_stat(results)
+            generation = store_results(cache_key, results, keyword, scope)
+            # 與 search_and_cache 相同，等待者取得 (結果, 世代)
+            search_flights.finish(cache_key, call, result=(results, generation))
+            finished = True
+            yield ndjson_line({'type': 'stat', 'stat': results['_stat_']})
+        else:
+            record_cache('hit')
+            search_flights.finish(cache_key, call, result=(results, generation))
+            finished = True
+            yield from stream_results(results, render)
+    finally:
+        if not finished:
+            search_flights.finish(cache_key, call, error=RuntimeError('串流搜尋未完成'))
+
+
+@app.route('/search_stream', methods=['POST'])
+def search_stream():
+    keyword = result_cache_mod.normalize_query(request.form.get('keyword', ''))
+    if not keyword:
+        return jsonify({'error': '請輸入關鍵字'})
+    try:
+        scope, cache_key = request_scope_key(keyword)
+    except ValueError as e:
+        return jsonify({'error': str(e)})
+    # summary=1 時只送出各經的摘要，段落由 /search_paragraphs 分批取得
+    summary = request.form.get('summary') == '1'
+    # format=compact 時先送出 {"type": "fields"}，之後每本經以 "row" 陣列表示
+    compact = request.form.get('format') == 'compact'
+    # offsets=1 時 (不是 summary) 每本經附上 paragraph_spans
+    offsets = request.form.get('offsets') == '1'
+    render = entry_renderer(summary, compact, offsets)
+    logger.info('串流搜尋關鍵字：%s，cache 檔案：%s', keyword, result_cache.path_for(cache_key))
+
+    results, _ = load_cached(keyword, cache_key, scope)
+    if results is not None:
+        logger.info('使用快取結果')
+        record_cache('hit')
+        body = stream_results(results, render)
+    else:
+        body = stream_search(keyword, cache_key, render, scope)
+    if compact:
+        body = prepend_line(ndjson_line({'type': 'fields', 'fields': compact_fields(summary, offsets)}), body)
+    # X-Accel-Buffering: 避免 nginx 等反向代理把整個回應緩衝後才送出
+    return Response(body, mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+# ------------------------------------------
+# 書名表：精簡格式的結果只含經號，書名由前端以此表查詢 (只需下載一次)
+# ------------------------------------------
+@app.route('/titles', methods=['GET'])
+def titles():
+    response = Response(titles_body, mimetype='application/json')
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    response.add_etag()
+    return response.make_conditional(request)
+
+# ------------------------------------------
+# 快取統計：命中 / 未命中 / 移除次數等，用來調整容量設定
+# ------------------------------------------
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({'result_cache': result_cache.stats(), 'corpus_store': corpus_store.stats(),
+                    'corpus_watcher': corpus_watcher.stats() if CORPUS_WATCH else {'running': False}})
+
+
+def metrics_gauges():
+    """/metrics 額外輸出的 gauges：啟動耗時、結果快取與常駐語料庫的統計數字。"""
+    gauges = {'startup_seconds': round(STARTUP_SECONDS, 4)}
+    for prefix, stats in (('result_cache', result_cache.stats()), ('corpus_store', corpus_store.stats())):
+        for name, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges[f'{prefix}_{name}'] = value
+    return gauges
+
+# 啟動耗時：import 與初始化 (不含 Python 直譯器本身的啟動；完整的冷啟動見 python -m modules.benchmark --scenarios startup)
+STARTUP_SECONDS = time.perf_counter() - STARTUP_T0
+logger.info('啟動完成：%.1f ms', STARTUP_SECONDS * 1000)
+
+# ------------------------------------------
+# 啟動伺服器
+# ------------------------------------------
+if __name__ == '__main__':
+    logger.info('啟動 Flask 伺服器：0.0.0.0:5000')
+    app.run(host='0.0.0.0', port=5000, debug=False)
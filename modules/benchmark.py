@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import tempfile
+import contextlib
+import platform
+import argparse
+import subprocess
+
+# resource 只在 Unix 上提供；沒有時不記錄 peak RSS
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 同時支援以套件 (modules.benchmark) 或直接由 modules 目錄匯入
+if __package__:
+    from . import search_epub, corpus_store, result_transform
+    from .result_cache import ResultCache
+else:
+    import search_epub
+    import corpus_store
+    import result_transform
+    from result_cache import ResultCache
+
+
+# 模組與專案目錄設定
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(MODULE_DIR)
+EPUB_DIR = os.path.join(PROJECT_ROOT, "epubs")
+CACHE_DIR = os.path.join(PROJECT_ROOT, "cache")
+TERMS_PATH = os.path.join(CACHE_DIR, "all_words.json")
+OUTPUT_DIR = os.path.join(PROJECT_ROOT, "logs", "benchmarks")
+# 所有情境 (依執行順序)
+SCENARIOS = ("cold_parse", "warm_load", "literal_search", "wildcard_search", "transform", "cache_hit", "startup")
+# startup 情境重複啟動的次數
+STARTUP_RUNS = 5
+# 需要結果快取暫存複本的情境 (會 import app，寫入預先壓縮的回應、中繼資料與 log)
+APP_SCENARIOS = ("cache_hit", "startup")
+
+
+def peak_rss_mb():
+    """目前行程的 peak RSS (MB)；無法取得時回傳 None。"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位為 KB，macOS 為 bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(sorted_values, p):
+    """nearest-rank 百分位數 (sorted_values 須已排序)。"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(p / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, items=None):
+    """
+    將每次操作的耗時 (秒) 統計成 p50 / p95 / p99 / 平均 (毫秒) 與吞吐量 (每秒操作數)。
+    items 為處理的項目總數 (例如書本數)，有提供時另外計算每秒項目數。
+    """
+    values = sorted(latencies)
+    total = sum(values)
+    stats = {
+        "count": len(values),
+        "total_s": round(total, 3),
+        "mean_ms": round(total / len(values) * 1000, 3) if values else None,
+        "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None,
+        "throughput_per_s": round(len(values) / total, 2) if total else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    for p in (50, 95, 99):
+        v = percentile(values, p)
+        stats[f"p{p}_ms"] = round(v * 1000, 3) if v is not None else None
+    if values:
+        stats["max_ms"] = round(values[-1] * 1000, 3)
+    if items is not None and total:
+        stats["items_per_s"] = round(items / total, 2)
+    return stats
+
+
+def _timed(fn, args_list):
+    latencies = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def pick_queries(terms_path, cache_dir, epub_dir, count, seed):
+    """
+    由名相清單與快取中的查詢挑選測試用關鍵字 (以 seed 固定抽樣，結果可重現)：
+    - literal: 不含 '*' 的名相
+    - wildcard: 名相清單中含 '*' 者，加上由名相產生的 "*名相**" 與 "首字*其餘" 形式
+    - cached: 結果快取中已有的查詢 (測試快取命中的 request 路徑)
+    """
+    rng = random.Random(seed)
+    with open(terms_path, "r", encoding="utf-8") as f:
+        terms = [t for t in json.load(f) if isinstance(t, str) and t.strip()]
+    literal_pool = sorted(t for t in terms if "*" not in t)
+    literal = rng.sample(literal_pool, min(count, len(literal_pool)))
+    wildcard = sorted(t for t in terms if "*" in t)
+    for t in rng.sample(literal_pool, min(count, len(literal_pool))):
+        if len(wildcard) >= count:
+            break
+        wildcard.append(f"*{t}**" if len(t) < 3 or rng.random() < 0.5 else f"{t[0]}*{t[2:]}")
+    # 只讀取：不寫回中繼資料，也不納入或移除任何檔案
+    cache = ResultCache(cache_dir, epub_dir, read_only=True)
+    cached = []
+    for key in cache.keys():
+        info = cache.describe(key)
+        if info is not None and info["mode"] == "wildcard" and info["params"] == {"default_len": 60}:
+            cached.append(info["query"])
+    cached = rng.sample(sorted(cached), min(count, len(cached)))
+    return {"literal": literal, "wildcard": wildcard[:count], "cached": cached}
+
+
+@contextlib.contextmanager
+def sandbox(cache_dir, copy_results=True, logger=None):
+    """
+    在暫存目錄中複製 .cache_epub (解析快取) 與 cache_dir (結果快取)，執行期間改用複本，結束後刪除：
+    - search_epub.CACHE_DIR 與環境變數 EPUB_CACHE_DIR (ProcessPool 的子行程)
+    - 環境變數 RESULT_CACHE_DIR、APP_LOG_DIR (import app 的 cache_hit / startup)
+    benchmark 因此不會改寫專案內的檔案 (cold_parse 重寫解析快取、cache_hit 寫入回應檔等)。
+    copy_results 為 False 時不複製結果快取 (沒有要 import app 的情境)。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    tmp_dir = tempfile.mkdtemp(prefix="benchmark-")
+    epub_cache = os.path.join(tmp_dir, ".cache_epub")
+    result_cache = os.path.join(tmp_dir, "cache")
+    if os.path.isdir(search_epub.CACHE_DIR):
+        shutil.copytree(search_epub.CACHE_DIR, epub_cache)
+    if copy_results:
+        shutil.copytree(cache_dir, result_cache, ignore=shutil.ignore_patterns(".manifest.lock", "*.tmp"))
+    logger.info(f"benchmark 使用暫存複本：{tmp_dir}")
+    saved_dir = search_epub.CACHE_DIR
+    overrides = {"EPUB_CACHE_DIR": epub_cache, "RESULT_CACHE_DIR": result_cache,
+                 "APP_LOG_DIR": os.path.join(tmp_dir, "logs")}
+    saved_env = {name: os.environ.get(name) for name in overrides}
+    search_epub.CACHE_DIR = epub_cache
+    os.environ.update(overrides)
+    try:
+        yield tmp_dir
+    finally:
+        search_epub.CACHE_DIR = saved_dir
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run(scenarios=SCENARIOS, epub_dir=EPUB_DIR, cache_dir=CACHE_DIR, terms_path=TERMS_PATH,
+        queries=20, books=None, seed=0, logger=None):
+    """
+    在實際的 epubs/ 語料庫上執行各情境，回傳結果 dict (解析快取與結果快取都使用 sandbox() 的暫存複本)：
+    - cold_parse: load_epub(ignore_cache=True) 重新解析 epub (重寫的是暫存複本中的解析快取)
+    - warm_load: 由 .cache_epub 讀取解析快取 (pickle)
+    - literal_search: search_multiple_epubs_stat 搜尋一般關鍵字
+    - wildcard_search: search_wildcard_multiple_epubs_stat 搜尋萬用字元關鍵字
+    - transform: 搜尋結果轉換成顯示用段落 (result_transform.transform_results)
+    - cache_hit: 對 /search_ajax 送出已快取的查詢 (Flask test client，含 JSON / 壓縮回應)
+    - startup: 以新的 Python 行程 import app (直譯器啟動 + import + 初始化)，重複 STARTUP_RUNS 次
+    books 限制參與的 epub 數 (依檔名排序取前幾本)，None 表示全部。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    epub_paths = sorted(os.path.join(epub_dir, fn) for fn in os.listdir(epub_dir) if fn.endswith(".epub"))
+    if books:
+        epub_paths = epub_paths[:books]
+    picked = pick_queries(terms_path, cache_dir, epub_dir, queries, seed)
+    copy_results = any(name in APP_SCENARIOS for name in scenarios)
+    with sandbox(cache_dir, copy_results=copy_results, logger=logger):
+        report = _run_scenarios(scenarios, epub_paths, picked, queries, seed, logger)
+    return report
+
+
+def _run_scenarios(scenarios, epub_paths, picked, queries, seed, logger):
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "books": len(epub_paths),
+            "queries": queries,
+            "seed": seed,
+            "search_workers": search_epub.SEARCH_WORKERS,
+        },
+        "queries": picked,
+        "scenarios": {},
+    }
+    results_for_transform = []
+
+    for name in scenarios:
+        logger.info(f"執行情境：{name}")
+        if name == "cold_parse":
+            latencies = _timed(lambda p: search_epub.load_epub(p, logger=logger, ignore_cache=True, clean=True),
+                               [(p,) for p in epub_paths])
+            stats = summarize(latencies, items=len(epub_paths))
+        elif name == "warm_load":
+            latencies = _timed(lambda p: search_epub.load_epub(p, logger=logger, clean=True),
+                               [(p,) for p in epub_paths])
+            stats = summarize(latencies, items=len(epub_paths))
+        elif name == "literal_search":
+            # 先讓語料庫常駐記憶體，只量測搜尋本身
+            corpus_store.preload(epub_paths, logger=logger)
+            latencies = _timed(lambda kw: search_epub.search_multiple_epubs_stat(epub_paths, kw, logger),
+                               [(kw,) for kw in picked["literal"]])
+            stats = summarize(latencies, items=len(epub_paths) * len(latencies))
+        elif name == "wildcard_search":
+            corpus_store.preload(epub_paths, logger=logger)
+            latencies = []
+            for kw in picked["wildcard"]:
+                t0 = time.perf_counter()
+                results = search_epub.search_wildcard_multiple_epubs_stat(epub_paths, kw, logger)
+                latencies.append(time.perf_counter() - t0)
+                results_for_transform.append((results, kw))
+            stats = summarize(latencies, items=len(epub_paths) * len(latencies))
+        elif name == "transform":
+            if not results_for_transform:
+                results_for_transform = [
+                    (search_epub.search_wildcard_multiple_epubs_stat(epub_paths, kw, logger), kw)
+                    for kw in picked["literal"]]
+            latencies = _timed(result_transform.transform_results, results_for_transform)
+            stats = summarize(latencies)
+        elif name == "cache_hit":
+            stats = _cache_hit(picked["cached"], logger)
+        elif name == "startup":
+            stats = _startup(STARTUP_RUNS)
+        else:
+            raise ValueError(f"未知的情境：{name}")
+        report["scenarios"][name] = stats
+        logger.info(f"{name}：{stats}")
+    return report
+
+
+def _cache_hit(keywords, logger):
+    """以 Flask test client 對 /search_ajax 送出已快取的查詢；第一次請求會產生預先壓縮的回應，不列入統計。"""
+    sys.path.insert(0, PROJECT_ROOT)
+    from app import app
+    client = app.test_client()
+    headers = {"Accept-Encoding": "gzip"}
+    latencies = []
+    for kw in keywords:
+        client.post("/search_ajax", data={"keyword": kw}, headers=headers)
+        t0 = time.perf_counter()
+        r = client.post("/search_ajax", data={"keyword": kw}, headers=headers)
+        r.get_data()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies)
+
+
+def _startup(runs):
+    """在新的行程中 import app 並量測整體耗時 (第一次可能需要編譯 .pyc / 書名表，不列入統計)。"""
+    command = [sys.executable, "-c", "import app"]
+    subprocess.run(command, cwd=PROJECT_ROOT, capture_output=True, check=True)
+    latencies = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(command, cwd=PROJECT_ROOT, capture_output=True, check=True)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies)
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(old, new):
+    """比較兩次結果：回傳 {情境: {指標: 新值 / 舊值}} (小於 1 表示變快)。"""
+    ratios = {}
+    for name, stats in new["scenarios"].items():
+        before = old.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        ratios[name] = {
+            metric: round(stats[metric] / before[metric], 3)
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "mean_ms")
+            if stats.get(metric) and before.get(metric)
+        }
+    return ratios
+
+
+if __name__ == "__main__":
+    # 用法：python -m modules.benchmark [--scenarios a,b] [--queries N] [--books N] [--seed N] [--output 檔案] [--compare 舊結果]
+    parser = argparse.ArgumentParser(description="在 epubs/ 語料庫上量測解析、搜尋與快取命中的效能")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="要執行的情境 (逗號分隔)")
+    parser.add_argument("--queries", type=int, default=20, help="每個搜尋情境的關鍵字數")
+    parser.add_argument("--books", type=int, default=None, help="只使用前 N 本 epub")
+    parser.add_argument("--seed", type=int, default=0, help="抽樣關鍵字的亂數種子")
+    parser.add_argument("--output", default=None, help="結果 JSON 檔 (預設 logs/benchmarks/時間.json)")
+    parser.add_argument("--compare", default=None, help="與先前的結果 JSON 比較")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logger = logging.getLogger("benchmark")
+
+    report = run([s.strip() for s in args.scenarios.split(",") if s.strip()],
+                 queries=args.queries, books=args.books, seed=args.seed, logger=logger)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            report["compare"] = {"baseline": args.compare, "ratios": compare(json.load(f), report)}
+    output = args.output or os.path.join(OUTPUT_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps({"output": output, "scenarios": report["scenarios"], "compare": report.get("compare")},
+                     ensure_ascii=False, indent=2))
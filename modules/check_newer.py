@@ -1,65 +1,130 @@
-import os
-import json
-import hashlib
-import logging
-
-def get_file_md5(file_path):
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
-
-def check_newer(target_path, last_check_file, logger=None):
-    """
-    檢查目標路徑中的檔案是否有更新。
-    回傳一個包含已更新檔案的列表。
-    """
-    if logger is None:
-        logger = logging.getLogger(__name__)
-    logger.info(f"Checking the target_path = {target_path}")
-    
-    # 確認目標是檔案或目錄
-    if os.path.isfile(target_path):
-        files_to_check = [target_path]
-    else:
-        files_to_check = [os.path.join(root, file) for root, _, files in os.walk(target_path) for file in files]
-    logger.info(f"Total files to check: {len(files_to_check)}")
-
-    # 讀取上次檢查的結果
-    if os.path.exists(last_check_file):
-        with open(last_check_file, "r", encoding="utf-8") as f:
-            last_check_dict = json.load(f)
-    else:
-        last_check_dict = {}
-
-    # 檢查檔案是否有更新
-    changed_files = []
-    for file_path in files_to_check:
-        logger.info(f"checking the file: {file_path}")
-        file_stat = os.stat(file_path)
-        file_md5 = get_file_md5(file_path)
-        file_meta = {
-            'mtime': file_stat.st_mtime,
-            'md5': file_md5,
-            'size': file_stat.st_size
-        }
-        if file_path in last_check_dict:
-            if file_stat.st_mtime != last_check_dict[file_path]['mtime'] or \
-                    file_md5 != last_check_dict[file_path]['md5']:
-                changed_files.append(file_path)
-                last_check_dict[file_path] = file_meta
-                logger.info(f"File changed: {file_path}")
-            else:
-                logger.info(f"File not changed: {file_path}")
-        else:
-            changed_files.append(file_path)
-            last_check_dict[file_path] = file_meta
-            logger.info(f"New file detected: {file_path}")
-
-    # 將最新的 metadata 寫入 last_check_file
-    with open(last_check_file, "w", encoding="utf-8") as f:
-        json.dump(last_check_dict, f, indent=4, ensure_ascii=False)
-    return files_to_check, changed_files
-
-
+import os
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# xxhash 為選用套件 (非加密雜湊，比 md5 快很多)；未安裝時不提供 "xxhash"
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+# 讀檔計算雜湊時每次讀取的大小
+CHUNK_SIZE = 1024 * 1024
+# 平行計算雜湊的 thread 數 (hashlib 計算大區塊時會釋放 GIL，讀檔也是 I/O)
+CHECK_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+
+
+def _digest_factories():
+    """可用的雜湊方式：名稱 -> 建立雜湊物件的函式。名稱同時是檢查紀錄中存放雜湊值的欄位名稱。"""
+    factories = {
+        "md5": hashlib.md5,
+        "blake2b": lambda: hashlib.blake2b(digest_size=16),
+    }
+    if xxhash is not None:
+        factories["xxhash"] = xxhash.xxh3_128
+    return factories
+
+
+DIGESTS = _digest_factories()
+
+
+def get_file_digest(file_path, digest="md5"):
+    factory = DIGESTS.get(digest)
+    if factory is None:
+        raise ValueError(f"不支援的雜湊方式：{digest} (可用：{'、'.join(DIGESTS)})")
+    h = factory()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def get_file_md5(file_path):
+    return get_file_digest(file_path, "md5")
+
+
+def check_newer(target_path, last_check_file, logger=None, fast=False, digest="md5", workers=None):
+    """
+    檢查目標路徑中的檔案是否有更新。
+    回傳 (檢查的檔案列表, 已更新檔案的列表)。
+    - fast: 為 True 時，mtime 與大小都和上次相同的檔案直接視為未更新，不讀檔計算雜湊；
+      只有 stat 改變或新加入的檔案才計算雜湊 (預設 False：每個檔案都計算雜湊比對)。
+    - digest: 雜湊方式 ("md5"、"blake2b"，已安裝 xxhash 時可用 "xxhash")；
+      雜湊值存在檢查紀錄中同名的欄位，預設 "md5" 與舊的紀錄格式相同。
+    - workers: 平行計算雜湊的 thread 數。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    if digest not in DIGESTS:
+        raise ValueError(f"不支援的雜湊方式：{digest} (可用：{'、'.join(DIGESTS)})")
+    if workers is None:
+        workers = CHECK_WORKERS
+    logger.info(f"Checking the target_path = {target_path}")
+
+    # 確認目標是檔案或目錄
+    if os.path.isfile(target_path):
+        files_to_check = [target_path]
+    else:
+        files_to_check = [os.path.join(root, file) for root, _, files in os.walk(target_path) for file in files]
+    logger.info(f"Total files to check: {len(files_to_check)}")
+
+    # 讀取上次檢查的結果
+    if os.path.exists(last_check_file):
+        with open(last_check_file, "r", encoding="utf-8") as f:
+            last_check_dict = json.load(f)
+    else:
+        last_check_dict = {}
+
+    # 先以 stat 篩選需要計算雜湊的檔案
+    stats = {}
+    to_hash = []
+    for file_path in files_to_check:
+        file_stat = os.stat(file_path)
+        stats[file_path] = file_stat
+        last = last_check_dict.get(file_path)
+        if fast and last is not None and last.get(digest) is not None and \
+                file_stat.st_mtime == last['mtime'] and file_stat.st_size == last.get('size'):
+            logger.debug(f"File not changed (stat): {file_path}")
+            continue
+        to_hash.append(file_path)
+
+    # 平行計算雜湊
+    if workers > 1 and len(to_hash) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            digests = dict(zip(to_hash, executor.map(lambda p: get_file_digest(p, digest), to_hash)))
+    else:
+        digests = {p: get_file_digest(p, digest) for p in to_hash}
+
+    # 檢查檔案是否有更新
+    changed_files = []
+    for file_path in to_hash:
+        file_stat = stats[file_path]
+        file_digest = digests[file_path]
+        file_meta = {
+            'mtime': file_stat.st_mtime,
+            digest: file_digest,
+            'size': file_stat.st_size
+        }
+        last = last_check_dict.get(file_path)
+        if last is not None:
+            if file_stat.st_mtime != last['mtime'] or file_digest != last.get(digest, file_digest):
+                changed_files.append(file_path)
+                last_check_dict[file_path] = file_meta
+                logger.debug(f"File changed: {file_path}")
+            else:
+                # 改用其他雜湊方式時，補上該欄位
+                last[digest] = file_digest
+                logger.debug(f"File not changed: {file_path}")
+        else:
+            changed_files.append(file_path)
+            last_check_dict[file_path] = file_meta
+            logger.debug(f"New file detected: {file_path}")
+    logger.info(f"Hashed {len(to_hash)} files, changed or new: {len(changed_files)}")
+
+    # 將最新的 metadata 寫入 last_check_file
+    with open(last_check_file, "w", encoding="utf-8") as f:
+        json.dump(last_check_dict, f, indent=4, ensure_ascii=False)
+    return files_to_check, changed_files
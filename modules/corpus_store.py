@@ -0,0 +1,134 @@
+import os
+import sys
+import logging
+import threading
+from collections import OrderedDict
+
+
+# 行程內常駐的語料庫快取 (清理後的頁面文字) 可使用的記憶體上限 (bytes)
+STORE_MAX_BYTES = int(os.environ.get("CORPUS_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+# 是否改用打包語料庫 (packed_corpus 的 mmap) 取代常駐的文件 (預設不使用)：
+# 各 worker 共用同一份文字、不佔本快取的記憶體，但搜尋有命中的頁面時須先解碼，
+# 在 epubs/ 上實測仍比常駐字串慢 (約 1.1–1.5 倍)，只在記憶體不足以常駐整個語料庫時才建議開啟
+USE_PACKED = os.environ.get("CORPUS_PACKED", "0") == "1"
+
+# epub_path -> {"mtime": epub 的 mtime, "bytes": 估計大小, "documents": {頁面名稱: 清理後文字}}
+# OrderedDict 的順序即 LRU 順序 (最後面是最近使用的)
+_store = OrderedDict()
+_lock = threading.Lock()
+_stats = {"bytes": 0, "hits": 0, "misses": 0, "reloads": 0, "evictions": 0, "packed": 0}
+
+
+def _search_epub():
+    """延遲匯入 search_epub，避免兩個模組互相匯入時的循環依賴。"""
+    if __package__:
+        from . import search_epub
+    else:
+        import search_epub
+    return search_epub
+
+
+def _packed_corpus():
+    if __package__:
+        from . import packed_corpus
+    else:
+        import packed_corpus
+    return packed_corpus
+
+
+def _documents_size(documents):
+    """估計一本書的文件在記憶體中佔用的大小。"""
+    return sys.getsizeof(documents) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in documents.items())
+
+
+def _evict(max_bytes, logger):
+    """依 LRU 順序移除最久未使用的書，直到總大小不超過 max_bytes。呼叫端須持有 _lock。"""
+    while _store and _stats["bytes"] > max_bytes:
+        epub_path, entry = _store.popitem(last=False)
+        _stats["bytes"] -= entry["bytes"]
+        _stats["evictions"] += 1
+        logger.debug(f"語料庫快取移除：{epub_path}")
+
+
+def get_documents(epub_path, logger=None, max_bytes=None):
+    """
+    取得一本 epub 清理後的文件 ({頁面名稱: 清理後文字})，等同 load_epub(epub_path, clean=True)，
+    但結果會常駐在行程內，只有在 epub 的 mtime 改變時才重新載入。
+    總大小超過 max_bytes (預設 STORE_MAX_BYTES) 時，依 LRU 順序移除最久未使用的書。
+    USE_PACKED (CORPUS_PACKED=1) 時，若已建立打包語料庫 (packed_corpus) 且該書未過期，直接回傳 mmap 上的頁面，
+    文字由 OS page cache 在各 worker 之間共用，不佔用本快取的額度 (計入 stats() 的 packed)。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    if max_bytes is None:
+        max_bytes = STORE_MAX_BYTES
+
+    if USE_PACKED:
+        packed_corpus = _packed_corpus()
+        corpus = packed_corpus.get_corpus(logger=logger)
+        if corpus is not None:
+            documents = packed_corpus.book_documents(corpus, epub_path)
+            if documents is not None:
+                with _lock:
+                    _stats["packed"] += 1
+                return documents
+
+    try:
+        mtime = os.path.getmtime(epub_path)
+    except OSError:
+        logger.error(f"File not found: {epub_path}")
+        return None
+
+    with _lock:
+        entry = _store.get(epub_path)
+        if entry is not None and entry["mtime"] == mtime:
+            _store.move_to_end(epub_path)
+            _stats["hits"] += 1
+            return entry["documents"]
+
+    # 不在快取中或 epub 已更新：在鎖外載入，避免阻塞其他 request
+    documents = _search_epub().load_epub(epub_path, logger=logger, clean=True)
+    if documents is None:
+        return None
+    size = _documents_size(documents)
+
+    with _lock:
+        old = _store.pop(epub_path, None)
+        if old is not None:
+            _stats["bytes"] -= old["bytes"]
+            _stats["reloads"] += 1
+        else:
+            _stats["misses"] += 1
+        # 單本就超過上限時不放入快取
+        if size <= max_bytes:
+            _store[epub_path] = {"mtime": mtime, "bytes": size, "documents": documents}
+            _stats["bytes"] += size
+            _evict(max_bytes, logger)
+    return documents
+
+
+def preload(epub_paths, logger=None):
+    """啟動時預先載入所有 epub (受 STORE_MAX_BYTES 限制)。"""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    for epub_path in epub_paths:
+        get_documents(epub_path, logger=logger)
+    logger.info(f"語料庫快取預先載入完成：{len(_store)} 本，約 {_stats['bytes'] // (1024 * 1024)} MB")
+
+
+def invalidate(epub_path=None):
+    """移除一本 (或全部) epub 的常駐文件。"""
+    with _lock:
+        if epub_path is None:
+            _store.clear()
+            _stats["bytes"] = 0
+            return
+        entry = _store.pop(epub_path, None)
+        if entry is not None:
+            _stats["bytes"] -= entry["bytes"]
+
+
+def stats():
+    """回傳快取的統計數字 (書本數、bytes、命中 / 未命中 / 重新載入 / 移除次數、由打包語料庫取得的次數)。"""
+    with _lock:
+        return dict(_stats, books=len(_store))
@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+
+# 同時支援以套件 (modules.corpus_watcher) 或直接由 modules 目錄匯入
+if __package__:
+    from . import search_epub, corpus_store, multi_search, ngram_index, packed_corpus, result_transform
+    from .check_newer import check_newer
+else:
+    import search_epub
+    import corpus_store
+    import multi_search
+    import ngram_index
+    import packed_corpus
+    import result_transform
+    from check_newer import check_newer
+
+
+# 模組與專案目錄設定
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+# check_newer 的檢查紀錄 (上次處理時每個 epub 的 mtime / 大小 / 雜湊)
+WATCH_DIR = os.path.join(MODULE_DIR, ".cache_watch")
+CHECK_FILE = os.path.join(WATCH_DIR, "epubs_check.json")
+# 每隔幾秒檢查一次 epub 目錄
+WATCH_INTERVAL = int(os.environ.get("CORPUS_WATCH_INTERVAL", "30"))
+
+# 背景執行緒與統計
+_state = {"thread": None, "stop": None}
+_stats = {"polls": 0, "changed": 0, "removed": 0, "updated": 0, "refreshed": 0, "evicted": 0,
+          "last_change": None, "errors": 0}
+_lock = threading.Lock()
+
+
+def _book_id(epub_path):
+    return os.path.splitext(os.path.basename(epub_path))[0]
+
+
+def _epub_paths(epub_dir):
+    """epub 順序與 app.py 搜尋時相同 (os.listdir)。"""
+    return [os.path.join(epub_dir, fn) for fn in os.listdir(epub_dir) if fn.endswith(".epub")]
+
+
+def find_changes(epub_dir, check_file=CHECK_FILE, logger=None, record_file=None):
+    """
+    以 check_newer 找出上次檢查後變動 (含新增) 與被刪除的 epub。
+    - record_file: 新的檢查紀錄寫到此檔 (預設直接覆寫 check_file)；
+      呼叫者處理完變動後再以 os.replace 取代 check_file，處理失敗時下次檢查仍會找到同樣的變動。
+    回傳 (變動的 epub 路徑 list, 被刪除的經號 set, 是否為第一次檢查)。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    if record_file is None:
+        record_file = check_file
+    epub_dir = os.path.abspath(epub_dir)
+    first = not os.path.exists(check_file)
+    known = {}
+    if not first:
+        with open(check_file, "r", encoding="utf-8") as f:
+            known = json.load(f)
+    os.makedirs(os.path.dirname(check_file), exist_ok=True)
+    if record_file != check_file:
+        # check_newer 讀取並覆寫同一個檔案，先從目前的紀錄複製一份
+        if first:
+            if os.path.exists(record_file):
+                os.remove(record_file)
+        else:
+            shutil.copyfile(check_file, record_file)
+    files, changed = check_newer(epub_dir, record_file, logger=logger, fast=True)
+    changed = [p for p in changed if p.endswith(".epub")]
+    removed_paths = [p for p in known if p.endswith(".epub") and not os.path.exists(p)]
+    if removed_paths:
+        # check_newer 不會移除已刪除檔案的紀錄，由此處清掉，避免下次重複處理
+        with open(record_file, "r", encoding="utf-8") as f:
+            record = json.load(f)
+        for p in removed_paths:
+            record.pop(p, None)
+        with open(record_file, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=4, ensure_ascii=False)
+    return changed, {_book_id(p) for p in removed_paths}, first
+
+
+def reparse(epub_paths, logger=None):
+    """重新解析變動的 epub (更新 .cache_epub 的解析快取)，並移除行程內常駐的舊文件。"""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    for epub_path in epub_paths:
+        corpus_store.invalidate(epub_path)
+        search_epub.load_epub(epub_path, logger=logger, clean=True)
+        logger.info(f"已重新解析：{epub_path}")
+
+
+def rebuild_artifacts(epub_dir, logger=None):
+    """
+    重新建立已存在的 n-gram 索引與打包語料庫 (沒有建立過的不會新建；
+    打包語料庫只在 corpus_store.USE_PACKED (CORPUS_PACKED=1) 時使用，未啟用時不重建)。
+    重建期間，過期的書會自動改由 load_epub 讀取，搜尋結果不受影響。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    epub_paths = sorted(_epub_paths(epub_dir))
+    if os.path.exists(ngram_index.INDEX_PATH):
+        ngram_index.build_index(epub_paths, logger=logger)
+    if corpus_store.USE_PACKED and os.path.exists(packed_corpus.CORPUS_PATH):
+        packed_corpus.build_corpus(epub_paths, logger=logger)
+
+
+def update_results(cache, epub_dir, changed_paths, removed_books, logger=None):
+    """
+    只更新受變動 epub 影響的快取結果：
+    - 以 multi_search 一次搜尋每本變動的 epub 中所有快取中的查詢 (與 app.run_search 相同附帶 match 位置，
+      轉換後的結果含 paragraph_spans)
+    - 原本在該書有結果、或現在有結果的查詢，只替換該書的結果並重算 _stat_ 後寫回
+    - 被刪除的書從有結果的查詢中移除
+    - 其餘結果不需重算，只更新語料庫指紋
+    無法以 multi_search 重算的搜尋模式與限定搜尋範圍 (params 含 scope) 的結果，只要可能受影響就移除。
+    回傳統計 dict。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    changed_books = {_book_id(p): p for p in changed_paths}
+    infos = {}
+    for key in cache.keys():
+        info = cache.describe(key)
+        if info is not None:
+            infos[key] = info
+
+    # 依搜尋模式與參數分組，每組對每本變動的書只掃描一次
+    groups = {}
+    for key, info in infos.items():
+        group_key = (info["mode"], json.dumps(info["params"], sort_keys=True))
+        groups.setdefault(group_key, []).append(key)
+
+    order = {_book_id(p): i for i, p in enumerate(_epub_paths(epub_dir))}
+    stats = {"updated": 0, "refreshed": 0, "evicted": 0}
+    cache.sync_corpus()
+    for (mode, _), keys in groups.items():
+        params = infos[keys[0]]["params"]
+        if mode not in multi_search.MODES or "scope" in params:
+            for key in keys:
+                if changed_books or set(infos[key]["books"]) & removed_books:
+                    cache.invalidate(key)
+                    stats["evicted"] += 1
+                else:
+                    cache.refresh(key)
+                    stats["refreshed"] += 1
+            continue
+
+        terms = list(dict.fromkeys(infos[key]["query"] for key in keys))
+        automaton = multi_search.prepare_terms(terms, mode=mode) if changed_books else None
+        found = {}
+        for book_id, epub_path in changed_books.items():
+            found[book_id] = multi_search.search_terms_one_epub(
+                epub_path, terms, logger=logger, automaton=automaton, mode=mode,
+                default_len=params.get("default_len", 60), with_offsets=True)
+
+        for key in keys:
+            info = infos[key]
+            query = info["query"]
+            books = set(info["books"])
+            touched = books & removed_books
+            for book_id in changed_books:
+                if book_id in books or found[book_id][query]["total"] > 0:
+                    touched.add(book_id)
+            if not touched:
+                cache.refresh(key)
+                stats["refreshed"] += 1
+                continue
+            cached = cache.get_entry(key, touch=False)
+            if cached is None:
+                continue
+            results = {k: v for k, v in cached["result"].items() if k != "_stat_" and k not in touched}
+            for book_id in touched & set(changed_books):
+                value = found[book_id][query]
+                if value["total"] > 0:
+                    if cached["format"] == result_transform.FORMAT:
+                        value = result_transform.transform_book(value, query)
+                    else:
+                        # 原始格式的結果不含 match 位置
+                        value = {k: v for k, v in value.items() if k not in ("hits", "bounds")}
+                    results[book_id] = value
+            results = dict(sorted(results.items(), key=lambda kv: order.get(kv[0], len(order))))
+            results["_stat_"] = search_epub.compute_stat(results)
+            cache.put(key, results, cached["keyword"], cached["mode"], cached["params"],
+                      fmt=cached["format"], save=False)
+            stats["updated"] += 1
+    cache.flush()
+    # 受影響的舊版快取檔都已由上面寫入的新格式結果取代，其餘的仍對應目前的語料庫
+    cache.refresh_legacy()
+    return stats
+
+
+def poll_once(cache, epub_dir, check_file=CHECK_FILE, logger=None):
+    """
+    檢查一次 epub 目錄；有變動時重新解析、重建索引並只更新受影響的快取結果。
+    第一次檢查 (沒有檢查紀錄) 時只建立紀錄，並移除語料庫指紋已過期的結果。
+    回傳統計 dict。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    # 新的檢查紀錄先寫到暫存檔，全部處理完才取代 check_file；
+    # 中途失敗 (例外) 時保留舊紀錄，下次檢查會重新處理同樣的變動
+    pending_file = check_file + ".pending"
+    try:
+        changed, removed, first = find_changes(epub_dir, check_file, logger=logger, record_file=pending_file)
+        stats = {"changed": len(changed), "removed": len(removed), "updated": 0, "refreshed": 0, "evicted": 0}
+        if first:
+            stats["evicted"] = cache.invalidate_stale()
+            stats["changed"] = 0
+            logger.info(f"語料庫監看：建立檢查紀錄，移除 {stats['evicted']} 筆過期結果")
+        elif changed or removed:
+            t0 = time.time()
+            logger.info(f"語料庫監看：變動 {len(changed)} 本，刪除 {len(removed)} 本")
+            reparse(changed, logger=logger)
+            stats.update(update_results(cache, epub_dir, changed, removed, logger=logger))
+            rebuild_artifacts(epub_dir, logger=logger)
+            logger.info(f"語料庫監看：處理完成 {stats}，耗時 {time.time() - t0:.1f} 秒")
+        os.replace(pending_file, check_file)
+    finally:
+        if os.path.exists(pending_file):
+            os.remove(pending_file)
+    with _lock:
+        _stats["polls"] += 1
+        for k in ("changed", "removed", "updated", "refreshed", "evicted"):
+            _stats[k] += stats[k]
+        if stats["changed"] or stats["removed"]:
+            _stats["last_change"] = time.time()
+    return stats
+
+
+def _run(cache, epub_dir, interval, stop, logger):
+    while True:
+        try:
+            poll_once(cache, epub_dir, logger=logger)
+        except Exception as e:
+            logger.exception(f"語料庫監看失敗：{e}")
+            with _lock:
+                _stats["errors"] += 1
+        if stop.wait(interval):
+            return
+
+
+def start(cache, epub_dir, interval=None, logger=None):
+    """
+    啟動背景執行緒，每 interval 秒 (預設 WATCH_INTERVAL) 檢查一次 epub 目錄。
+    cache 應以 check_corpus=False 建立，讓 epub 變動時只更新受影響的結果，而不是全部失效。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    if interval is None:
+        interval = WATCH_INTERVAL
+    with _lock:
+        if _state["thread"] is not None and _state["thread"].is_alive():
+            return _state["thread"]
+        stop = threading.Event()
+        thread = threading.Thread(target=_run, args=(cache, epub_dir, interval, stop, logger),
+                                  name="corpus-watcher", daemon=True)
+        _state["thread"] = thread
+        _state["stop"] = stop
+    thread.start()
+    logger.info(f"語料庫監看已啟動：每 {interval} 秒檢查 {epub_dir}")
+    return thread
+
+
+def stop(timeout=None):
+    """停止背景執行緒。"""
+    with _lock:
+        thread, event = _state["thread"], _state["stop"]
+        _state["thread"] = _state["stop"] = None
+    if thread is not None:
+        event.set()
+        thread.join(timeout)
+
+
+def stats():
+    """回傳監看的統計數字 (檢查次數、變動 / 刪除的書、更新 / 沿用 / 移除的結果筆數)。"""
+    with _lock:
+        running = _state["thread"] is not None and _state["thread"].is_alive()
+        return dict(_stats, running=running)
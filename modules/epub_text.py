@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import posixpath
+import zipfile
+from urllib.parse import unquote
+
+
+# epub 中的 XML 命名空間
+CONTAINER_NS = "urn:oasis:names:tc:opendocument:xmlns:container"
+OPF_NS = "http://www.idpf.org/2007/opf"
+XHTML_MEDIA_TYPE = "application/xhtml+xml"
+# 不列入搜尋的頁面 (目錄)
+SKIP_PAGES = {"toc.xhtml"}
+# BeautifulSoup (html.parser) 的 get_text() 不包含這些標籤中的文字
+NON_TEXT_TAGS = ("script", "style", "template", "rt", "rp")
+
+
+def _page_text(content):
+    """
+    取出一頁 XHTML 的純文字，與 ebooklib 的 item.get_content() 再經 BeautifulSoup(...).get_text() 相同：
+    ebooklib 以 lxml.html 解析後只保留 body 的子節點 (body 開頭、第一個子節點之前的文字會被捨棄)，
+    get_text() 不含註解與 NON_TEXT_TAGS 中的文字。
+    """
+    from lxml import etree, html
+
+    try:
+        tree = html.document_fromstring(content, parser=html.HTMLParser(encoding="utf-8"))
+    except Exception:
+        return ""
+    body = tree.find("body")
+    if body is None:
+        return ""
+    etree.strip_elements(body, *NON_TEXT_TAGS, with_tail=False)
+    texts = body.itertext()
+    if body.text:
+        # itertext() 第一個產出的是 body.text
+        next(texts)
+    return "".join(texts)
+
+
+def _manifest_documents(zf):
+    """依 manifest 順序回傳 XHTML 文件的 (頁面名稱, zip 內路徑, properties)。"""
+    from lxml import etree
+
+    container = etree.fromstring(zf.read("META-INF/container.xml"))
+    opf_path = None
+    for root_file in container.iter(f"{{{CONTAINER_NS}}}rootfile"):
+        if root_file.get("media-type") == "application/oebps-package+xml":
+            opf_path = root_file.get("full-path")
+    if opf_path is None:
+        raise ValueError("找不到 OPF 檔")
+    opf_dir = posixpath.dirname(opf_path)
+    opf = etree.fromstring(zf.read(opf_path))
+    manifest = opf.find(f"{{{OPF_NS}}}manifest")
+    items = []
+    for item in manifest if manifest is not None else []:
+        if item.tag != f"{{{OPF_NS}}}item" or item.get("media-type") != XHTML_MEDIA_TYPE:
+            continue
+        name = unquote(item.get("href"))
+        items.append((name, posixpath.normpath(posixpath.join(opf_dir, name)), item.get("properties", "").split()))
+    return items
+
+
+def extract_documents(epub_path):
+    """
+    直接以 zipfile 讀取 epub，並以 lxml 取出每個 XHTML 文件的純文字 (略過 toc.xhtml)。
+    回傳 {頁面名稱: 純文字}，頁面順序與 extract_documents_ebooklib 相同，
+    清理後 (search_epub.clean_page_text) 的文字也相同 (tests/test_epub_text.py)；
+    未清理的原始文字只有空白 (換行、縮排) 不同，不保證一致。不需建立 ebooklib 的書本物件與 BeautifulSoup 的樹。
+    遇到這個方法無法完全比照的結構 (例如標示為 cover 的 XHTML) 時，改用 extract_documents_ebooklib。
+    """
+    with zipfile.ZipFile(epub_path) as zf:
+        items = _manifest_documents(zf)
+        if any("cover" in properties for _, _, properties in items):
+            return extract_documents_ebooklib(epub_path)
+        documents = {}
+        for name, path, _ in items:
+            content = zf.read(path)
+            if name.lower() in SKIP_PAGES:
+                continue
+            documents[name] = _page_text(content)
+    return documents
+
+
+def extract_documents_ebooklib(epub_path):
+    """原本的解析方式：ebooklib 讀取整本書，每個文件以 BeautifulSoup 取出純文字 (略過 toc.xhtml)。"""
+    import ebooklib
+    from ebooklib import epub
+    from bs4 import BeautifulSoup
+
+    book = epub.read_epub(epub_path)
+
+    # 遍歷書中所有文件，抽出純文字
+    documents = {}
+    for item in book.get_items():
+        if item.get_type() == ebooklib.ITEM_DOCUMENT:
+            soup = BeautifulSoup(item.get_content(), 'html.parser')
+            page_number = item.get_name()
+            if page_number.lower() in SKIP_PAGES:
+                continue
+            # 去除 HTML 標籤後的純文字
+            documents[page_number] = soup.get_text()
+    return documents
+
+
+def verify(epub_paths, logger=None):
+    """
+    比對 extract_documents 與 extract_documents_ebooklib 在每本 epub 的結果：
+    頁面名稱與順序須相同，清理後的文字須完全相同 (原始文字的空白本來就不同，不比對)。
+    回傳 (比對的書本數, 不一致的 [(經號, 頁面), ...])。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    if __package__:
+        from .search_epub import clean_page_text
+    else:
+        from search_epub import clean_page_text
+
+    mismatches = []
+    fast_time = slow_time = 0.0
+    for epub_path in epub_paths:
+        book_id = os.path.splitext(os.path.basename(epub_path))[0]
+        t0 = time.perf_counter()
+        fast = extract_documents(epub_path)
+        t1 = time.perf_counter()
+        slow = extract_documents_ebooklib(epub_path)
+        t2 = time.perf_counter()
+        fast_time += t1 - t0
+        slow_time += t2 - t1
+        if list(fast) != list(slow):
+            mismatches.append((book_id, None))
+            logger.warning(f"頁面不一致：{book_id}")
+            continue
+        for page in slow:
+            if clean_page_text(fast[page]) != clean_page_text(slow[page]):
+                mismatches.append((book_id, page))
+                logger.warning(f"文字不一致：{book_id} {page}")
+    logger.info(f"比對 {len(epub_paths)} 本，不一致 {len(mismatches)} 處；"
+                f"zipfile + lxml {fast_time:.1f} 秒，ebooklib + BeautifulSoup {slow_time:.1f} 秒")
+    return len(epub_paths), mismatches
+
+
+if __name__ == "__main__":
+    # 用法：python -m modules.epub_text --verify [epub 目錄]
+    parser = argparse.ArgumentParser(description="epub 純文字擷取")
+    parser.add_argument("epub_dir", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "epubs"))
+    parser.add_argument("--verify", action="store_true", help="與 ebooklib + BeautifulSoup 的結果逐頁比對")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logger = logging.getLogger("epub_text")
+    epub_list = [os.path.join(args.epub_dir, fn) for fn in sorted(os.listdir(args.epub_dir)) if fn.endswith(".epub")]
+    if args.verify:
+        _, mismatches = verify(epub_list, logger=logger)
+        sys.exit(1 if mismatches else 0)
+    t0 = time.perf_counter()
+    pages = sum(len(extract_documents(p)) for p in epub_list)
+    logger.info(f"擷取 {len(epub_list)} 本、{pages} 頁，耗時 {time.perf_counter() - t0:.1f} 秒")
@@ -0,0 +1,130 @@
+import gzip
+import zlib
+import logging
+
+# brotli 為選用套件；未安裝時只提供 gzip
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    brotli = None
+    HAS_BROTLI = False
+
+
+# 小於此大小的回應不壓縮 (壓縮後反而可能變大)
+MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# 需要壓縮的內容類型
+COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson", "text/html", "text/css", "application/javascript"}
+
+
+def supported_encodings():
+    """依偏好順序回傳伺服器支援的壓縮方式。"""
+    return ["br", "gzip"] if HAS_BROTLI else ["gzip"]
+
+
+def choose_encoding(accept_encoding):
+    """
+    依 Accept-Encoding 標頭選擇壓縮方式 ("br"、"gzip")；用戶端不接受任何支援的壓縮時回傳 None。
+    q=0 表示明確拒絕該壓縮方式。
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        fields = part.strip().split(";")
+        name = fields[0].strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    best = None
+    for enc in supported_encodings():
+        q = accepted.get(enc, accepted.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (enc, q)
+    return best[0] if best else None
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    raise ValueError(f"不支援的壓縮方式：{encoding}")
+
+
+def decompress(data, encoding):
+    if encoding == "br":
+        return brotli.decompress(data)
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"不支援的壓縮方式：{encoding}")
+
+
+def _stream_compressor(encoding):
+    """回傳 (壓縮, flush, 結束) 三個函式；每個 chunk 壓縮後立即 flush，讓串流中的每筆資料不會卡在壓縮緩衝區。"""
+    if encoding == "br":
+        c = brotli.Compressor(quality=BROTLI_QUALITY)
+        return c.process, c.flush, c.finish
+    c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+
+def compress_stream(chunks, encoding):
+    """逐 chunk 壓縮串流回應。"""
+    process, flush, finish = _stream_compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = process(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def init_app(app, logger=None):
+    """
+    註冊 after_request：依 Accept-Encoding 壓縮 JSON / NDJSON 等回應。
+    已帶有 Content-Encoding 的回應 (例如直接送出快取中預先壓縮的內容) 不再處理。
+    """
+    from flask import request
+
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    @app.after_request
+    def _compress_response(response):
+        response.vary.add("Accept-Encoding")
+        if response.status_code < 200 or response.status_code >= 300 or "Content-Encoding" in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding)
+            response.headers.pop("Content-Length", None)
+        else:
+            if response.direct_passthrough:
+                return response
+            data = response.get_data()
+            if len(data) < MIN_SIZE:
+                return response
+            response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    logger.info("HTTP 壓縮：%s", "、".join(supported_encodings()))
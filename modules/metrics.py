@@ -0,0 +1,235 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+
+# histogram 的上界 (秒)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 各階段耗時的 histogram 名稱 (label: stage)
+STAGE_METRIC = "search_stage_seconds"
+# 各種計數 (label 見各呼叫處)
+COUNT_METRIC_PREFIX = "search_"
+
+# (名稱, labels) -> 值；labels 為排序後的 ((key, value), ...)
+_counters = {}
+# (名稱, labels) -> {"buckets": [每個上界的累計次數], "sum": 總和, "count": 次數}
+_histograms = {}
+_lock = threading.Lock()
+# 目前 request 的累計：{"start", "stages": {階段: 秒}, "counts": {名稱: 次數}, "notes": {名稱: 值}}
+_local = threading.local()
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """計數器加上 value。"""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """histogram 記錄一個觀測值 (秒)。"""
+    key = (name, _labels(labels))
+    i = bisect.bisect_left(BUCKETS, value)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        for j in range(i, len(BUCKETS)):
+            h["buckets"][j] += 1
+        h["sum"] += value
+        h["count"] += 1
+
+
+def _current():
+    return getattr(_local, "request", None)
+
+
+def add_stage(name, seconds):
+    """
+    記錄一個階段的耗時。在 request 中時先累計，request 結束時每個階段記錄一次 (一次 request 的該階段總耗時)；
+    不在 request 中 (例如命令列工具) 時直接記錄到 histogram。
+    在 process pool 的 worker 中執行的階段不會回報到主行程。
+    """
+    req = _current()
+    if req is None:
+        observe(STAGE_METRIC, seconds, stage=name)
+        return
+    req["stages"][name] = req["stages"].get(name, 0.0) + seconds
+
+
+def add_stages(stages):
+    """一次記錄多個階段 {階段: 秒} (在迴圈中自行累計，避免每頁呼叫一次)。"""
+    for name, seconds in stages.items():
+        if seconds:
+            add_stage(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    """以 with metrics.stage("json"): ... 量測一段程式的耗時。"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage(name, time.perf_counter() - t0)
+
+
+def count(name, value=1):
+    """累計一個計數 (例如掃描的書本數)；request 結束時加到 search_{name}_total。"""
+    req = _current()
+    if req is None:
+        inc(f"{COUNT_METRIC_PREFIX}{name}_total", value)
+        return
+    req["counts"][name] = req["counts"].get(name, 0) + value
+
+
+def note(name, value):
+    """記錄目前 request 的附註 (例如 cache=hit)，只出現在 request 的耗時紀錄中。"""
+    req = _current()
+    if req is not None:
+        req["notes"][name] = value
+
+
+def snapshot():
+    """目前 request 到目前為止的累計：{"stages": {階段: 毫秒}, 其他計數...}；不在 request 中時回傳 {}。"""
+    req = _current()
+    if req is None:
+        return {}
+    stages = {name: round(seconds * 1000, 1) for name, seconds in req["stages"].items()}
+    return dict(req["counts"], stages=stages)
+
+
+def begin_request():
+    _local.request = {"start": time.perf_counter(), "stages": {}, "counts": {}, "notes": {}}
+
+
+def end_request():
+    """結束目前的 request：把累計的階段耗時與計數寫入 histogram / 計數器，回傳累計內容 (含 total 秒數)。"""
+    req = _current()
+    _local.request = None
+    if req is None:
+        return None
+    req["total"] = time.perf_counter() - req["start"]
+    for name, seconds in req["stages"].items():
+        observe(STAGE_METRIC, seconds, stage=name)
+    for name, value in req["counts"].items():
+        inc(f"{COUNT_METRIC_PREFIX}{name}_total", value)
+    return req
+
+
+def format_timing(req, **fields):
+    """將 request 的累計內容整理成一行：total=… stages=load_epub:1.2,scan:3.4 books=12 cache=hit (毫秒)。"""
+    parts = [f"{k}={v}" for k, v in fields.items()]
+    parts.append(f"total={req['total'] * 1000:.1f}ms")
+    if req["stages"]:
+        parts.append("stages=" + ",".join(
+            f"{name}:{seconds * 1000:.1f}" for name, seconds in sorted(req["stages"].items(), key=lambda kv: -kv[1])))
+    parts.extend(f"{k}={v}" for k, v in sorted(req["counts"].items()))
+    parts.extend(f"{k}={v}" for k, v in sorted(req["notes"].items()))
+    return " ".join(parts)
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def render(gauges=None):
+    """以 Prometheus text format 輸出所有計數器、histogram 與 gauges ({名稱: 值})。"""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, dict(v, buckets=list(v["buckets"]))) for k, v in _histograms.items())
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), h in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        for bound, n in zip(BUCKETS, h["buckets"]):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {n}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {h['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {h['sum']:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {h['count']}")
+    for name, value in sorted((gauges or {}).items()):
+        if value is None:
+            continue
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _finish_stream(chunks, finish):
+    """串流回應送完 (或用戶端中斷) 後才結束 request 的計時。"""
+    try:
+        yield from chunks
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+        finish()
+
+
+def init_app(app, logger=None, gauges=None, paths=None):
+    """
+    註冊 request 計時與 /metrics：
+    - 每個 request 記錄 http_request_seconds{path} 與 http_requests_total{path,status}
+    - paths 中的路徑 (預設為全部) 結束時在 logger 寫一行耗時紀錄 (各階段毫秒數、掃描書本數、快取命中與否)
+    - /metrics 以 Prometheus text format 輸出，gauges() 回傳額外的 {名稱: 值} (例如快取命中率)
+    """
+    from flask import Response, request
+
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    @app.before_request
+    def _begin():
+        begin_request()
+
+    @app.after_request
+    def _end(response):
+        path = request.path
+        if path == "/metrics":
+            end_request()
+            return response
+        status = response.status_code
+        fields = {"path": path, "status": status}
+        keyword = request.form.get("keyword") if request.method == "POST" else None
+        if keyword:
+            fields["keyword"] = keyword
+
+        def finish():
+            req = end_request()
+            if req is None:
+                return
+            observe("http_request_seconds", req["total"], path=path)
+            inc("http_requests_total", path=path, status=status)
+            if paths is None or path in paths:
+                logger.info("timing %s", format_timing(req, **fields))
+
+        if response.is_streamed:
+            # 串流回應在 after_request 之後才於同一個執行緒送出內容，送出期間的階段繼續累計，送完才記錄
+            response.response = _finish_stream(response.response, finish)
+        else:
+            finish()
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_endpoint():
+        return Response(render(gauges() if gauges else None), mimetype="text/plain; version=0.0.4")
+
+    return app
+
@@ -0,0 +1,227 @@
+import re
+import logging
+from collections import deque
+
+# 同時支援以套件 (modules.multi_search) 或直接由 modules 目錄匯入
+if __package__:
+    from . import search_epub, corpus_store
+else:
+    import search_epub
+    import corpus_store
+
+
+# 句子取關鍵字前後各幾個字 (與 search_epub.search_in_documents 相同)
+CONTEXT_LEN = 30
+# 搜尋模式：
+# - "literal": 結果與 search_epub.search_in_documents 相同 (關鍵字轉小寫、前後各 CONTEXT_LEN 字)
+# - "wildcard": 結果與 search_epub.search_with_wildcard_in_documents 相同 (區分大小寫、snippet 長度 default_len)
+MODES = ("literal", "wildcard")
+
+
+def build_automaton(terms):
+    """
+    以 terms 建立 Aho–Corasick 自動機，之後每一頁只需掃描一次即可找出所有詞的所有出現位置。
+    回傳 dict：
+    - goto: 每個狀態的轉移表 {字元: 下一個狀態}
+    - fail: 每個狀態的失敗轉移
+    - out: 每個狀態結束的詞 (含經由失敗轉移可達的較短詞)，以 terms 中的索引表示
+    - lengths: 每個詞的長度
+    """
+    goto = [{}]
+    out = [[]]
+    for idx, term in enumerate(terms):
+        state = 0
+        for ch in term:
+            nxt = goto[state].get(ch)
+            if nxt is None:
+                nxt = len(goto)
+                goto[state][ch] = nxt
+                goto.append({})
+                out.append([])
+            state = nxt
+        out[state].append(idx)
+
+    # 以 BFS 計算失敗轉移，並把失敗狀態的輸出併入
+    fail = [0] * len(goto)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for ch, nxt in goto[state].items():
+            queue.append(nxt)
+            f = fail[state]
+            while f and ch not in goto[f]:
+                f = fail[f]
+            fail[nxt] = goto[f].get(ch, 0)
+            out[nxt] = out[nxt] + out[fail[nxt]]
+    # 任一詞的第一個字；在初始狀態時用來以 regex 跳過不可能開始比對的字元
+    first_chars = "".join(sorted(goto[0]))
+    return {
+        "goto": goto,
+        "fail": fail,
+        "out": [tuple(o) for o in out],
+        "lengths": [len(t) for t in terms],
+        "skip": re.compile("[" + re.escape(first_chars) + "]") if first_chars else None,
+    }
+
+
+def iter_matches(automaton, text):
+    """掃描 text 一次，依結束位置順序產出 (起始位置, 詞索引)；同一詞的重疊出現也會全部產出。"""
+    goto = automaton["goto"]
+    fail = automaton["fail"]
+    out = automaton["out"]
+    lengths = automaton["lengths"]
+    skip = automaton["skip"]
+    if skip is None:
+        return
+    n = len(text)
+    state = 0
+    i = 0
+    while i < n:
+        if state == 0:
+            # 初始狀態：直接跳到下一個可能開始比對的字元
+            m = skip.search(text, i)
+            if m is None:
+                return
+            i = m.start()
+        ch = text[i]
+        while True:
+            nxt = goto[state].get(ch)
+            if nxt is not None:
+                state = nxt
+                break
+            if state == 0:
+                break
+            state = fail[state]
+        for idx in out[state]:
+            yield i + 1 - lengths[idx], idx
+        i += 1
+
+
+def _search_word(term, mode):
+    """
+    回傳 term 在自動機中的字串；無法以純文字比對時回傳 None (改由 search_epub 個別搜尋)：
+    - literal: search_in_documents 以 re.finditer(term) 擷取句子，含 regex 特殊字元的詞不能當作純文字
+    - wildcard: 含 '*' 的詞須以萬用字元比對
+    """
+    if mode == "literal":
+        word = term.lower()
+        return word if word and re.escape(word) == word else None
+    return term if term and "*" not in term else None
+
+
+def prepare_terms(terms, mode="literal"):
+    """
+    整理要搜尋的詞並建立自動機：literal 模式與 search_in_documents 相同，關鍵字先轉成小寫；
+    重複的詞只建立一次，無法以純文字比對的詞不放入自動機。
+    """
+    if mode not in MODES:
+        raise ValueError(f"不支援的搜尋模式：{mode}")
+    words = []
+    index = {}
+    for term in terms:
+        word = _search_word(term, mode)
+        if word is None or word in index:
+            continue
+        index[word] = len(words)
+        words.append(word)
+    automaton = build_automaton(words)
+    automaton["words"] = words
+    automaton["index"] = index
+    automaton["mode"] = mode
+    return automaton
+
+
+def _empty_result(with_offsets=False):
+    result = {"total": 0, "pages": {}, "sentences": {}}
+    if with_offsets:
+        result["hits"] = {}
+        result["bounds"] = {}
+    return result
+
+
+def search_terms_in_documents(documents, terms, logger=None, is_clean=False, automaton=None, mode="literal", default_len=60,
+                              with_offsets=False):
+    """
+    在已解析的文檔中一次搜尋多個關鍵字。回傳 {關鍵字: 結果}，每個結果與
+    search_epub.search_in_documents(documents, 關鍵字) (mode="literal") 或
+    search_epub.search_with_wildcard_in_documents(documents, 關鍵字, default_len) (mode="wildcard") 完全相同：
+    - total: 總共找到幾次 (同一詞不重疊計數，與 str.count 相同)
+    - pages: 包含每一頁找到幾次
+    - sentences: 包含每一頁找到的句子
+    每一頁只以 Aho–Corasick 自動機掃描一次；無法以純文字比對的詞則改用 search_epub 個別搜尋。
+    automaton 可傳入預先以 prepare_terms(terms, mode) 建立的結果，避免重複建立 (此時以 automaton 的模式為準)。
+    with_offsets 為 True 時 (只用於 wildcard 模式) 每個結果另含 hits / bounds，
+    與 search_with_wildcard_in_documents(..., with_offsets=True) 相同。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    if automaton is None:
+        automaton = prepare_terms(terms, mode)
+    mode = automaton["mode"]
+    words = automaton["words"]
+
+    with_offsets = with_offsets and mode == "wildcard"
+    found = [_empty_result(with_offsets) for _ in words]
+    if words:
+        for page_number, text in documents.items():
+            if not is_clean:
+                text = search_epub.clean_page_text(text)
+            else:
+                # 打包語料庫的頁面須先解碼成字串
+                text = str(text)
+            n = len(text)
+            # 每個詞上一次被計入的結束位置，用來取不重疊的出現 (與 str.count / re.finditer 相同)
+            last_end = {}
+            page_hits = {}
+            for start, idx in iter_matches(automaton, text):
+                if start < last_end.get(idx, 0):
+                    continue
+                last_end[idx] = start + automaton["lengths"][idx]
+                page_hits.setdefault(idx, []).append(start)
+            for idx, starts in page_hits.items():
+                if mode == "literal":
+                    end_len = automaton["lengths"][idx] + CONTEXT_LEN
+                    sentences = [text[max(0, s - CONTEXT_LEN):min(n, s + end_len)] for s in starts]
+                elif with_offsets:
+                    sentences, bounds = search_epub.extract_snippets(
+                        text, starts, words[idx], default_len, logger, with_bounds=True)
+                    found[idx]["hits"][page_number] = search_epub.match_hits(starts, words[idx])
+                    found[idx]["bounds"][page_number] = bounds
+                else:
+                    sentences = search_epub.extract_snippets(text, starts, words[idx], default_len, logger)
+                result = found[idx]
+                result["total"] += len(starts)
+                result["pages"][page_number] = len(starts)
+                result["sentences"][page_number] = sentences
+    results = {}
+    for term in terms:
+        idx = automaton["index"].get(_search_word(term, mode))
+        if idx is not None:
+            results[term] = found[idx]
+        elif mode == "literal":
+            results[term] = search_epub.search_in_documents(documents, term, logger, is_clean=is_clean)
+        else:
+            results[term] = search_epub.search_with_wildcard_in_documents(
+                documents, term, default_len, logger, is_clean=is_clean, with_offsets=with_offsets)
+    return results
+
+
+def search_terms_one_epub(epub_path, terms, logger=None, ignore_cache=False, automaton=None, mode="literal", default_len=60,
+                          with_offsets=False):
+    """
+    用多個關鍵字 terms 去一個 epub 檔案 (epub_path) 中找尋包含這些關鍵字的句子，整本書只掃描一次。
+    回傳 {關鍵字: search_one_epub(epub_path, 關鍵字) 的結果}；
+    mode="wildcard" 時則與 search_wildcard_one_epub(epub_path, 關鍵字, default_len=default_len,
+    with_offsets=with_offsets) 相同。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    if ignore_cache:
+        documents = search_epub.load_epub(epub_path, logger=logger, ignore_cache=True, clean=True)
+    else:
+        documents = corpus_store.get_documents(epub_path, logger=logger)
+    if documents is None:
+        return {term: _empty_result(with_offsets and mode == "wildcard") for term in terms}
+    return search_terms_in_documents(documents, terms, logger, is_clean=True, automaton=automaton,
+                                     mode=mode, default_len=default_len, with_offsets=with_offsets)
@@ -0,0 +1,193 @@
+import os
+import sys
+import logging
+import pickle
+import bisect
+from array import array
+
+
+# 模組與專案目錄設定
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(MODULE_DIR)
+EPUB_DIR = os.path.join(PROJECT_ROOT, "epubs")
+# 磁碟層級的 n-gram 反向索引
+INDEX_DIR = os.path.join(MODULE_DIR, ".cache_index")
+INDEX_PATH = os.path.join(INDEX_DIR, "ngram_index.pkl")
+# 索引格式版本；格式改變時遞增，舊索引會被視為不存在
+INDEX_VERSION = 1
+# 以雙字 (bigram) 作為索引單位
+NGRAM_SIZE = 2
+
+# 行程內已載入的索引：(索引檔 mtime, 索引內容)
+_loaded = {"mtime": None, "index": None}
+
+
+def _search_epub():
+    """延遲匯入 search_epub，避免兩個模組互相匯入時的循環依賴。"""
+    if __package__:
+        from . import search_epub
+    else:
+        import search_epub
+    return search_epub
+
+
+def _epub_stat(epub_path):
+    st = os.stat(epub_path)
+    return st.st_mtime, st.st_size
+
+
+def build_index(epub_paths, logger=None, index_path=INDEX_PATH):
+    """
+    以 load_epub 的解析結果建立整個語料庫的 bigram 反向索引，並寫入 index_path。
+    索引內容：
+    - books: 每本 epub 的 mtime / size (用來判斷索引是否過期)
+    - page_starts: 每一頁在「虛擬串接全文」中的起始位置 (遞增)
+    - page_refs: 與 page_starts 對應的 (經號, 頁面名稱)
+    - postings: bigram -> array('I')，記錄此 bigram 在虛擬全文中的所有位置
+    位置可經由 page_starts 換算回 經號 / 頁面 / 頁內偏移。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    search_epub = _search_epub()
+
+    books = {}
+    page_starts = array("I")
+    page_refs = []
+    postings = {}
+    base = 0
+    for epub_path in epub_paths:
+        book_id = os.path.splitext(os.path.basename(epub_path))[0]
+        documents = search_epub.load_epub(epub_path, logger=logger, clean=True)
+        if documents is None:
+            continue
+        mtime, size = _epub_stat(epub_path)
+        books[book_id] = {"mtime": mtime, "size": size}
+        for page, clean_text in documents.items():
+            page_starts.append(base)
+            page_refs.append((book_id, page))
+            for i in range(len(clean_text) - NGRAM_SIZE + 1):
+                gram = clean_text[i:i + NGRAM_SIZE]
+                lst = postings.get(gram)
+                if lst is None:
+                    postings[gram] = lst = []
+                lst.append(base + i)
+            # 頁與頁之間多留一格，確保 bigram 不會跨頁
+            base += len(clean_text) + 1
+        logger.debug(f"已建立索引：{book_id}")
+
+    index = {
+        "version": INDEX_VERSION,
+        "ngram": NGRAM_SIZE,
+        "books": books,
+        "page_starts": page_starts,
+        "page_refs": page_refs,
+        "postings": {gram: array("I", lst) for gram, lst in postings.items()},
+    }
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, index_path)
+    logger.info(f"已寫入 n-gram 索引：{index_path}，共 {len(books)} 本、{len(page_refs)} 頁、{len(index['postings'])} 個 bigram")
+    return index
+
+
+def load_index(index_path=INDEX_PATH, logger=None):
+    """從磁碟讀取索引；不存在或版本不符時回傳 None。"""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with open(index_path, "rb") as f:
+            index = pickle.load(f)
+    except Exception as e:
+        logger.error(f"讀取 n-gram 索引失敗：{e}")
+        return None
+    if index.get("version") != INDEX_VERSION:
+        logger.warning(f"n-gram 索引版本不符，忽略：{index_path}")
+        return None
+    return index
+
+
+def get_index(index_path=INDEX_PATH, logger=None):
+    """
+    取得行程內共用的索引；第一次呼叫時從磁碟載入，之後只有在索引檔更新時才重新載入。
+    沒有索引檔時回傳 None。
+    """
+    try:
+        mtime = os.path.getmtime(index_path)
+    except OSError:
+        return None
+    if _loaded["mtime"] != mtime:
+        _loaded["index"] = load_index(index_path, logger=logger)
+        _loaded["mtime"] = mtime
+    return _loaded["index"]
+
+
+def _literal_positions(index, literal):
+    """回傳 literal (長度 >= NGRAM_SIZE) 在虛擬全文中所有出現的起始位置。"""
+    postings = index["postings"]
+    n = index["ngram"]
+    grams = []
+    for i in range(len(literal) - n + 1):
+        lst = postings.get(literal[i:i + n])
+        if lst is None:
+            return set()
+        grams.append((len(lst), i, lst))
+    # 由最稀少的 bigram 開始交集
+    grams.sort(key=lambda g: g[0])
+    _, offset, lst = grams[0]
+    positions = {p - offset for p in lst}
+    for _, offset, lst in grams[1:]:
+        if not positions:
+            break
+        positions &= {p - offset for p in lst}
+    return positions
+
+
+def candidate_pages(index, keyword, epub_paths):
+    """
+    依關鍵字中的字面片段 (以 '*' 分隔、長度 >= NGRAM_SIZE) 找出可能命中的頁面。
+    回傳 {經號: 頁面名稱集合}；若某本 epub 不在索引中或已比索引新，其值為 None (須整本掃描)。
+    若關鍵字沒有可用的字面片段，回傳 None (索引無法縮小範圍)。
+    """
+    literals = [seg for seg in keyword.split("*") if len(seg) >= index["ngram"]]
+    if not literals:
+        return None
+
+    page_starts = index["page_starts"]
+    page_refs = index["page_refs"]
+    # 每一頁須同時包含所有字面片段
+    hit_pages = None
+    for literal in literals:
+        pages = {bisect.bisect_right(page_starts, p) - 1 for p in _literal_positions(index, literal)}
+        hit_pages = pages if hit_pages is None else hit_pages & pages
+        if not hit_pages:
+            break
+
+    by_book = {}
+    for i in hit_pages:
+        book_id, page = page_refs[i]
+        by_book.setdefault(book_id, set()).add(page)
+
+    books = index["books"]
+    candidates = {}
+    for epub_path in epub_paths:
+        book_id = os.path.splitext(os.path.basename(epub_path))[0]
+        meta = books.get(book_id)
+        try:
+            fresh = meta is not None and (meta["mtime"], meta["size"]) == _epub_stat(epub_path)
+        except OSError:
+            fresh = False
+        candidates[book_id] = by_book.get(book_id, set()) if fresh else None
+    return candidates
+
+
+if __name__ == "__main__":
+    # 用法：python -m modules.ngram_index [epub 目錄]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    epub_dir = sys.argv[1] if len(sys.argv) > 1 else EPUB_DIR
+    epub_list = [os.path.join(epub_dir, fn) for fn in sorted(os.listdir(epub_dir)) if fn.endswith(".epub")]
+    build_index(epub_list, logger=logging.getLogger("ngram_index"))
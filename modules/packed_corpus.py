@@ -0,0 +1,213 @@
+import os
+import sys
+import logging
+import mmap
+import pickle
+import struct
+import threading
+
+
+# 模組與專案目錄設定
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(MODULE_DIR)
+EPUB_DIR = os.path.join(PROJECT_ROOT, "epubs")
+# 打包後的語料庫檔：所有書、所有頁面清理後的文字 + 偏移表
+CORPUS_DIR = os.path.join(MODULE_DIR, ".cache_corpus")
+CORPUS_PATH = os.path.join(CORPUS_DIR, "corpus.bin")
+
+# 檔案格式：
+#   header : MAGIC (8 bytes) + 偏移表位置 (uint64) + 偏移表長度 (uint64)
+#   text   : 所有頁面的文字，以 UTF-32-LE (每字 4 bytes) 依序串接，字元位置可直接換算成 byte 位置
+#            (header 長度為 4 的倍數，因此整個檔案都以字元為單位對齊)
+#   table  : pickle 的 {經號: {"mtime", "size", "pages": [(頁面名稱, 起始字元位置, 字數), ...]}}
+MAGIC = b"EPCORP01"
+HEADER = struct.Struct("<8sQQ")
+ENCODING = "utf-32-le"
+CHAR_BYTES = 4
+
+# 行程內已開啟的語料庫：{"mtime": 檔案 mtime, "corpus": open_corpus() 的結果}
+_opened = {"mtime": None, "corpus": None}
+_lock = threading.Lock()
+
+
+class PackedPage:
+    """
+    打包語料庫中的一頁，直接在 mmap 上操作，不建立整頁的 Python 字串。
+    提供搜尋函式用到的 str 介面子集：len()、find()、startswith()、索引與切片；
+    str(page) 才會解碼出整頁文字。
+    """
+    __slots__ = ("_buf", "_start", "_len")
+
+    def __init__(self, buf, start, length):
+        # buf: 整個 mmap；start: 此頁第一個字在 mmap 中的字元位置
+        self._buf = buf
+        self._start = start
+        self._len = length
+
+    def __len__(self):
+        return self._len
+
+    def __str__(self):
+        return self[0:self._len]
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    __hash__ = None
+
+    def _byte_range(self, start, end):
+        return (self._start + start) * CHAR_BYTES, (self._start + end) * CHAR_BYTES
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, end, step = key.indices(self._len)
+            if step != 1:
+                return str(self)[key]
+            if end <= start:
+                return ""
+        else:
+            if key < 0:
+                key += self._len
+            if not 0 <= key < self._len:
+                raise IndexError("PackedPage index out of range")
+            start, end = key, key + 1
+        lo, hi = self._byte_range(start, end)
+        return self._buf[lo:hi].decode(ENCODING)
+
+    def find(self, sub, start=0, end=None):
+        """與 str.find 相同：回傳 sub 在頁內的字元位置，找不到回傳 -1。"""
+        if end is None or end > self._len:
+            end = self._len
+        if start < 0:
+            start = max(0, start + self._len)
+        needle = sub.encode(ENCODING)
+        lo, hi = self._byte_range(start, end)
+        while True:
+            i = self._buf.find(needle, lo, hi)
+            if i < 0:
+                return -1
+            # 只接受對齊字元邊界的命中
+            if i % CHAR_BYTES == 0:
+                return i // CHAR_BYTES - self._start
+            lo = i - i % CHAR_BYTES + CHAR_BYTES
+
+    def startswith(self, prefix, start=0):
+        """與 str.startswith(prefix, start) 相同。"""
+        if start < 0 or start + len(prefix) > self._len:
+            return False
+        lo, hi = self._byte_range(start, start + len(prefix))
+        return self._buf[lo:hi] == prefix.encode(ENCODING)
+
+
+def _search_epub():
+    """延遲匯入 search_epub，避免兩個模組互相匯入時的循環依賴。"""
+    if __package__:
+        from . import search_epub
+    else:
+        import search_epub
+    return search_epub
+
+
+def build_corpus(epub_paths, logger=None, corpus_path=CORPUS_PATH):
+    """
+    將所有 epub 清理後的頁面文字打包成單一檔案 corpus_path，供各 worker 以 mmap 共用。
+    內容來源為 load_epub(clean=True)，與搜尋時使用的文字相同。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    search_epub = _search_epub()
+
+    os.makedirs(os.path.dirname(corpus_path), exist_ok=True)
+    tmp_path = corpus_path + ".tmp"
+    books = {}
+    pos = 0
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0))
+        for epub_path in epub_paths:
+            book_id = os.path.splitext(os.path.basename(epub_path))[0]
+            documents = search_epub.load_epub(epub_path, logger=logger, clean=True)
+            if documents is None:
+                continue
+            st = os.stat(epub_path)
+            pages = []
+            for page, text in documents.items():
+                f.write(text.encode(ENCODING))
+                pages.append((page, pos, len(text)))
+                pos += len(text)
+            books[book_id] = {"mtime": st.st_mtime, "size": st.st_size, "pages": pages}
+        table = pickle.dumps(books, protocol=pickle.HIGHEST_PROTOCOL)
+        table_offset = f.tell()
+        f.write(table)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, table_offset, len(table)))
+    os.replace(tmp_path, corpus_path)
+    logger.info(f"已寫入打包語料庫：{corpus_path}，共 {len(books)} 本、{pos} 字")
+    return corpus_path
+
+
+def open_corpus(corpus_path=CORPUS_PATH, logger=None):
+    """以 mmap 開啟打包語料庫；檔案不存在或格式不符時回傳 None。"""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        with open(corpus_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        logger.debug(f"無法開啟打包語料庫：{e}")
+        return None
+    magic, table_offset, table_len = HEADER.unpack(mm[:HEADER.size])
+    if magic != MAGIC:
+        logger.warning(f"打包語料庫格式不符，忽略：{corpus_path}")
+        mm.close()
+        return None
+    books = pickle.loads(mm[table_offset:table_offset + table_len])
+    return {"mmap": mm, "books": books, "documents": {}}
+
+
+def get_corpus(corpus_path=CORPUS_PATH, logger=None):
+    """
+    取得行程內共用的打包語料庫；第一次呼叫時開啟，之後只有在檔案更新時才重新開啟。
+    沒有打包檔時回傳 None。
+    """
+    try:
+        mtime = os.path.getmtime(corpus_path)
+    except OSError:
+        return None
+    with _lock:
+        if _opened["mtime"] != mtime:
+            _opened["corpus"] = open_corpus(corpus_path, logger=logger)
+            _opened["mtime"] = mtime
+        return _opened["corpus"]
+
+
+def book_documents(corpus, epub_path):
+    """
+    回傳一本 epub 在打包語料庫中的頁面 {頁面名稱: PackedPage}。
+    若該書不在語料庫中，或 epub 已比打包時新，回傳 None (須改由 load_epub 讀取)。
+    """
+    book_id = os.path.splitext(os.path.basename(epub_path))[0]
+    meta = corpus["books"].get(book_id)
+    if meta is None:
+        return None
+    try:
+        st = os.stat(epub_path)
+    except OSError:
+        return None
+    if (meta["mtime"], meta["size"]) != (st.st_mtime, st.st_size):
+        return None
+    documents = corpus["documents"].get(book_id)
+    if documents is None:
+        # 文字區緊接在 header 之後
+        base = HEADER.size // CHAR_BYTES
+        mm = corpus["mmap"]
+        documents = {page: PackedPage(mm, base + start, length) for page, start, length in meta["pages"]}
+        corpus["documents"][book_id] = documents
+    return documents
+
+
+if __name__ == "__main__":
+    # 用法：python -m modules.packed_corpus [epub 目錄]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    epub_dir = sys.argv[1] if len(sys.argv) > 1 else EPUB_DIR
+    epub_list = [os.path.join(epub_dir, fn) for fn in sorted(os.listdir(epub_dir)) if fn.endswith(".epub")]
+    build_corpus(epub_list, logger=logging.getLogger("packed_corpus"))
@@ -0,0 +1,95 @@
+import os
+import io
+import re
+import hmac
+import time
+import logging
+import threading
+
+
+# 模組與專案目錄設定
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(MODULE_DIR)
+PROFILE_DIR = os.path.join(PROJECT_ROOT, "logs", "profiles")
+# 啟用 profiler 的密語；未設定時完全停用 (request 帶 X-Profile 標頭或 profile 參數且與此相同才會 profile)
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+# 報告中列出的函式數
+TOP_FUNCTIONS = 30
+# 只列出這些模組的函式 (pstats 的 restriction 為對 "檔名:行號(函式)" 的 regex)
+FOCUS_MODULES = r"search_epub|ngram_index|corpus_store|packed_corpus|result_transform"
+
+# 同一時間只 profile 一個 request (cProfile 以執行緒為單位，同時 profile 會互相干擾)
+_lock = threading.Lock()
+
+
+def requested(headers, values):
+    """
+    判斷這次 request 是否要求 profile：X-Profile 標頭或 profile 參數等於 PROFILE_TOKEN。
+    未設定 PROFILE_TOKEN 時一律回傳 False (一般 request 只多一次 dict 查詢)。
+    """
+    if not PROFILE_TOKEN:
+        return False
+    token = headers.get("X-Profile") or values.get("profile")
+    return bool(token) and hmac.compare_digest(token.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+
+
+def _file_stem(keyword):
+    """檔名：時間 + 關鍵字 (去掉檔名不允許的字元)。"""
+    safe = re.sub(r'[\\/:*?"<>|\s]+', "～", keyword)[:40]
+    return f"{time.strftime('%Y%m%d-%H%M%S')}_{safe}"
+
+
+def report(stats, header):
+    """
+    profile 文字報告：header ({欄位: 值})、全部函式依累計時間排序的前幾名、
+    搜尋相關模組的函式 (依自身時間排序) 與其呼叫關係 (call tree)。
+    """
+    out = io.StringIO()
+    stats.stream = out
+    for key, value in header.items():
+        out.write(f"{key}: {value}\n")
+    out.write("\n===== 依累計時間 (cumulative) =====\n")
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    out.write("\n===== 搜尋相關函式，依自身時間 (tottime) =====\n")
+    stats.sort_stats("tottime").print_stats(FOCUS_MODULES, TOP_FUNCTIONS)
+    out.write("\n===== 呼叫關係：搜尋相關函式呼叫了哪些函式 =====\n")
+    stats.sort_stats("cumulative").print_callees(FOCUS_MODULES, TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+def run(func, keyword, logger=None, output_dir=PROFILE_DIR, extra=None):
+    """
+    以 cProfile 執行 func() 並回傳 (func 的回傳值, 報告檔路徑)。
+    在 output_dir 寫入兩個檔案：
+    - {時間}_{關鍵字}.prof：pstats 原始資料 (完整 call tree，可用 snakeviz / gprof2dot 檢視)
+    - {時間}_{關鍵字}.txt ：文字報告 (關鍵字、耗時、extra() 提供的欄位、最耗時的函式與呼叫關係)
+    extra 為回傳 {欄位: 值} 的函式，於 func 結束後呼叫 (例如本次 request 的各階段耗時)。
+    """
+    # profiler 只在要求 profile 時才載入，一般啟動與 request 不需要
+    import cProfile
+    import pstats
+
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    with _lock:
+        profiler = cProfile.Profile()
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        profiler.enable()
+        try:
+            result = func()
+        finally:
+            profiler.disable()
+        wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+
+    header = {"keyword": keyword, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "wall_ms": round(wall * 1000, 1), "cpu_ms": round(cpu * 1000, 1)}
+    if extra is not None:
+        header.update(extra())
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.join(output_dir, _file_stem(keyword))
+    stats = pstats.Stats(profiler)
+    stats.dump_stats(f"{stem}.prof")
+    with open(f"{stem}.txt", "w", encoding="utf-8") as f:
+        f.write(report(stats, header))
+    logger.info("profile：%s，%.1f ms (CPU %.1f ms)，報告：%s.txt", keyword, wall * 1000, cpu * 1000, stem)
+    return result, f"{stem}.txt"
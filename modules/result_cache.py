@@ -0,0 +1,899 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows：沒有跨行程的檔案鎖，中繼資料仍先合併再寫回
+    fcntl = None
+
+
+# 預設容量：最多幾筆、最多多少 bytes (可用環境變數調整)
+DEFAULT_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "10000"))
+DEFAULT_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# 移除策略：lru (最久未使用) 或 lfu (最少使用)
+DEFAULT_POLICY = os.environ.get("RESULT_CACHE_POLICY", "lru")
+# 每隔幾秒重新計算一次語料庫指紋 (epub 目錄的檔名 / 大小 / mtime)
+CORPUS_CHECK_INTERVAL = 30
+# 登記的指紋與目前不同時，若指紋已超過幾秒沒有重新計算，先重新計算再判斷 (可能是本行程的指紋較舊)
+CORPUS_RECHECK_INTERVAL = 1
+# 只有讀取時 (更新最後使用時間)，每隔幾秒才寫回一次中繼資料檔
+MANIFEST_SAVE_INTERVAL = 60
+# 快取中繼資料檔 (每筆的大小、最後使用時間、使用次數、語料庫指紋)
+MANIFEST_NAME = ".manifest.json"
+# 多個行程 (多個 worker、words6_pipeline) 寫回中繼資料時互斥用的鎖檔
+LOCK_NAME = ".manifest.lock"
+# cache 目錄中不是搜尋結果的檔案，不納入管理
+RESERVED_NAMES = {"all_words.json"}
+# 快取鍵：正規化查詢 + 搜尋模式 + snippet 參數的 sha256 (取前 32 個十六進位字元)
+KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# 預先壓縮的回應檔：{key}.{variant}.{gz|br}；variant 為回應格式名稱 (只含英數與 '-')
+RESPONSE_PATTERN = re.compile(r"^([0-9a-f]{32})\.([a-z0-9-]+)\.(gz|br)$")
+# 回應檔第一行 (結果世代) 的最大長度
+RESPONSE_HEADER_MAX = 128
+RESPONSE_SUFFIXES = {"gzip": "gz", "br": "br"}
+# 舊版快取 (以 legacy_name(關鍵字) 為檔名、內容只有搜尋結果) 對應的搜尋模式與參數
+LEGACY_MODE = "wildcard"
+LEGACY_PARAMS = {"default_len": 60}
+
+
+def normalize_query(keyword):
+    """關鍵字正規化：去除前後空白並轉成 Unicode NFC，讓外觀相同的查詢對應到同一筆快取。"""
+    return unicodedata.normalize("NFC", keyword.strip())
+
+
+def make_key(keyword, mode="wildcard", params=None):
+    """
+    由正規化後的查詢、搜尋模式與 snippet 參數計算快取鍵。
+    鍵只含 [0-9a-f]，長度固定，可安全作為檔名且不會因特殊字元或過長關鍵字而衝突。
+    """
+    payload = json.dumps(
+        {"query": normalize_query(keyword), "mode": mode, "params": params or {}},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def legacy_name(keyword):
+    """
+    舊版快取的檔名 (不含 .json)：關鍵字中的 '*' 換成 '～'。
+    隨專案佈署的 cache/*.json 仍是這種檔名；一般啟動時只讀取，不改名也不刪除 (轉換見 migrate_legacy)。
+    """
+    return keyword.replace("*", "～")
+
+
+def corpus_fingerprint(epub_dir):
+    """以 epub 目錄中每個檔案的名稱、大小與 mtime 計算語料庫指紋；任何 epub 變動都會改變指紋。"""
+    h = hashlib.md5()
+    for fn in sorted(os.listdir(epub_dir)):
+        if not fn.endswith(".epub"):
+            continue
+        st = os.stat(os.path.join(epub_dir, fn))
+        h.update(f"{fn}\0{st.st_size}\0{st.st_mtime}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def file_generation(st):
+    """
+    由 os.stat 的結果取得檔案的世代 (inode、mtime 與大小)：atomic_write 每次都換上新的檔案，
+    重新寫入後世代一定不同，用來判斷預先壓縮的回應是否由目前的結果產生。
+    """
+    return f"{st.st_ino}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def atomic_write(path, data):
+    """
+    先寫入同目錄下的暫存檔，再以 os.replace 換上正式檔名；
+    讀取端只會看到完整的舊檔或完整的新檔，不會讀到寫到一半的內容。
+    回傳寫入的檔案的 os.stat 結果 (os.replace 不改變 inode 與 mtime)。
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            st = os.fstat(f.fileno())
+        os.replace(tmp_path, path)
+        return st
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ResultCache:
+    """
+    搜尋結果快取：每個查詢一個精簡 (不縮排) 的 JSON 檔 (檔名為 make_key 的結果)，並以中繼資料檔管理容量。
+    檔案內容為 {"keyword", "query", "mode", "params", "format", "result"}，保留原始關鍵字以便查驗；
+    format 為 "raw" (原始搜尋結果) 或 "transformed" (已轉換成顯示用的段落，見 result_transform)。
+    - 超過 max_entries 或 max_bytes 時，依 policy (lru / lfu) 移除
+    - 每筆記錄寫入時的語料庫指紋；epub 更新後，舊結果視為過期而不再使用 (只當作查不到，不刪除檔案)
+      (check_corpus=False 時不自動失效，改由 corpus_watcher 只更新受影響的結果，並把沒受影響的結果
+      標記為目前的指紋後寫回中繼資料檔；其他行程由中繼資料檔與 epub 目錄判斷，不依賴各自記憶體中的狀態)
+    - 每筆登記查詢、搜尋參數與有找到的經號 (books)，供 corpus_watcher 判斷哪些結果受變動的 epub 影響
+    - 可附帶預先壓縮的 HTTP 回應 ({key}.{variant}.gz / .br)，與結果一起計入容量、一起移除；
+      回應檔第一行記錄產生時結果檔的世代 (file_generation)，與目前的結果檔不同時視為無效
+    - 舊版快取檔 (以關鍵字為檔名) 只讀取、不納入容量管理，也不會被移除；
+      需要轉換時另外執行 python -m modules.result_cache --migrate
+    - hits / misses / stale / stores / evictions / invalidations 計數可由 stats() 取得
+    - read_only=True 時不寫入任何檔案 (中繼資料、結果與回應檔都不變動，例如 benchmark 讀取專案內的快取)
+    多個行程可共用同一個 cache 目錄：
+    - 查詢不到時先重新讀取 (已被其他行程更新的) 中繼資料檔，仍沒有登記但結果檔存在時直接納入
+    - 寫回中繼資料時先鎖定 (LOCK_NAME)，讀入目前的檔案並併入本行程的變動後再寫回，
+      不會蓋掉其他行程的登記；容量上限也以合併後 (整個目錄) 的登記計算
+    """
+
+    def __init__(self, cache_dir, epub_dir, max_entries=None, max_bytes=None, policy=None, logger=None,
+                 check_corpus=True, read_only=False):
+        self.cache_dir = cache_dir
+        self.epub_dir = epub_dir
+        self.max_entries = DEFAULT_MAX_ENTRIES if max_entries is None else max_entries
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self.policy = policy or DEFAULT_POLICY
+        self.check_corpus = check_corpus
+        self.read_only = read_only
+        self.logger = logger or logging.getLogger(__name__)
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stale": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+        self._corpus = corpus_fingerprint(epub_dir)
+        self._corpus_checked = time.time()
+        # 中繼資料最後寫入 (或確認與檔案一致) 的時間
+        self._saved = time.time()
+        # 舊版快取檔 {快取鍵: 檔名}，第一次查詢不到時才建立，cache 目錄變動 (mtime 改變) 時重建
+        self._legacy = {"mtime": None, "index": {}}
+        # 本行程尚未寫回的變動：新增 / 修改的登記、移除的鍵 (與移除時間)、命中次數與最後使用時間、
+        # 舊版快取檔對應的語料庫指紋 (refresh_legacy)
+        self._pending = self._no_pending()
+        # 上次讀取或寫入時中繼資料檔的 (inode, mtime, 大小)，用來判斷其他行程是否已更新
+        self._manifest_stat = None
+        if not read_only:
+            os.makedirs(cache_dir, exist_ok=True)
+        first = not os.path.exists(self.manifest_path)
+        self._manifest_stat = self._stat_manifest()
+        self._entries, self._legacy_corpus = self._load_manifest()
+        changed = first
+        if self._legacy_corpus is None:
+            # 舊版快取檔視為對應第一次啟動時的語料庫 (之後 epub 變動即過期)
+            self._legacy_corpus = self._corpus
+            changed = True
+        # 已有中繼資料時不掃描整個 cache 目錄 (加快啟動)：其他行程寫入的結果會合併進中繼資料，
+        # 尚未登記的檔案在第一次查詢時才納入 (_valid_entry)；完整的整理見 scan()
+        if read_only:
+            return
+        if first:
+            changed = self._adopt_unmanaged() > 0 or changed
+        with self._lock:
+            changed = self._evict() > 0 or changed
+            # 中繼資料沒有變動時不重寫 (加快啟動)
+            if changed:
+                self._save_manifest()
+
+    def scan(self):
+        """
+        掃描 cache 目錄：納入尚未登記的結果檔與預先壓縮的回應檔、移除已不存在的登記與無效的回應檔，
+        並依容量設定移除多餘的結果。回傳變動的登記數。
+        """
+        self._check_writable()
+        with self._lock:
+            self._reload()
+            changed = self._adopt_unmanaged() + self._evict()
+            if changed:
+                self._save_manifest()
+        return changed
+
+    # ------------------------------------------
+    # 中繼資料
+    # ------------------------------------------
+    def _load_manifest(self):
+        """
+        回傳 (登記 {快取鍵: 中繼資料}, 舊版快取檔對應的語料庫指紋)。
+        中繼資料檔為 {"legacy_corpus", "entries"}；更早的版本整個檔案即為 entries。
+        """
+        if not os.path.exists(self.manifest_path):
+            return {}, None
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.warning("讀取快取中繼資料失敗，重新建立：%s", e)
+            return {}, None
+        if isinstance(data.get("entries"), dict):
+            return data["entries"], data.get("legacy_corpus")
+        return data, None
+
+    @staticmethod
+    def _no_pending():
+        return {"entries": {}, "removed": {}, "hits": {}, "legacy_corpus": None}
+
+    def _stat_manifest(self):
+        try:
+            st = os.stat(self.manifest_path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    @contextlib.contextmanager
+    def _manifest_lock(self):
+        """跨行程鎖定中繼資料檔 (讀入、合併、寫回期間)；沒有 fcntl 時不鎖定。"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.cache_dir, LOCK_NAME), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _merge(self, entries):
+        """
+        將本行程尚未寫回的變動併入由檔案讀入的登記 entries (會直接修改 entries) 並回傳：
+        - 移除的鍵：其他行程在移除之後才重新寫入的不移除
+        - 新增 / 修改的登記：其他行程寫入了較新的結果 (stored 較大) 時以檔案為準
+        - 命中：次數累加、最後使用時間取較晚者
+        呼叫端須持有 _lock。
+        """
+        pending = self._pending
+        for key, removed_at in pending["removed"].items():
+            entry = entries.get(key)
+            if entry is not None and entry.get("stored", 0) <= removed_at:
+                del entries[key]
+        for key, entry in list(pending["entries"].items()):
+            current = entries.get(key)
+            if current is not None and current.get("stored", 0) > entry.get("stored", 0):
+                del pending["entries"][key]
+                continue
+            entries[key] = entry
+        for key, (hits, atime) in pending["hits"].items():
+            entry = entries.get(key)
+            if entry is not None and key not in pending["entries"]:
+                entry["hits"] = entry.get("hits", 0) + hits
+                entry["atime"] = max(entry.get("atime", 0), atime)
+        return entries
+
+    def _reload(self):
+        """中繼資料檔已被其他行程更新時重新讀入 (併入本行程尚未寫回的變動)。呼叫端須持有 _lock。"""
+        stat = self._stat_manifest()
+        if stat is None or stat == self._manifest_stat:
+            return False
+        entries, legacy_corpus = self._load_manifest()
+        self._entries = self._merge(entries)
+        if legacy_corpus is not None and self._pending["legacy_corpus"] is None:
+            self._legacy_corpus = legacy_corpus
+        self._manifest_stat = stat
+        return True
+
+    def _save_manifest(self):
+        """
+        寫回中繼資料檔：鎖定後讀入目前的檔案、併入本行程的變動、依容量上限整理後再寫回。
+        呼叫端須持有 _lock。唯讀時變動只留在本行程。
+        """
+        self._saved = time.time()
+        if self.read_only:
+            return
+        with self._manifest_lock():
+            entries, legacy_corpus = self._load_manifest()
+            self._entries = self._merge(entries)
+            if legacy_corpus is not None and self._pending["legacy_corpus"] is None:
+                # 本行程沒有 refresh_legacy 時，以最先建立中繼資料檔的行程所記錄的為準
+                self._legacy_corpus = legacy_corpus
+            self._evict()
+            manifest = {"legacy_corpus": self._legacy_corpus, "entries": self._entries}
+            data = json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            atomic_write(self.manifest_path, data)
+            self._pending = self._no_pending()
+            self._manifest_stat = self._stat_manifest()
+
+    def _mark(self, key):
+        """記錄一筆登記已新增或修改 (下次寫回時併入中繼資料檔)。呼叫端須持有 _lock。"""
+        self._pending["entries"][key] = self._entries[key]
+        self._pending["removed"].pop(key, None)
+
+    def _adopt(self, key):
+        """
+        納入一筆沒有登記、但結果檔存在的結果 (例如其他行程剛寫入、還沒寫回中繼資料)，視為對應目前的語料庫。
+        回傳登記，結果檔不存在時回傳 None。呼叫端須持有 _lock。
+        """
+        try:
+            st = os.stat(self.path_for(key))
+        except OSError:
+            return None
+        self._entries[key] = {"bytes": st.st_size, "atime": time.time(), "hits": 0,
+                              "corpus": self._current_corpus(), "stored": st.st_mtime}
+        self._mark(key)
+        return self._entries[key]
+
+    @staticmethod
+    def _legacy_file(fn):
+        """舊版快取檔名 -> 關鍵字；不是舊版快取檔時回傳 None。"""
+        if not fn.endswith(".json") or fn == MANIFEST_NAME or fn in RESERVED_NAMES:
+            return None
+        name = fn[:-len(".json")]
+        if KEY_PATTERN.match(name):
+            return None
+        return name.replace("～", "*")
+
+    def _legacy_index(self):
+        """
+        回傳舊版快取檔 {快取鍵: 檔名}。只列出 cache 目錄的檔名 (不讀取內容)，
+        cache 目錄的 mtime 沒有改變 (沒有新增或刪除檔案) 時沿用上次的結果。
+        """
+        try:
+            mtime = os.stat(self.cache_dir).st_mtime_ns
+        except OSError:
+            return {}
+        with self._lock:
+            if self._legacy["mtime"] == mtime:
+                return self._legacy["index"]
+        index = {}
+        for fn in os.listdir(self.cache_dir):
+            keyword = self._legacy_file(fn)
+            if keyword is not None:
+                index[make_key(keyword, LEGACY_MODE, LEGACY_PARAMS)] = fn
+        with self._lock:
+            self._legacy = {"mtime": mtime, "index": index}
+        return index
+
+    def _legacy_path(self, key):
+        """回傳仍有效的舊版快取檔路徑；沒有或已過期 (語料庫已變動) 時回傳 None。"""
+        fn = self._legacy_index().get(key)
+        if fn is None:
+            return None
+        with self._lock:
+            if self.check_corpus and self._legacy_corpus != self._current_corpus():
+                # 與 _valid_entry 相同：corpus_watcher 可能已寫回新的指紋 (refresh_legacy)
+                self._reload()
+                if self._legacy_corpus != self._current_corpus(CORPUS_RECHECK_INTERVAL):
+                    self._counters["stale"] += 1
+                    return None
+        return os.path.join(self.cache_dir, fn)
+
+    def _read_legacy(self, key):
+        """讀取舊版快取檔，轉成 get_entry 的格式；沒有或無法讀取時回傳 None。"""
+        path = self._legacy_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                results = json.load(f)
+            if not isinstance(results, dict) or "_stat_" not in results:
+                raise ValueError("不是搜尋結果")
+        except Exception as e:
+            self.logger.warning("讀取舊版快取失敗：%s：%s", path, e)
+            return None
+        keyword = self._legacy_file(os.path.basename(path))
+        return {
+            "keyword": keyword,
+            "query": normalize_query(keyword),
+            "mode": LEGACY_MODE,
+            "params": dict(LEGACY_PARAMS),
+            "format": "raw",
+            "result": results,
+            # 舊版快取檔不納入管理，不能附帶預先壓縮的回應
+            "generation": None,
+        }
+
+    def migrate_legacy(self):
+        """
+        一次性轉換舊版快取檔 (由 python -m modules.result_cache --migrate 執行，一般啟動時不會呼叫)：
+        由檔名還原關鍵字 ('～' -> '*')，改寫成以 make_key 為檔名的新格式，並移除舊檔。
+        回傳轉換的筆數。
+        """
+        self._check_writable()
+        migrated = 0
+        for fn in sorted(os.listdir(self.cache_dir)):
+            keyword = self._legacy_file(fn)
+            if keyword is None:
+                continue
+            name = fn[:-len(".json")]
+            old_path = os.path.join(self.cache_dir, fn)
+            try:
+                with open(old_path, "r", encoding="utf-8") as f:
+                    results = json.load(f)
+            except Exception as e:
+                self.logger.warning("無法轉換舊版快取 %s：%s", fn, e)
+                continue
+            if not isinstance(results, dict) or "_stat_" not in results:
+                continue
+            key = make_key(keyword, LEGACY_MODE, LEGACY_PARAMS)
+            data = self._encode(keyword, LEGACY_MODE, LEGACY_PARAMS, results, "raw")
+            atomic_write(self.path_for(key), data)
+            os.remove(old_path)
+            old = self._entries.pop(name, None)
+            with self._lock:
+                if old is not None:
+                    self._pending["removed"][name] = time.time()
+                self._entries[key] = {
+                    "bytes": len(data),
+                    "atime": old["atime"] if old else time.time(),
+                    "hits": old["hits"] if old else 0,
+                    "corpus": old["corpus"] if old else self._legacy_corpus,
+                    "stored": time.time(),
+                }
+                self._mark(key)
+            migrated += 1
+        if migrated:
+            self.logger.info("已轉換 %d 筆舊版快取檔", migrated)
+            with self._lock:
+                self._evict()
+                self._save_manifest()
+        return migrated
+
+    def _adopt_unmanaged(self):
+        """
+        納入 cache 目錄中尚未登記的結果檔 (例如預先產生、隨專案佈署的快取)，
+        視為對應目前的語料庫；並移除已不存在的登記。回傳新增與移除的登記數。
+        """
+        now = time.time()
+        changed = 0
+        names = set()
+        responses = []
+        # 呼叫端 (__init__ / scan) 尚未與其他執行緒共用此物件，或已持有 _lock
+        for fn in os.listdir(self.cache_dir):
+            if RESPONSE_PATTERN.match(fn):
+                responses.append(fn)
+                continue
+            if not fn.endswith(".json") or fn == MANIFEST_NAME or fn in RESERVED_NAMES:
+                continue
+            key = fn[:-len(".json")]
+            if not KEY_PATTERN.match(key):
+                continue
+            names.add(key)
+            if key not in self._entries:
+                st = os.stat(os.path.join(self.cache_dir, fn))
+                self._entries[key] = {"bytes": st.st_size, "atime": now, "hits": 0, "corpus": self._corpus,
+                                      "stored": st.st_mtime}
+                self._mark(key)
+                changed += 1
+        for key in list(self._entries):
+            if key not in names:
+                del self._entries[key]
+                self._pending["removed"][key] = now
+                changed += 1
+        # 沒有登記的預先壓縮回應檔 (例如中繼資料還沒寫回)：由目前的結果產生的納入，其餘已不對應目前的結果，直接移除
+        for fn in responses:
+            key = RESPONSE_PATTERN.match(fn).group(1)
+            entry = self._entries.get(key)
+            if entry is not None and fn in entry.get("responses", {}):
+                continue
+            size = None
+            if entry is not None and self._response_generation(fn) == self._generation(key):
+                size = os.path.getsize(os.path.join(self.cache_dir, fn))
+            if size is not None:
+                entry.setdefault("responses", {})[fn] = size
+                self._mark(key)
+                changed += 1
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, fn))
+            except OSError:
+                pass
+        return changed
+
+    @staticmethod
+    def _encode(keyword, mode, params, results, fmt):
+        entry = {
+            "keyword": keyword,
+            "query": normalize_query(keyword),
+            "mode": mode,
+            "params": params or {},
+            "format": fmt,
+            "result": results,
+        }
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    @staticmethod
+    def _response_name(key, variant, encoding):
+        return f"{key}.{variant}.{RESPONSE_SUFFIXES[encoding]}"
+
+    def _remove_responses(self, entry):
+        """移除一筆結果的所有預先壓縮回應檔。呼叫端須持有 _lock。"""
+        for fn in entry.pop("responses", {}):
+            try:
+                os.remove(os.path.join(self.cache_dir, fn))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _entry_bytes(entry):
+        return entry["bytes"] + sum(entry.get("responses", {}).values())
+
+    def _current_corpus(self, max_age=CORPUS_CHECK_INTERVAL):
+        """回傳目前的語料庫指紋 (每 max_age 秒最多重新計算一次)。"""
+        now = time.time()
+        if now - self._corpus_checked >= max_age:
+            self._corpus = corpus_fingerprint(self.epub_dir)
+            self._corpus_checked = now
+        return self._corpus
+
+    def _check_writable(self):
+        """唯讀時 raise PermissionError (寫入結果檔的操作)。"""
+        if self.read_only:
+            raise PermissionError(f"結果快取為唯讀：{self.cache_dir}")
+
+    def _forget(self, key):
+        """只移除登記 (例如結果檔已被其他行程移除)，不刪除任何檔案；回傳原本的登記。呼叫端須持有 _lock。"""
+        entry = self._entries.pop(key, None)
+        self._pending["entries"].pop(key, None)
+        self._pending["hits"].pop(key, None)
+        self._pending["removed"][key] = time.time()
+        return entry
+
+    def _remove(self, key):
+        """移除一筆 (檔案與登記)。只由寫入端 (put、移除、容量整理) 呼叫。呼叫端須持有 _lock。"""
+        entry = self._forget(key)
+        if self.read_only:
+            return
+        if entry is not None:
+            self._remove_responses(entry)
+        try:
+            os.remove(self.path_for(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """超過容量時依 policy 移除，回傳移除的筆數。呼叫端須持有 _lock。"""
+        total = sum(self._entry_bytes(e) for e in self._entries.values())
+        if len(self._entries) <= self.max_entries and total <= self.max_bytes:
+            return 0
+        evicted = 0
+        if self.policy == "lfu":
+            order = sorted(self._entries, key=lambda k: (self._entries[k]["hits"], self._entries[k]["atime"]))
+        else:
+            order = sorted(self._entries, key=lambda k: self._entries[k]["atime"])
+        for key in order:
+            if len(self._entries) <= self.max_entries and total <= self.max_bytes:
+                break
+            total -= self._entry_bytes(self._entries[key])
+            self._remove(key)
+            self._counters["evictions"] += 1
+            evicted += 1
+            self.logger.debug("快取已滿，移除：%s", key)
+        return evicted
+
+    # ------------------------------------------
+    # 對外介面
+    # ------------------------------------------
+    def _valid_entry(self, key):
+        """
+        回傳仍有效的登記；沒有登記或語料庫已變動時回傳 None。
+        過期的結果只當作查不到 (不刪除檔案)，之後重新搜尋時由 put() 覆寫。呼叫端須持有 _lock。
+        """
+        corpus = self._current_corpus()
+        entry = self._entries.get(key)
+        if entry is None:
+            # 可能是其他行程剛寫入的結果：重新讀取中繼資料，仍沒有登記時直接查看結果檔
+            self._reload()
+            entry = self._entries.get(key) or self._adopt(key)
+        if entry is not None and self.check_corpus and entry["corpus"] != corpus:
+            # 可能是 corpus_watcher (其他行程) 已確認此結果不受影響並寫回中繼資料，
+            # 或本行程的指紋還沒更新：重新讀取中繼資料與指紋後再判斷
+            self._reload()
+            entry = self._entries.get(key)
+            corpus = self._current_corpus(CORPUS_RECHECK_INTERVAL)
+            if entry is not None and entry["corpus"] != corpus:
+                self._counters["stale"] += 1
+                entry = None
+        return entry
+
+    def _touch(self, key, entry):
+        """記錄一次命中。呼叫端須持有 _lock。"""
+        now = time.time()
+        entry["atime"] = now
+        entry["hits"] += 1
+        if key not in self._pending["entries"]:
+            hits = self._pending["hits"].get(key, (0, 0))[0]
+            self._pending["hits"][key] = (hits + 1, now)
+        self._counters["hits"] += 1
+        self._save_later()
+
+    def _save_later(self):
+        """距離上次寫回已超過 MANIFEST_SAVE_INTERVAL 秒時才寫回中繼資料。呼叫端須持有 _lock。"""
+        if time.time() - self._saved >= MANIFEST_SAVE_INTERVAL:
+            self._save_manifest()
+
+    def _generation(self, key):
+        """回傳結果檔目前的世代；不存在時回傳 None。"""
+        try:
+            return file_generation(os.stat(self.path_for(key)))
+        except OSError:
+            return None
+
+    def _response_generation(self, fn):
+        """回傳預先壓縮回應檔記錄的結果世代 (第一行)；無法讀取時回傳 None。"""
+        try:
+            with open(os.path.join(self.cache_dir, fn), "rb") as f:
+                return f.readline(RESPONSE_HEADER_MAX).rstrip(b"\n").decode("ascii")
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _read_response(self, key, fn):
+        """
+        回傳 (預先壓縮的回應 (不含第一行的世代), 回應檔大小)；檔案不存在，或不是由目前的結果檔產生
+        (結果已被重新寫入，可能是其他行程) 時回傳 (None, 0)。
+        回應檔是否有效只看檔案本身與結果檔，不需等待中繼資料寫回。
+        """
+        try:
+            with open(os.path.join(self.cache_dir, fn), "rb") as f:
+                raw = f.read()
+        except OSError:
+            return None, 0
+        generation, sep, data = raw.partition(b"\n")
+        if not sep or generation.decode("ascii", "replace") != self._generation(key):
+            return None, 0
+        return data, len(raw)
+
+    def _read_failed(self, key, error):
+        """
+        結果檔無法讀取：已不存在 (其他行程移除) 時只移除登記；其餘情況只記錄錯誤，
+        讀取端不刪除檔案 (之後重新搜尋時由 put() 覆寫)。
+        """
+        if isinstance(error, FileNotFoundError):
+            self.logger.debug("快取檔已不存在：%s", key)
+            with self._lock:
+                self._forget(key)
+        else:
+            self.logger.warning("讀取快取失敗：%s：%s", key, error)
+
+    def get(self, key):
+        """取得快取結果；不存在、已過期或檔案損毀時回傳 None。"""
+        entry = self.get_entry(key)
+        return None if entry is None else entry["result"]
+
+    def get_entry(self, key, touch=True):
+        """
+        取得整筆快取內容 {"keyword", "query", "mode", "params", "format", "result", "generation"}；
+        generation 為讀取的結果檔的世代 (舊版快取檔為 None)，產生預先壓縮的回應後傳給 put_response。
+        不存在、已過期或檔案損毀時回傳 None。沒有 format 欄位的舊檔視為 "raw"。
+        沒有登記時改讀同一查詢的舊版快取檔 (format 為 "raw")。
+        touch=False 時不計入命中統計與最後使用時間 (供維護工具讀取)。
+        """
+        with self._lock:
+            entry = self._valid_entry(key)
+        if entry is None:
+            data = self._read_legacy(key)
+            if touch:
+                with self._lock:
+                    self._counters["hits" if data is not None else "misses"] += 1
+            return data
+        try:
+            with open(self.path_for(key), "r", encoding="utf-8") as f:
+                generation = file_generation(os.fstat(f.fileno()))
+                data = json.load(f)
+            if "result" not in data:
+                raise ValueError("缺少 result 欄位")
+            data.setdefault("format", "raw")
+            data["generation"] = generation
+        except Exception as e:
+            self._read_failed(key, e)
+            if touch:
+                with self._lock:
+                    self._counters["misses"] += 1
+            return None
+        if touch:
+            with self._lock:
+                self._touch(key, entry)
+        return data
+
+    def get_response(self, key, variant, encoding):
+        """
+        取得預先壓縮好的回應 (bytes)，可直接作為 HTTP body 送出，不需解碼再重新編碼 JSON。
+        結果不存在、已過期或尚未產生此格式 / 壓縮方式時回傳 None。
+        """
+        fn = self._response_name(key, variant, encoding)
+        with self._lock:
+            entry = self._valid_entry(key)
+            if entry is None:
+                return None
+        data, size = self._read_response(key, fn)
+        with self._lock:
+            responses = entry.setdefault("responses", {})
+            if data is None:
+                if responses.pop(fn, None) is not None and key in self._entries:
+                    self._mark(key)
+                return None
+            if fn not in responses and key in self._entries:
+                # 其他行程產生、還沒寫回中繼資料的回應檔
+                responses[fn] = size
+                self._mark(key)
+            self._touch(key, entry)
+        return data
+
+    def put_response(self, key, variant, encoding, data, generation):
+        """
+        儲存一筆結果的預先壓縮回應；generation 為產生回應所用的結果的世代 (get_entry / put 的回傳值)。
+        結果本身不在快取中、已被重新寫入 (世代不同，例如其他行程或 corpus_watcher 剛 put) 或唯讀時
+        不儲存 (回傳 False)。重新 put() 或移除結果時，其回應檔會一併移除。
+        """
+        if self.read_only:
+            return False
+        fn = self._response_name(key, variant, encoding)
+        with self._lock:
+            entry = self._valid_entry(key)
+            if entry is None or generation is None or generation != self._generation(key):
+                return False
+            # 之後若結果檔在此之後才被其他行程改寫，讀取時世代不同，這個回應檔即無效
+            st = atomic_write(os.path.join(self.cache_dir, fn), generation.encode("ascii") + b"\n" + data)
+            entry.setdefault("responses", {})[fn] = st.st_size
+            self._mark(key)
+            self._evict()
+            # 回應檔本身即可判斷是否有效 (見 _read_response)，中繼資料與命中時一樣每隔一段時間才寫回
+            self._save_later()
+        return True
+
+    def put(self, key, results, keyword, mode="wildcard", params=None, fmt="raw", save=True):
+        """
+        寫入快取結果 (精簡 JSON，連同原始關鍵字、搜尋參數與結果格式 fmt)，必要時移除舊資料以維持容量。
+        以 atomic_write 寫入，並行的讀取端不會讀到寫到一半的檔案。
+        大量寫入時可傳 save=False，最後再呼叫 flush() 寫回中繼資料。
+        回傳寫入的結果檔的世代 (見 put_response)。
+        """
+        self._check_writable()
+        data = self._encode(keyword, mode, params, results, fmt)
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                # 結果已改變，舊的預先壓縮回應不再適用
+                self._remove_responses(old)
+            generation = file_generation(atomic_write(self.path_for(key), data))
+            self._entries[key] = {
+                "bytes": len(data),
+                "atime": time.time(),
+                "hits": 0,
+                "corpus": self._current_corpus(),
+                "query": normalize_query(keyword),
+                "mode": mode,
+                "params": params or {},
+                "books": sorted(k for k in results if k != "_stat_"),
+                "stored": time.time(),
+            }
+            self._mark(key)
+            self._counters["stores"] += 1
+            self._evict()
+            if save:
+                self._save_manifest()
+        return generation
+
+    def flush(self):
+        """寫回中繼資料檔。"""
+        with self._lock:
+            self._save_manifest()
+
+    def refresh(self, key):
+        """
+        將一筆結果標記為對應目前的語料庫 (呼叫端已確認 epub 的變動不影響此結果)。
+        不存在時回傳 False。
+        """
+        corpus = self._current_corpus()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not os.path.exists(self.path_for(key)):
+                return False
+            entry["corpus"] = corpus
+            self._mark(key)
+            return True
+
+    def refresh_legacy(self):
+        """
+        將 (還沒有新格式結果的) 舊版快取檔標記為對應目前的語料庫，並寫回中繼資料。
+        由 corpus_watcher 在所有受變動 epub 影響的查詢都已寫入新格式的結果 (取代舊檔) 之後呼叫。
+        """
+        corpus = self._current_corpus()
+        with self._lock:
+            self._legacy_corpus = corpus
+            self._pending["legacy_corpus"] = corpus
+            self._save_manifest()
+
+    def describe(self, key):
+        """
+        回傳一筆結果的 {"query", "mode", "params", "books"} (books 為有找到的經號)，不計入命中統計。
+        舊的登記沒有這些欄位時，讀取結果檔補上。不存在時回傳 None。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and "books" in entry:
+                return {f: entry[f] for f in ("query", "mode", "params", "books")}
+        if entry is None:
+            data = self._read_legacy(key)
+            if data is None:
+                return None
+            return {
+                "query": data["query"],
+                "mode": data["mode"],
+                "params": data["params"],
+                "books": sorted(k for k in data["result"] if k != "_stat_"),
+            }
+        try:
+            with open(self.path_for(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            info = {
+                "query": data["query"],
+                "mode": data["mode"],
+                "params": data["params"],
+                "books": sorted(k for k in data["result"] if k != "_stat_"),
+            }
+        except Exception as e:
+            self._read_failed(key, e)
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.update(info)
+            self._mark(key)
+        return info
+
+    def invalidate(self, key):
+        """移除一筆結果 (例如其經文已變動)。"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._counters["invalidations"] += 1
+
+    def sync_corpus(self):
+        """立即重新計算語料庫指紋 (不等 CORPUS_CHECK_INTERVAL)，之後的 put / refresh 都對應目前的語料庫。"""
+        corpus = corpus_fingerprint(self.epub_dir)
+        with self._lock:
+            self._corpus = corpus
+            self._corpus_checked = time.time()
+        return corpus
+
+    def invalidate_stale(self):
+        """移除所有語料庫指紋與目前不同的結果；回傳移除的筆數。"""
+        corpus = self.sync_corpus()
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["corpus"] != corpus]
+            for key in stale:
+                self._remove(key)
+            self._counters["invalidations"] += len(stale)
+            self._save_manifest()
+        return len(stale)
+
+    def keys(self):
+        """目前登記的所有快取鍵，以及還沒有新格式結果的舊版快取檔。"""
+        legacy = self._legacy_index()
+        with self._lock:
+            return list(self._entries) + [key for key in legacy if key not in self._entries]
+
+    def stats(self):
+        """回傳快取統計：筆數、總大小、容量設定與各項計數。"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return dict(
+                self._counters,
+                entries=len(self._entries),
+                bytes=sum(self._entry_bytes(e) for e in self._entries.values()),
+                responses=sum(len(e.get("responses", {})) for e in self._entries.values()),
+                max_entries=self.max_entries,
+                max_bytes=self.max_bytes,
+                policy=self.policy,
+                hit_ratio=(self._counters["hits"] / lookups) if lookups else 0.0,
+            )
+
+
+if __name__ == "__main__":
+    # 用法：python -m modules.result_cache [--migrate] [cache 目錄] [epub 目錄]
+    # 納入尚未登記的結果檔並依容量設定整理快取；加上 --migrate 時一次轉換所有舊版快取檔 (改名並刪除舊檔，佈署前執行一次)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = [a for a in sys.argv[1:] if a != "--migrate"]
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache_dir = args[0] if len(args) > 0 else os.path.join(project_root, "cache")
+    epub_dir = args[1] if len(args) > 1 else os.path.join(project_root, "epubs")
+    cache = ResultCache(cache_dir, epub_dir, logger=logging.getLogger("result_cache"))
+    cache.scan()
+    if "--migrate" in sys.argv[1:]:
+        cache.migrate_legacy()
+    print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
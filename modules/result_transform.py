@@ -0,0 +1,167 @@
+import os
+import re
+import sys
+import json
+import logging
+
+
+# 結果快取中已轉換 (段落已去重、去除重疊) 的格式名稱；未轉換的原始搜尋結果為 "raw"
+FORMAT = "transformed"
+
+_SPACES = re.compile(r'\s+')
+
+
+def remove_overlap(prev: str, curr: str, keyword: str, first_idx: int = None) -> str:
+    """
+    移除 prev 與 curr 之間的重疊片段，僅在 curr 前段(直到第一個 keyword 出現之前)完全與 prev 結尾重複時才去除，
+    確保關鍵字本身及其之後的內容完整保留。
+    first_idx 為 curr 中首個 keyword 的位置 (已由搜尋結果的位置得知時傳入，不需再搜尋 curr)。
+    (去除的長度 len(curr) - len(回傳值) 即高亮範圍需要平移的量)
+    """
+    # 找到 curr 中首個 keyword 的位置
+    if first_idx is None:
+        first_idx = curr.find(keyword)
+    # 若首個 keyword 不在開頭，且 prev 結尾包含 curr[:first_idx]
+    if first_idx > 0 and prev.endswith(curr[:first_idx]):
+        # 移除從開頭到關鍵字之前的重疊部分
+        return curr[first_idx:]
+    # 否則完整返回 curr
+    return curr
+
+
+def snippet_spans(hits, bounds):
+    """
+    每個 snippet 的高亮範圍：與 snippet (bounds 中的 [起點, 終點]) 重疊的 match (hits 中的 [起點, 終點, ...])，
+    以相對於 snippet 開頭的 [起點, 終點] 表示；跨越 snippet 邊界的 match 只取落在 snippet 內的部分。
+    hits 與 bounds 皆為遞增順序 (search_with_wildcard_in_documents 的 with_offsets)。
+    """
+    spans = []
+    i = 0
+    for start, end in bounds:
+        # 略過在這個 snippet 之前結束的 match
+        while i < len(hits) and hits[i][1] <= start:
+            i += 1
+        current = []
+        j = i
+        while j < len(hits) and hits[j][0] < end:
+            current.append([max(hits[j][0], start) - start, min(hits[j][1], end) - start])
+            j += 1
+        spans.append(current)
+    return spans
+
+
+def _keyword_positions(spans, keyword):
+    """
+    段落中完整出現 keyword 的位置 (由高亮範圍取得，與 p.count / p.find 相同，不需重新搜尋段落)。
+    含 '*' 的關鍵字在文字中不會字面出現 (p.count(keyword) 為 0)，回傳空 list，維持不去除重疊的結果。
+    """
+    if "*" in keyword:
+        return []
+    return [start for start, end in spans if end - start == len(keyword)]
+
+
+def _shift_spans(spans, shift):
+    """高亮範圍向前平移 shift 個字 (段落開頭被去除 shift 個字)，只保留仍在段落內的部分。"""
+    if not shift:
+        return spans
+    return [[max(start - shift, 0), end - shift] for start, end in spans if end > shift]
+
+
+def transform_book(value, keyword):
+    """
+    將一本經的原始搜尋結果 {"total", "pages", "sentences"} 轉換成顯示用的格式：
+    {"total", "pages", "paragraphs": [段落, ...], "paragraph_pages": [段落所在頁面, ...]}
+    段落依頁面順序彙整，去除重複 (壓縮空白後相同者) 與前後段落的重疊。
+    原始結果帶有 hits / bounds (search_with_wildcard_in_documents 的 with_offsets) 時，
+    以 match 的位置判斷段落中關鍵字的次數與位置 (不再以 p.count / p.find 重新搜尋)，
+    並另外回傳 "paragraph_spans": [[[高亮起點, 高亮終點], ...], ...]，與 paragraphs 一一對應 (已依去除的重疊平移)。
+    """
+    hits = value.get('hits')
+    bounds = value.get('bounds')
+    with_offsets = hits is not None and bounds is not None
+    # 收集段落 (記錄所在頁面與高亮範圍)
+    paras = []
+    for page, lst in value.get('sentences', {}).items():
+        page_spans = snippet_spans(hits.get(page, []), bounds[page]) if with_offsets else [None] * len(lst)
+        paras.extend((page, p, sp) for p, sp in zip(lst, page_spans))
+
+    # 去重：用 set + 簡易標準化
+    seen = set()
+    dedup = []
+    for page, p, sp in paras:
+        # 標準化：壓縮多重空白、去除頭尾空格
+        norm = _SPACES.sub(' ', p.strip())
+        if norm not in seen:
+            seen.add(norm)
+            dedup.append((page, p, sp))
+    # 處理重疊：段落中出現兩次以上關鍵字時，才可能與前一段重疊
+    processed = []
+    pages = []
+    spans = []
+    prev = None
+    for page, p, sp in dedup:
+        positions = _keyword_positions(sp, keyword) if sp is not None else None
+        count = len(positions) if positions is not None else p.count(keyword)
+        if prev is None or count < 2:
+            processed.append(p)
+            pages.append(page)
+            spans.append(sp)
+        else:
+            trimmed = remove_overlap(prev, p, keyword, positions[0] if positions is not None else None)
+            if trimmed.strip():
+                processed.append(trimmed)
+                pages.append(page)
+                spans.append(_shift_spans(sp, len(p) - len(trimmed)) if sp is not None else None)
+        prev = p
+    book = {
+        'total': value.get('total', 0),
+        'pages': value.get('pages', {}),
+        'paragraphs': processed,
+        'paragraph_pages': pages,
+    }
+    if with_offsets:
+        book['paragraph_spans'] = spans
+    return book
+
+
+def transform_results(results, keyword):
+    """轉換整份搜尋結果 (每本經呼叫 transform_book，_stat_ 原樣保留)。"""
+    transformed = {}
+    for key, value in results.items():
+        transformed[key] = value if key == '_stat_' else transform_book(value, keyword)
+    return transformed
+
+
+def upgrade_cache(cache, logger=None):
+    """
+    將結果快取中所有原始格式 ("raw") 的結果轉換成 FORMAT 並寫回，之後的命中不再需要轉換。
+    cache 為 result_cache.ResultCache；回傳轉換的筆數。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    upgraded = 0
+    for key in cache.keys():
+        cached = cache.get_entry(key)
+        if cached is None or cached["format"] == FORMAT:
+            continue
+        results = transform_results(cached["result"], cached["query"])
+        cache.put(key, results, cached["keyword"], cached["mode"], cached["params"], fmt=FORMAT, save=False)
+        upgraded += 1
+    cache.flush()
+    logger.info(f"已轉換 {upgraded} 筆快取結果")
+    return upgraded
+
+
+if __name__ == "__main__":
+    # 用法：python -m modules.result_transform [cache 目錄] [epub 目錄]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if __package__:
+        from .result_cache import ResultCache
+    else:
+        from result_cache import ResultCache
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(project_root, "cache")
+    epub_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(project_root, "epubs")
+    cache = ResultCache(cache_dir, epub_dir, logger=logging.getLogger("result_transform"))
+    upgrade_cache(cache, logger=logging.getLogger("result_transform"))
+    print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
@@ -1,422 +1,755 @@
-import os
-import json
-import logging
-import re
-import ebooklib
-from ebooklib import epub
-from bs4 import BeautifulSoup
-import pickle  # 新增：用於序列化快取結果
-from typing import Dict, List, Any
-
-# 嘗試匯入第三方 regex，失敗則 fallback to built-in re
-try:
-    import regex as re_mod
-    HAS_REGEX = True
-except ImportError:
-    import re as re_mod
-    HAS_REGEX = False
-
-
-# 模組與專案目錄設定
-MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
-PROJECT_ROOT = os.path.dirname(MODULE_DIR)
-# 磁碟層級快取解析後的 EPUB documents
-CACHE_DIR = os.path.join(MODULE_DIR, ".cache_epub")
-os.makedirs(CACHE_DIR, exist_ok=True)
-
-
-# 建立 console logger
-MY_SCRIPT_NAME = os.path.basename(__file__)
-logger = logging.getLogger(MY_SCRIPT_NAME)
-# logger.setLevel(logging.DEBUG)
-# logger.setLevel(logging.INFO)
-logger.setLevel(logging.WARNING)
-handler = logging.StreamHandler()
-# 設定 Formatter：包含檔案名稱、行號、函式名稱，以及僅顯示 log level 首字母
-formatter = logging.Formatter(
-    '[%(asctime)s] <%(filename)s:%(lineno)d> (%(funcName)s) [%(levelname).1s] %(message)s'
-)
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-
-
-def sanitize_filename(keyword):
-    return keyword.replace("*", "～")
-
-
-def load_epub(epub_path, logger=None, ignore_cache=False):
-    """
-    讀取並解析 EPUB 檔案，並利用磁碟快取避免重複解析。
-    回傳一個包含所有文檔內容的字典。
-    """
-    if logger is None:
-        logger = logging.getLogger(__name__)
-
-    if not os.path.exists(epub_path):
-        logger.error(f"File not found: {epub_path}")
-        return None  # 若檔案不存在，直接回傳 None
-
-    # 1. 計算快取檔路徑：使用 epub 檔名當作唯一 ID
-    epub_id = os.path.splitext(os.path.basename(epub_path))[0]
-    cache_path = os.path.join(CACHE_DIR, f"{epub_id}.pkl")
-    # 2. 若快取存在且比原 epub 更新，就直接讀取快取 
-    if ignore_cache == False and os.path.exists(cache_path):
-        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(epub_path):
-            logger.debug(f"從快取載入 EPUB：{epub_path}")
-            with open(cache_path, "rb") as cf:
-                return pickle.load(cf)
-
-    # 3. 快取不存在或已過期，重新解析 EPUB
-    logger.debug(f"解析 EPUB 並更新快取：{epub_path}")
-    book = epub.read_epub(epub_path)
-
-    # 遍歷書中所有文件，抽出純文字
-    documents = {}
-    for item in book.get_items():
-        if item.get_type() == ebooklib.ITEM_DOCUMENT:
-            soup = BeautifulSoup(item.get_content(), 'html.parser')
-            page_number = item.get_name()
-            if page_number.lower() == "toc.xhtml":
-                continue
-            # 去除 HTML 標籤後的純文字
-            documents[page_number] = soup.get_text()
-
-    # 4. 解析完成後，將結果寫入快取
-    try:
-        with open(cache_path, "wb") as cf:
-            pickle.dump(documents, cf)
-        logger.info(f"已更新快取檔：{cache_path}")
-    except Exception as e:
-        logger.error(f"快取寫入失敗：{e}")
-
-    return documents
-
-
-# 再次優化後的 search_with_wildcard_in_documents 函式
-def search_with_wildcard_in_documents(
-    documents: Dict[str, str], keyword: str, default_len: int = 60, logger=None
-) -> Dict[str, any]:
-    """
-    支援萬用字元的全文搜尋，並依照 match 逐一擷取不重疊 snippet，
-    確保每個 snippet 至少長度 default_len，完全包含關鍵字，
-    並回傳包含 total, pages, sentences 的結果結構。
-    """
-    if logger is None:
-        logger = logging.getLogger(__name__)
-
-    # 編譯 pattern： '*' 萬用字元對應任一中文字
-    # pattern = re.compile(re.escape(keyword).replace(r"\*", r"[一-鿿]"))
-    escaped = re_mod.escape(keyword)
-    if HAS_REGEX:
-        # 用 \p{Han} 匹配所有漢字
-        wildcard_pattern = escaped.replace(r"\*", r"\p{Han}")
-        pattern = re_mod.compile(wildcard_pattern, flags=re_mod.UNICODE)
-    else:
-        # 內建 re 無法 \p{Han}，改為手動列出常用與擴充A~F範圍
-        bracket = (
-            r"[\u3400-\u4DBF\u4E00-\u9FFF"
-            r"\U00020000-\U0002A6DF"
-            r"\U0002A700-\U0002B73F"
-            r"\U0002B740-\U0002B81F"
-            r"\U0002B820-\U0002CEAF"
-            r"\U0002CEB0-\U0002EBEF]"
-        )
-        wildcard_pattern = escaped.replace(r"\*", bracket)
-        pattern = re_mod.compile(wildcard_pattern)
-
-    raw_keyword = keyword.replace("*", "")
-    kw_len = len(raw_keyword)
-    result: Dict[str, Any] = {"total": 0, "pages": {}, "sentences": {}}
-
-    for page, text in documents.items():
-        # 清理
-        clean_text = re_mod.sub(r"[\n\t\r]", "", text)
-        clean_text = re_mod.sub(r"\s+", "", clean_text)
-        text_len = len(clean_text)
-
-        # 找到所有 match
-        matches = list(pattern.finditer(clean_text))
-        if not matches:
-            continue
-
-        # 統計次數
-        match_count = len(matches)
-        result["total"] += match_count
-        result["pages"][page] = match_count
-
-        # 不重疊 snippet 擷取
-        snippets: List[str] = []
-        next_search_pos = 0
-
-        for m in matches:
-            # 跳過已在先前 snippet 中的 match
-            if m.start() < next_search_pos:
-                continue
-
-            # 詳細 log
-            logger.debug(f"search_with_wildcard: page={page}, match_start={m.start()}")
-
-            # 計算置中起點與結尾
-            center = m.start() + kw_len // 2
-            half_len = default_len // 2
-            start = max(center - half_len, next_search_pos)
-            end = start + default_len
-            if end > text_len:
-                end = text_len
-                start = max(text_len - default_len, next_search_pos)
-
-            # 偵測並補足被截斷的關鍵字尾部
-            snippet = clean_text[start:end]
-            for i in range(1, kw_len):
-                if snippet.endswith(raw_keyword[:i]) and end + (kw_len - i) <= text_len:
-                    end += (kw_len - i)
-                    snippet = clean_text[start:end]
-                    break
-
-            # Log 片段資訊
-            logger.debug(
-                f"snippet range: start={start}, end={end}, preview={snippet[:30]}…"
-            )
-
-            snippets.append(snippet)
-            next_search_pos = end
-
-        result["sentences"][page] = snippets
-
-    return result
-
-
-
-def search_in_documents(documents, keyword, logger=None):
-    """
-    在已解析的文檔中搜尋關鍵字。回傳一個 dict，包含以下資訊：
-    - total: 總共找到幾次   
-    - pages: 包含每一頁找到幾次
-    - sentences: 包含每一頁找到的句子
-    """
-    if logger is None:
-        logger = logging.getLogger(__name__)
-
-    search_word = keyword.lower()
-    logger.debug(f"Search keyword: {search_word}")
-    result = {
-        "total": 0,
-        "pages": {},
-        "sentences": {}
-    }
-
-    # 遍历所有文档内容
-    for page_number, text in documents.items():
-        # 先將 text 中的特殊字元 (ex: \n, \t) 去除, 並將所有空格替換為空字串
-        text = re.sub(r'[\n\t\r]', '', text)
-        text = re.sub(r'\s+', '', text).strip()
-        # 统计关键字在当前文档中出现的次数
-        count = text.count(search_word)
-        if count > 0:
-            # 更新结果字典
-            result["total"] += count
-            result["pages"][page_number] = count
-            # 提取所有包含關鍵字的一段文字, 這段文字總長度是 60+關鍵字長度, 且關鍵字在中間, 兩邊各 30 個字元
-            # 需注意的是, 這段文字可能會跨行, 也可能包含多個相同關鍵字, 但是都需要分別列出
-            keyword_sentences = [] # 用來存放包含關鍵字的句子
-            for match in re.finditer(search_word, text):
-                start = max(0, match.start() - 30)
-                end = min(len(text), match.end() + 30)
-                keyword_sentences.append(text[start:end])
-            result["sentences"][page_number] = keyword_sentences
-            logger.debug(f"Found {count} instances on page {page_number}")
-    return result
-
-
-def search_one_epub(epub_path, keyword, logger=None, ignore_cache=False):
-    """
-    用關鍵字 keyword 去一個 epub 檔案 (epub_path) 中找尋包含此關鍵字的句子。
-    回傳一個 dict，包含以下資訊：
-    - total: 總共找到幾次   
-    - pages: 包含每一頁找到幾次
-    - sentences: 包含每一頁找到的句子
-    """
-    if logger is None:
-        logger = logging.getLogger(__name__)
-
-    documents = load_epub(epub_path, logger=logger, ignore_cache=ignore_cache)
-    if documents is None:
-        return {
-            "total": 0,
-            "pages": {},
-            "sentences": {}
-        }
-    return search_in_documents(documents, keyword, logger)
-
-
-def search_wildcard_one_epub(epub_path, keyword, logger=None, ignore_cache=False):
-    """
-    用關鍵字 keyword 去一個 epub 檔案 (epub_path) 中找尋包含此關鍵字的句子。
-    回傳一個 dict，包含以下資訊：
-    - total: 總共找到幾次   
-    - pages: 包含每一頁找到幾次
-    - sentences: 包含每一頁找到的句子
-    """
-    if logger is None:
-        logger = logging.getLogger(__name__)
-
-    documents = load_epub(epub_path, logger=logger, ignore_cache=ignore_cache)
-    if documents is None:
-        return {
-            "total": 0,
-            "pages": {},
-            "sentences": {}
-        }
-    # --> for debugging
-    # logger.warning(f"Searching '{keyword}' in '{epub_path}'")
-    # if 'T1251' in epub_path:
-        # --> 將 documents 轉成 json 格式, 並寫入到 "D:\cbeta_v3\output\cache_by_words_test\T1251.json" 檔案中
-        # with open("D:\\cbeta_v3\\output\\cache_by_words_test\\T1251.json", "w", encoding="utf-8") as f:
-        #     json.dump(documents, f, ensure_ascii=False, indent=4)
-        # logger.warning(f"wrote the document to 'D:\\cbeta_v3\\output\\cache_by_words_test\\T1251.json'")
-    return search_with_wildcard_in_documents(documents, keyword, logger=logger)
-
-
-def search_multiple_epubs(epub_paths, keyword, logger=None, ignore_cache=False):
-    """
-    用一個關鍵字去多個 epub 檔案 (epub_paths) 中找尋包含這些關鍵字的句子。
-    回傳一個 dict，包含每個關鍵字在每個檔案代號中的搜尋結果, 例如:
-    {
-        "T0853": {
-            "total": 1,
-            "pages": {
-                "juans/002.xhtml": 1
-            },
-            "sentences": {
-                "juans/002.xhtml": [
-                    "..."
-                ]
-            }
-        },
-        "T0866": {
-            "total": 1,
-            "pages": {
-                "juans/001.xhtml": 1
-            },
-            "sentences": {
-                "juans/001.xhtml": [
-                    "..."
-                ]
-            }
-        },
-
-    """
-    if logger is None:
-        logger = logging.getLogger(__name__)
-
-    results = {}
-    for epub_path in epub_paths:
-        # 提取檔名並去掉副檔名
-        base_name = os.path.splitext(os.path.basename(epub_path))[0]
-        logger.debug(f"Searching keyword in '{epub_path}'")        
-        results[base_name]  = search_one_epub(epub_path, keyword, logger, ignore_cache)
-    return results
-
-
-def search_wildcard_multiple_epubs(epub_paths, keyword, logger=None):
-    """
-    用一個關鍵字去多個 epub 檔案 (epub_paths) 中找尋包含這些關鍵字的句子。
-    回傳一個 dict，包含每個關鍵字在每個檔案代號中的搜尋結果, 例如:
-    {
-        "T0853": {
-            "total": 1,
-            "pages": {
-                "juans/002.xhtml": 1
-            },
-            "sentences": {
-                "juans/002.xhtml": [
-                    "..."
-                ]
-            }
-        },
-        "T0866": {
-            "total": 1,
-            "pages": {
-                "juans/001.xhtml": 1
-            },
-            "sentences": {
-                "juans/001.xhtml": [
-                    "..."
-                ]
-            }
-        },
-
-    """
-    if logger is None:
-        logger = logging.getLogger(__name__)
-
-    results = {}
-    for epub_path in epub_paths:
-        # 提取檔名並去掉副檔名
-        base_name = os.path.splitext(os.path.basename(epub_path))[0]
-        # logger.warning(f"Searching '{keyword}' in '{epub_path}'")    
-        ret = search_wildcard_one_epub(epub_path, keyword, logger=logger, ignore_cache=False)
-        if ret["total"] > 0:
-            results[base_name] = ret
-    return results
-
-
-def search_multiple_epubs_stat(epub_paths, keyword, logger=None):
-    """
-    呼叫 search_multiple_epubs(), 並將結果統計成一個 dict, 包含以下資訊:
-    - found_epubs: 總共在幾個 epub 檔案中出現
-    - found_juans: 總共在幾卷經文中出現
-    - total: 總共出現幾次 (所有 epub 累計)
-    """
-    if logger is None:
-        logger = logging.getLogger(__name__)
-
-    results = search_multiple_epubs(epub_paths, keyword, logger)
-
-    # 統計結果
-    results['_stat_'] = {
-        "found_epubs": 0,
-        "found_juans": 0,
-        "total": 0
-    }
-    for epub_id in results:
-        if epub_id == '_stat_':
-            continue
-        if results[epub_id]["total"] > 0:
-            results['_stat_']["found_epubs"] += 1
-            if results[epub_id].get("pages") and len(results[epub_id]["pages"]) > 0:
-                results['_stat_']["found_juans"] += len(results[epub_id]["pages"])
-            results['_stat_']["total"] += results[epub_id]["total"]
-   
-    return results
-
-
-def search_wildcard_multiple_epubs_stat(epub_paths, keyword, logger=None):
-    """
-    呼叫 search_multiple_epubs(), 並將結果統計成一個 dict, 包含以下資訊:
-    - found_epubs: 總共在幾個 epub 檔案中出現
-    - found_juans: 總共在幾卷經文中出現
-    - total: 總共出現幾次 (所有 epub 累計)
-    """
-    if logger is None:
-        logger = logging.getLogger(__name__)
-
-    results = search_wildcard_multiple_epubs(epub_paths, keyword, logger)
-
-    # 統計結果
-    results['_stat_'] = {
-        "found_epubs": 0,
-        "found_juans": 0,
-        "total": 0
-    }
-    for epub_id in results:
-        if epub_id == '_stat_':
-            continue
-        if results[epub_id]["total"] > 0:
-            results['_stat_']["found_epubs"] += 1
-            if results[epub_id].get("pages") and len(results[epub_id]["pages"]) > 0:
-                results['_stat_']["found_juans"] += len(results[epub_id]["pages"])
-            results['_stat_']["total"] += results[epub_id]["total"]
-   
-    return results
-
+import os
+import time
+import json
+import logging
+import re
+import threading
+import pickle  # 新增：用於序列化快取結果
+from typing import Dict, List, Any
+
+# 嘗試匯入第三方 regex，失敗則 fallback to built-in re
+try:
+    import regex as re_mod
+    HAS_REGEX = True
+except ImportError:
+    import re as re_mod
+    HAS_REGEX = False
+
+# 同時支援以套件 (modules.search_epub) 或直接由 modules 目錄匯入
+if __package__:
+    from . import ngram_index
+    from . import corpus_store
+    from . import metrics
+else:
+    import ngram_index
+    import corpus_store
+    import metrics
+
+# 模組與專案目錄設定
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(MODULE_DIR)
+# 磁碟層級快取解析後的 EPUB documents
+# (目錄在第一次寫入快取時才建立，import 時不碰檔案系統；可由 EPUB_CACHE_DIR 改用其他目錄，例如 benchmark 的暫存複本)
+CACHE_DIR = os.environ.get("EPUB_CACHE_DIR") or os.path.join(MODULE_DIR, ".cache_epub")
+# 快取檔格式版本：
+# 1 (無版本欄位) -> 只有 {頁面名稱: 原始文字}
+# 2             -> {"version": 2, "documents": {頁面名稱: 原始文字}, "clean": {頁面名稱: 清理後文字}}
+EPUB_CACHE_VERSION = 2
+# 多本 epub 平行搜尋時的 process 數量；0 或 1 表示維持單一 process 逐本搜尋
+SEARCH_WORKERS = int(os.environ.get("SEARCH_WORKERS", "0"))
+
+
+# 建立 console logger
+MY_SCRIPT_NAME = os.path.basename(__file__)
+logger = logging.getLogger(MY_SCRIPT_NAME)
+# logger.setLevel(logging.DEBUG)
+# logger.setLevel(logging.INFO)
+logger.setLevel(logging.WARNING)
+handler = logging.StreamHandler()
+# 設定 Formatter：包含檔案名稱、行號、函式名稱，以及僅顯示 log level 首字母
+formatter = logging.Formatter(
+    '[%(asctime)s] <%(filename)s:%(lineno)d> (%(funcName)s) [%(levelname).1s] %(message)s'
+)
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+
+# 行程內共用的 process pool：(worker 數量, executor)
+_pool = {"workers": 0, "executor": None}
+
+
+def _epub_text():
+    """epub 解析 (zipfile / lxml) 只在快取不存在或過期、真的需要解析時才載入。"""
+    if __package__:
+        from . import epub_text
+    else:
+        import epub_text
+    return epub_text
+
+
+def _get_pool(workers):
+    """取得 (必要時建立) 指定 worker 數量的 process pool，跨 request 重複使用。"""
+    # multiprocessing 只在啟用平行搜尋時才載入
+    from concurrent.futures import ProcessPoolExecutor
+
+    if _pool["executor"] is None or _pool["workers"] != workers:
+        if _pool["executor"] is not None:
+            _pool["executor"].shutdown(wait=False)
+        _pool["executor"] = ProcessPoolExecutor(max_workers=workers)
+        _pool["workers"] = workers
+    return _pool["executor"]
+
+
+def _imap_books(func, jobs, workers=None):
+    """
+    對每個 job 呼叫 func，並依 jobs 的順序逐一產出結果。
+    workers > 1 時分散到 process pool 執行；不論 worker 數量為何，結果順序都相同。
+    """
+    if workers is None:
+        workers = SEARCH_WORKERS
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield func(job)
+        return
+    executor = _get_pool(workers)
+    # 每個 worker 一次領取數本，降低 process 間傳遞的次數
+    chunksize = max(1, len(jobs) // (workers * 4))
+    try:
+        yield from executor.map(func, jobs, chunksize=chunksize)
+    except Exception:
+        # pool 損壞 (例如 worker 被系統終止) 時丟棄，下次重新建立
+        _pool["executor"] = None
+        raise
+
+
+def _map_books(func, jobs, workers=None):
+    """同 _imap_books，但一次回傳所有結果的 list。"""
+    return list(_imap_books(func, jobs, workers))
+
+
+def _search_one_job(job):
+    """process pool 用的 search_one_epub 包裝 (須為模組層級函式才能 pickle)。"""
+    epub_path, keyword, ignore_cache = job
+    return search_one_epub(epub_path, keyword, ignore_cache=ignore_cache)
+
+
+def _search_wildcard_one_job(job):
+    """process pool 用的 search_wildcard_one_epub 包裝 (須為模組層級函式才能 pickle)。"""
+    epub_path, keyword, pages, default_len, with_offsets = job
+    return search_wildcard_one_epub(epub_path, keyword, pages=pages, default_len=default_len, with_offsets=with_offsets)
+
+
+def clean_page_text(text):
+    """
+    清除頁面文字中的換行、定位字元與所有空白，回傳搜尋時實際比對的純文字。
+    """
+    text = re_mod.sub(r"[\n\t\r]", "", text)
+    return re_mod.sub(r"\s+", "", text)
+
+
+def _write_epub_cache(cache_path, documents, logger):
+    """
+    將原始文字與清理後文字一起寫入快取檔 (版本 EPUB_CACHE_VERSION)，並回傳快取內容。
+    先寫入暫存檔再以 os.replace 換上，並行的讀取端 (其他 worker) 不會讀到寫到一半的檔案。
+    """
+    cached = {
+        "version": EPUB_CACHE_VERSION,
+        "documents": documents,
+        "clean": {page: clean_page_text(text) for page, text in documents.items()},
+    }
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, "wb") as cf:
+            pickle.dump(cached, cf)
+        os.replace(tmp_path, cache_path)
+        logger.info(f"已更新快取檔：{cache_path}")
+    except Exception as e:
+        logger.error(f"快取寫入失敗：{e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return cached
+
+
+def load_epub(epub_path, logger=None, ignore_cache=False, clean=False):
+    """
+    讀取並解析 EPUB 檔案，並利用磁碟快取避免重複解析。
+    回傳一個包含所有文檔內容的字典；若 clean 為 True，回傳的是已清理 (去除空白) 的文字，
+    可直接交給 search_in_documents / search_with_wildcard_in_documents (is_clean=True) 使用。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    if not os.path.exists(epub_path):
+        logger.error(f"File not found: {epub_path}")
+        return None  # 若檔案不存在，直接回傳 None
+
+    content_key = "clean" if clean else "documents"
+    # 1. 計算快取檔路徑：使用 epub 檔名當作唯一 ID
+    epub_id = os.path.splitext(os.path.basename(epub_path))[0]
+    cache_path = os.path.join(CACHE_DIR, f"{epub_id}.pkl")
+    # 2. 若快取存在且比原 epub 更新，就直接讀取快取 
+    if ignore_cache == False and os.path.exists(cache_path):
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(epub_path):
+            logger.debug(f"從快取載入 EPUB：{epub_path}")
+            with metrics.stage("load_epub"), open(cache_path, "rb") as cf:
+                cached = pickle.load(cf)
+            if cached.get("version") == EPUB_CACHE_VERSION:
+                return cached[content_key]
+            if "version" not in cached:
+                # 舊版快取只有原始文字：補上清理後文字並升級，不需重新解析 EPUB
+                logger.info(f"升級舊版快取檔：{cache_path}")
+                return _write_epub_cache(cache_path, cached, logger)[content_key]
+
+    # 3. 快取不存在或已過期，重新解析 EPUB
+    logger.debug(f"解析 EPUB 並更新快取：{epub_path}")
+    # 以 zipfile + lxml 直接抽出每個文件的純文字 (略過 toc.xhtml)，
+    # 清理後的文字 (clean) 與 ebooklib + BeautifulSoup 相同 (可用 python -m modules.epub_text --verify 比對)；
+    # 未清理的 documents 只有空白不同
+    with metrics.stage("parse"):
+        documents = _epub_text().extract_documents(epub_path)
+        # 4. 解析完成後，將結果寫入快取
+        return _write_epub_cache(cache_path, documents, logger)[content_key]
+
+
+# 內建 re 無法使用 \p{Han}，改為手動列出常用與擴充A~F範圍
+HAN_BRACKET = (
+    r"[\u3400-\u4DBF\u4E00-\u9FFF"
+    r"\U00020000-\U0002A6DF"
+    r"\U0002A700-\U0002B73F"
+    r"\U0002B740-\U0002B81F"
+    r"\U0002B820-\U0002CEAF"
+    r"\U0002CEB0-\U0002EBEF]"
+)
+# 單一萬用字元 '*' 可對應的字元 (與 compile_wildcard_pattern 相同的定義)
+if HAS_REGEX:
+    HAN_CHAR = re_mod.compile(r"\p{Han}", flags=re_mod.UNICODE)
+else:
+    HAN_CHAR = re_mod.compile(HAN_BRACKET)
+
+
+def compile_wildcard_pattern(keyword):
+    """將關鍵字編譯成 regex pattern：'*' 萬用字元對應任一中文字。"""
+    # pattern = re.compile(re.escape(keyword).replace(r"\*", r"[一-鿿]"))
+    escaped = re_mod.escape(keyword)
+    if HAS_REGEX:
+        # 用 \p{Han} 匹配所有漢字
+        wildcard_pattern = escaped.replace(r"\*", r"\p{Han}")
+        return re_mod.compile(wildcard_pattern, flags=re_mod.UNICODE)
+    wildcard_pattern = escaped.replace(r"\*", HAN_BRACKET)
+    return re_mod.compile(wildcard_pattern)
+
+
+def plan_wildcard(keyword):
+    """
+    分析萬用字元關鍵字，拆出字面片段與 '*' 的位置。例如 "*金剛**"：
+    - literals: [(1, "金剛")]          (片段在關鍵字中的偏移, 片段文字)
+    - wildcards: [0, 3, 4]            ('*' 在關鍵字中的偏移)
+    - anchor: (1, "金剛")              (最長的字面片段，用來做快速子字串搜尋)
+    - length: 5                       (每個 match 的固定長度)
+    若關鍵字沒有任何字面片段 (例如 "**")，回傳 None，由呼叫端改用 regex 掃描。
+    """
+    literals = []
+    wildcards = []
+    current, current_start = "", 0
+    for i, ch in enumerate(keyword):
+        if ch == "*":
+            if current:
+                literals.append((current_start, current))
+                current = ""
+            wildcards.append(i)
+        else:
+            if not current:
+                current_start = i
+            current += ch
+    if current:
+        literals.append((current_start, current))
+    if not literals:
+        return None
+
+    anchor = max(literals, key=lambda lit: len(lit[1]))
+    return {
+        "literals": [lit for lit in literals if lit is not anchor],
+        "wildcards": wildcards,
+        "anchor": anchor,
+        "length": len(keyword),
+    }
+
+
+def page_text(text, needle=""):
+    """
+    回傳頁面的字串。打包語料庫的頁面 (PackedPage) 先以 needle 直接搜尋 mmap 的 bytes，
+    找不到時回傳 None (不解碼)；找到時才一次解碼整頁，之後的比對與擷取都在字串上進行
+    (逐字透過 PackedPage 比對與切片反而比較慢)。
+    """
+    if isinstance(text, str):
+        return text
+    if needle and text.find(needle) < 0:
+        return None
+    return str(text)
+
+
+def find_wildcard_matches(text, plan):
+    """
+    依 plan_wildcard 的結果在 text 中找出所有不重疊 match 的起點。
+    text 通常是 str (打包語料庫的頁面先經 page_text 解碼)；PackedPage 也可以 (只用到 len / find / startswith / 索引)。
+    先以 str.find 找最長字面片段 (anchor)，再只檢查其餘字面片段與 '*' 的位置，
+    結果與 compile_wildcard_pattern(keyword).finditer(text) 的各個 m.start() 相同。
+    """
+    anchor_offset, anchor = plan["anchor"]
+    literals = plan["literals"]
+    wildcards = plan["wildcards"]
+    length = plan["length"]
+    text_len = len(text)
+
+    starts = []
+    pos = anchor_offset
+    while True:
+        hit = text.find(anchor, pos)
+        if hit < 0:
+            break
+        start = hit - anchor_offset
+        if start + length > text_len:
+            break
+        if all(text.startswith(lit, start + offset) for offset, lit in literals) and \
+                all(HAN_CHAR.match(text[start + offset]) for offset in wildcards):
+            starts.append(start)
+            # match 長度固定，下一個 match 只能從這個 match 結尾之後開始
+            pos = start + length + anchor_offset
+        else:
+            pos = hit + 1
+    return starts
+
+
+# 再次優化後的 search_with_wildcard_in_documents 函式
+def search_with_wildcard_in_documents(
+    documents: Dict[str, str], keyword: str, default_len: int = 60, logger=None, is_clean: bool = False,
+    with_offsets: bool = False
+) -> Dict[str, any]:
+    """
+    支援萬用字元的全文搜尋，並依照 match 逐一擷取不重疊 snippet，
+    確保每個 snippet 至少長度 default_len，完全包含關鍵字，
+    並回傳包含 total, pages, sentences 的結果結構。
+    關鍵字含有字面片段時，以 plan_wildcard / find_wildcard_matches 取代整頁 regex 掃描。
+    若 is_clean 為 True，表示 documents 已是 load_epub(clean=True) 的清理後文字，不再重複清理。
+    若 with_offsets 為 True，另外回傳 (位置皆為清理後文字中的字元 (code point) 位置)：
+    - hits: {頁面: [[起點, 終點, ['*' 對應字元的位置, ...]], ...]} (見 match_hits)
+    - bounds: {頁面: [[snippet 起點, 終點], ...]}，與 sentences 的 snippet 一一對應
+    result_transform 以兩者計算每段的高亮範圍並判斷段落重疊，前端與轉換都不需再重新比對關鍵字。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    plan = plan_wildcard(keyword)
+    pattern = compile_wildcard_pattern(keyword) if plan is None else None
+
+    raw_keyword = keyword.replace("*", "")
+    result: Dict[str, Any] = {"total": 0, "pages": {}, "sentences": {}}
+    if with_offsets:
+        result["hits"] = {}
+        result["bounds"] = {}
+    # 耗時只在整本結束時記錄一次 (snippet 只在有 match 的頁面計時，其餘皆算 scan)
+    t0 = time.perf_counter()
+    snippet_seconds = 0.0
+
+    for page, text in documents.items():
+        # 清理
+        clean_text = text if is_clean else clean_page_text(text)
+
+        # 打包語料庫的頁面：先在 mmap 上找最長字面片段，沒有時不需解碼整頁
+        clean_text = page_text(clean_text, plan["anchor"][1] if plan is not None else "")
+        if clean_text is None:
+            continue
+        # 找到所有 match 的起點
+        if plan is not None:
+            matches = find_wildcard_matches(clean_text, plan)
+        else:
+            matches = [m.start() for m in pattern.finditer(clean_text)]
+        if not matches:
+            continue
+
+        # 統計次數
+        match_count = len(matches)
+        result["total"] += match_count
+        result["pages"][page] = match_count
+        t1 = time.perf_counter()
+        if with_offsets:
+            snippets, bounds = extract_snippets(clean_text, matches, raw_keyword, default_len, logger, with_bounds=True)
+            result["hits"][page] = match_hits(matches, keyword)
+            result["bounds"][page] = bounds
+        else:
+            snippets = extract_snippets(clean_text, matches, raw_keyword, default_len, logger)
+        result["sentences"][page] = snippets
+        snippet_seconds += time.perf_counter() - t1
+
+    metrics.add_stages({"scan": time.perf_counter() - t0 - snippet_seconds, "snippet": snippet_seconds})
+    metrics.count("pages_scanned", len(documents))
+    return result
+
+
+def extract_snippets(clean_text, matches, raw_keyword, default_len=60, logger=None, with_bounds=False):
+    """
+    依 match 起點 (遞增) 逐一擷取不重疊 snippet：每個 snippet 至少長度 default_len、
+    以關鍵字為中心，並補足被截斷的關鍵字尾部。raw_keyword 為去掉 '*' 的關鍵字。
+    with_bounds 為 True 時回傳 (snippets, [[snippet 起點, 終點], ...])。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    kw_len = len(raw_keyword)
+    text_len = len(clean_text)
+
+    # 不重疊 snippet 擷取
+    snippets: List[str] = []
+    bounds = []
+    next_search_pos = 0
+
+    for match_start in matches:
+        # 跳過已在先前 snippet 中的 match
+        if match_start < next_search_pos:
+            continue
+
+        # 詳細 log
+        logger.debug(f"search_with_wildcard: match_start={match_start}")
+
+        # 計算置中起點與結尾
+        center = match_start + kw_len // 2
+        half_len = default_len // 2
+        start = max(center - half_len, next_search_pos)
+        end = start + default_len
+        if end > text_len:
+            end = text_len
+            start = max(text_len - default_len, next_search_pos)
+
+        # 偵測並補足被截斷的關鍵字尾部
+        snippet = clean_text[start:end]
+        for i in range(1, kw_len):
+            if snippet.endswith(raw_keyword[:i]) and end + (kw_len - i) <= text_len:
+                end += (kw_len - i)
+                snippet = clean_text[start:end]
+                break
+
+        # Log 片段資訊
+        logger.debug(
+            f"snippet range: start={start}, end={end}, preview={snippet[:30]}…"
+        )
+
+        snippets.append(snippet)
+        bounds.append([start, end])
+        next_search_pos = end
+    if with_bounds:
+        return snippets, bounds
+    return snippets
+
+
+def match_hits(matches, keyword):
+    """
+    match 起點 (遞增) -> [[起點, 終點, ['*' 對應字元的位置, ...]], ...]。
+    每個 match 的長度固定 (每個 '*' 對應一個字)。
+    """
+    match_len = len(keyword)
+    wildcard_offsets = [i for i, ch in enumerate(keyword) if ch == "*"]
+    return [[start, start + match_len, [start + offset for offset in wildcard_offsets]] for start in matches]
+
+
+
+def search_in_documents(documents, keyword, logger=None, is_clean=False):
+    """
+    在已解析的文檔中搜尋關鍵字。回傳一個 dict，包含以下資訊：
+    - total: 總共找到幾次   
+    - pages: 包含每一頁找到幾次
+    - sentences: 包含每一頁找到的句子
+    若 is_clean 為 True，表示 documents 已是 load_epub(clean=True) 的清理後文字，不再重複清理。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    search_word = keyword.lower()
+    logger.debug(f"Search keyword: {search_word}")
+    result = {
+        "total": 0,
+        "pages": {},
+        "sentences": {}
+    }
+    t0 = time.perf_counter()
+    snippet_seconds = 0.0
+
+    # 遍历所有文档内容
+    for page_number, text in documents.items():
+        # 先將 text 中的特殊字元 (ex: \n, \t) 去除, 並將所有空格替換為空字串
+        if not is_clean:
+            text = clean_page_text(text)
+        else:
+            # 打包語料庫的頁面：關鍵字不在頁面中時不需解碼
+            text = page_text(text, search_word)
+            if text is None:
+                continue
+        # 统计关键字在当前文档中出现的次数
+        count = text.count(search_word)
+        if count > 0:
+            # 更新结果字典
+            result["total"] += count
+            result["pages"][page_number] = count
+            # 提取所有包含關鍵字的一段文字, 這段文字總長度是 60+關鍵字長度, 且關鍵字在中間, 兩邊各 30 個字元
+            # 需注意的是, 這段文字可能會跨行, 也可能包含多個相同關鍵字, 但是都需要分別列出
+            t1 = time.perf_counter()
+            keyword_sentences = [] # 用來存放包含關鍵字的句子
+            for match in re.finditer(search_word, text):
+                start = max(0, match.start() - 30)
+                end = min(len(text), match.end() + 30)
+                keyword_sentences.append(text[start:end])
+            result["sentences"][page_number] = keyword_sentences
+            snippet_seconds += time.perf_counter() - t1
+            logger.debug(f"Found {count} instances on page {page_number}")
+    metrics.add_stages({"scan": time.perf_counter() - t0 - snippet_seconds, "snippet": snippet_seconds})
+    metrics.count("pages_scanned", len(documents))
+    return result
+
+
+def search_one_epub(epub_path, keyword, logger=None, ignore_cache=False):
+    """
+    用關鍵字 keyword 去一個 epub 檔案 (epub_path) 中找尋包含此關鍵字的句子。
+    回傳一個 dict，包含以下資訊：
+    - total: 總共找到幾次   
+    - pages: 包含每一頁找到幾次
+    - sentences: 包含每一頁找到的句子
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    if ignore_cache:
+        documents = load_epub(epub_path, logger=logger, ignore_cache=True, clean=True)
+    else:
+        # 由行程內常駐的語料庫快取取得，避免每次 request 都重新讀取 pickle
+        documents = corpus_store.get_documents(epub_path, logger=logger)
+    metrics.count("books_scanned")
+    if documents is None:
+        return {
+            "total": 0,
+            "pages": {},
+            "sentences": {}
+        }
+    return search_in_documents(documents, keyword, logger, is_clean=True)
+
+
+def search_wildcard_one_epub(epub_path, keyword, logger=None, ignore_cache=False, pages=None, default_len=60,
+                             with_offsets=False):
+    """
+    用關鍵字 keyword 去一個 epub 檔案 (epub_path) 中找尋包含此關鍵字的句子。
+    若有指定 pages (頁面名稱集合)，則只搜尋這些頁面 (通常由 n-gram 索引篩選而來)。
+    with_offsets 見 search_with_wildcard_in_documents。
+    回傳一個 dict，包含以下資訊：
+    - total: 總共找到幾次   
+    - pages: 包含每一頁找到幾次
+    - sentences: 包含每一頁找到的句子
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    if ignore_cache:
+        documents = load_epub(epub_path, logger=logger, ignore_cache=True, clean=True)
+    else:
+        # 由行程內常駐的語料庫快取取得，避免每次 request 都重新讀取 pickle
+        documents = corpus_store.get_documents(epub_path, logger=logger)
+    metrics.count("books_scanned")
+    if documents is None:
+        return {
+            "total": 0,
+            "pages": {},
+            "sentences": {}
+        }
+    # --> for debugging
+    # logger.warning(f"Searching '{keyword}' in '{epub_path}'")
+    # if 'T1251' in epub_path:
+        # --> 將 documents 轉成 json 格式, 並寫入到 "D:\cbeta_v3\output\cache_by_words_test\T1251.json" 檔案中
+        # with open("D:\\cbeta_v3\\output\\cache_by_words_test\\T1251.json", "w", encoding="utf-8") as f:
+        #     json.dump(documents, f, ensure_ascii=False, indent=4)
+        # logger.warning(f"wrote the document to 'D:\\cbeta_v3\\output\\cache_by_words_test\\T1251.json'")
+    if pages is not None:
+        # 只保留候選頁面，並維持原本的頁面順序
+        documents = {page: text for page, text in documents.items() if page in pages}
+    return search_with_wildcard_in_documents(
+        documents, keyword, default_len=default_len, logger=logger, is_clean=True, with_offsets=with_offsets)
+
+
+def search_multiple_epubs(epub_paths, keyword, logger=None, ignore_cache=False, workers=None):
+    """
+    用一個關鍵字去多個 epub 檔案 (epub_paths) 中找尋包含這些關鍵字的句子。
+    回傳一個 dict，包含每個關鍵字在每個檔案代號中的搜尋結果, 例如:
+    {
+        "T0853": {
+            "total": 1,
+            "pages": {
+                "juans/002.xhtml": 1
+            },
+            "sentences": {
+                "juans/002.xhtml": [
+                    "..."
+                ]
+            }
+        },
+        "T0866": {
+            "total": 1,
+            "pages": {
+                "juans/001.xhtml": 1
+            },
+            "sentences": {
+                "juans/001.xhtml": [
+                    "..."
+                ]
+            }
+        },
+
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    if workers is None:
+        workers = SEARCH_WORKERS
+    if workers > 1:
+        jobs = [(epub_path, keyword, ignore_cache) for epub_path in epub_paths]
+        rets = _map_books(_search_one_job, jobs, workers)
+        return {
+            os.path.splitext(os.path.basename(epub_path))[0]: ret
+            for epub_path, ret in zip(epub_paths, rets)
+        }
+
+    results = {}
+    for epub_path in epub_paths:
+        # 提取檔名並去掉副檔名
+        base_name = os.path.splitext(os.path.basename(epub_path))[0]
+        logger.debug(f"Searching keyword in '{epub_path}'")        
+        results[base_name]  = search_one_epub(epub_path, keyword, logger, ignore_cache)
+    return results
+
+
+def iter_wildcard_multiple_epubs(epub_paths, keyword, logger=None, use_index=True, workers=None, default_len=60,
+                                 with_offsets=False):
+    """
+    與 search_wildcard_multiple_epubs 相同的搜尋，但每找到一本有結果的 epub 就立即產出 (經號, 結果)，
+    順序與 epub_paths 相同。可用於邊搜尋邊回傳結果 (串流)。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    # 以 n-gram 索引縮小搜尋範圍；None 表示無法縮小 (沒有索引或關鍵字無可用的字面片段)
+    candidates = None
+    if use_index:
+        index = ngram_index.get_index(logger=logger)
+        if index is not None:
+            with metrics.stage("index"):
+                candidates = ngram_index.candidate_pages(index, keyword, epub_paths)
+
+    if workers is None:
+        workers = SEARCH_WORKERS
+
+    jobs = []
+    for epub_path in epub_paths:
+        # 提取檔名並去掉副檔名
+        base_name = os.path.splitext(os.path.basename(epub_path))[0]
+        pages = None
+        if candidates is not None:
+            pages = candidates.get(base_name)
+            if pages is not None and not pages:
+                continue
+        jobs.append((base_name, epub_path, pages))
+
+    if workers > 1:
+        rets = _imap_books(
+            _search_wildcard_one_job,
+            [(epub_path, keyword, pages, default_len, with_offsets) for _, epub_path, pages in jobs],
+            workers,
+        )
+    else:
+        # logger.warning(f"Searching '{keyword}' in '{epub_path}'")    
+        rets = (
+            search_wildcard_one_epub(epub_path, keyword, logger=logger, ignore_cache=False, pages=pages,
+                                     default_len=default_len, with_offsets=with_offsets)
+            for _, epub_path, pages in jobs
+        )
+
+    for (base_name, _, _), ret in zip(jobs, rets):
+        if ret["total"] > 0:
+            yield base_name, ret
+
+
+def search_wildcard_multiple_epubs(epub_paths, keyword, logger=None, use_index=True, workers=None, default_len=60,
+                                   with_offsets=False):
+    """
+    用一個關鍵字去多個 epub 檔案 (epub_paths) 中找尋包含這些關鍵字的句子。
+    回傳一個 dict，包含每個關鍵字在每個檔案代號中的搜尋結果, 例如:
+    {
+        "T0853": {
+            "total": 1,
+            "pages": {
+                "juans/002.xhtml": 1
+            },
+            "sentences": {
+                "juans/002.xhtml": [
+                    "..."
+                ]
+            }
+        },
+        "T0866": {
+            "total": 1,
+            "pages": {
+                "juans/001.xhtml": 1
+            },
+            "sentences": {
+                "juans/001.xhtml": [
+                    "..."
+                ]
+            }
+        },
+
+    若 use_index 為 True 且磁碟上已有 n-gram 索引，會先用索引篩選出候選頁面，
+    完全沒有候選頁面的 epub 就不再載入與掃描。
+    workers > 1 時 (預設取自環境變數 SEARCH_WORKERS)，各本 epub 分散到 process pool 平行搜尋，
+    結果的內容與順序和逐本搜尋完全相同。
+    with_offsets 為 True 時每本另含 hits / bounds (見 search_with_wildcard_in_documents)。
+    """
+    return dict(iter_wildcard_multiple_epubs(
+        epub_paths, keyword, logger, use_index=use_index, workers=workers, default_len=default_len,
+        with_offsets=with_offsets))
+
+
+def compute_stat(results):
+    """
+    將多本 epub 的搜尋結果統計成 _stat_：
+    - found_epubs: 總共在幾個 epub 檔案中出現
+    - found_juans: 總共在幾卷經文中出現
+    - total: 總共出現幾次 (所有 epub 累計)
+    """
+    stat = {
+        "found_epubs": 0,
+        "found_juans": 0,
+        "total": 0
+    }
+    for epub_id in results:
+        if epub_id == '_stat_':
+            continue
+        if results[epub_id]["total"] > 0:
+            stat["found_epubs"] += 1
+            if results[epub_id].get("pages") and len(results[epub_id]["pages"]) > 0:
+                stat["found_juans"] += len(results[epub_id]["pages"])
+            stat["total"] += results[epub_id]["total"]
+    return stat
+
+
+def search_multiple_epubs_stat(epub_paths, keyword, logger=None, workers=None):
+    """
+    呼叫 search_multiple_epubs(), 並將結果統計成一個 dict, 包含以下資訊:
+    - found_epubs: 總共在幾個 epub 檔案中出現
+    - found_juans: 總共在幾卷經文中出現
+    - total: 總共出現幾次 (所有 epub 累計)
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    results = search_multiple_epubs(epub_paths, keyword, logger, workers=workers)
+
+    # 統計結果
+    results['_stat_'] = compute_stat(results)
+    return results
+
+
+def search_wildcard_multiple_epubs_stat(epub_paths, keyword, logger=None, use_index=True, workers=None, default_len=60,
+                                        with_offsets=False):
+    """
+    呼叫 search_multiple_epubs(), 並將結果統計成一個 dict, 包含以下資訊:
+    - found_epubs: 總共在幾個 epub 檔案中出現
+    - found_juans: 總共在幾卷經文中出現
+    - total: 總共出現幾次 (所有 epub 累計)
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    results = search_wildcard_multiple_epubs(
+        epub_paths, keyword, logger, use_index=use_index, workers=workers, default_len=default_len,
+        with_offsets=with_offsets)
+
+    # 統計結果
+    results['_stat_'] = compute_stat(results)
+    return results
+
@@ -0,0 +1,111 @@
+import os
+import re
+
+
+# 經號：字母 (藏經代號) + 數字 + 可選的字母後綴，例如 T0848、T0852a、T0864A
+BOOK_ID_PATTERN = re.compile(r"^([A-Za-z]+)(\d+)([A-Za-z]*)$")
+# 卷數條件：juans:3 (剛好 3 卷)、juans:1-3、juans:5- (5 卷以上)、juans:-2 (2 卷以下)
+JUANS_PATTERN = re.compile(r"^juans:(\d*)(-?)(\d*)$")
+
+
+def _split_id(book_id):
+    m = BOOK_ID_PATTERN.match(book_id)
+    if m is None:
+        return None
+    return m.group(1).upper(), int(m.group(2))
+
+
+def parse_scope(text):
+    """
+    解析搜尋範圍字串；以逗號 (或空白) 分隔多個條件：
+    - T0848          指定經號 (不分大小寫：t0848、T0852A 與 T0848、T0852a 相同)
+    - T09*           經號前綴
+    - T0848-T0900    經號範圍 (依藏經代號與數字比較，含兩端；T0852a 等分冊也包含在內)
+    - juans:1-3      卷數條件 (取自 titles.json 的卷數)；與經號條件同時使用時取交集
+    經號、前綴、範圍之間為聯集。回傳正規化的範圍 dict (可作為快取鍵的參數)，空字串回傳 None。
+    格式錯誤時 raise ValueError。
+    """
+    scope = {"ids": set(), "prefixes": set(), "ranges": set(), "juans": None}
+    for term in re.split(r"[,，\s]+", (text or "").strip()):
+        if not term:
+            continue
+        m = JUANS_PATTERN.match(term.lower())
+        if m is not None:
+            lo, dash, hi = m.groups()
+            if not lo and not hi:
+                raise ValueError(f"卷數條件格式不正確：{term}")
+            lo = int(lo) if lo else None
+            hi = int(hi) if hi else (None if dash else lo)
+            if lo is not None and hi is not None and lo > hi:
+                raise ValueError(f"卷數範圍不正確：{term}")
+            scope["juans"] = (lo, hi)
+        elif term.endswith("*"):
+            prefix = term[:-1]
+            if not prefix or "*" in prefix:
+                raise ValueError(f"經號前綴格式不正確：{term}")
+            scope["prefixes"].add(prefix.upper())
+        elif "-" in term:
+            lo, _, hi = term.partition("-")
+            lo_key, hi_key = _split_id(lo), _split_id(hi)
+            if lo_key is None or hi_key is None or lo_key[0] != hi_key[0] or lo_key[1] > hi_key[1]:
+                raise ValueError(f"經號範圍格式不正確：{term}")
+            scope["ranges"].add((lo_key[0], lo_key[1], hi_key[1]))
+        elif BOOK_ID_PATTERN.match(term):
+            # 經號不分大小寫 (epubs/ 中沒有只差在大小寫的經號)，統一轉成大寫後比對
+            scope["ids"].add(term.upper())
+        else:
+            raise ValueError(f"無法解析的搜尋範圍：{term}")
+
+    if not (scope["ids"] or scope["prefixes"] or scope["ranges"] or scope["juans"]):
+        return None
+    normalized = {}
+    if scope["ids"]:
+        normalized["ids"] = sorted(scope["ids"])
+    if scope["prefixes"]:
+        normalized["prefixes"] = sorted(scope["prefixes"])
+    if scope["ranges"]:
+        normalized["ranges"] = [list(r) for r in sorted(scope["ranges"])]
+    if scope["juans"]:
+        normalized["juans"] = list(scope["juans"])
+    return normalized
+
+
+def _juan_count(books_dict, book_id):
+    """titles.json 中每本的第一個欄位為卷數；無法取得時回傳 None。"""
+    value = books_dict.get(book_id)
+    if isinstance(value, list) and value:
+        try:
+            return int(value[0])
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def in_scope(scope, book_id, books_dict):
+    """判斷一本經是否在 parse_scope 的範圍內 (scope 為 None 表示全部)。"""
+    if scope is None:
+        return True
+    has_id_terms = "ids" in scope or "prefixes" in scope or "ranges" in scope
+    if has_id_terms:
+        upper_id = book_id.upper()
+        matched = upper_id in scope.get("ids", ()) or \
+            any(upper_id.startswith(p) for p in scope.get("prefixes", ()))
+        if not matched and scope.get("ranges"):
+            key = _split_id(book_id)
+            matched = key is not None and any(
+                key[0] == code and lo <= key[1] <= hi for code, lo, hi in scope["ranges"])
+        if not matched:
+            return False
+    if "juans" in scope:
+        lo, hi = scope["juans"]
+        count = _juan_count(books_dict, book_id)
+        if count is None or (lo is not None and count < lo) or (hi is not None and count > hi):
+            return False
+    return True
+
+
+def filter_epubs(epub_paths, scope, books_dict):
+    """只保留範圍內的 epub (順序不變)。"""
+    if scope is None:
+        return list(epub_paths)
+    return [p for p in epub_paths if in_scope(scope, os.path.splitext(os.path.basename(p))[0], books_dict)]
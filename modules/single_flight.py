@@ -0,0 +1,83 @@
+import os
+import threading
+
+
+# 等待者最多等待 leader 幾秒 (leader 卡住時不會讓所有相同查詢永遠等待)
+WAIT_TIMEOUT = float(os.environ.get("SINGLE_FLIGHT_TIMEOUT", "300"))
+
+
+class _Call:
+    """一次進行中的計算：完成後喚醒所有等待者。"""
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        """等待 leader 完成並回傳結果 (或 raise leader 的例外)；超過 timeout 秒時 raise TimeoutError。"""
+        if not self.event.wait(timeout):
+            raise TimeoutError("等待相同查詢的搜尋結果逾時")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    相同 key 的並行計算只執行一次 (single-flight)：
+    第一個呼叫者 (leader) 負責計算，同時間其他相同 key 的呼叫者等待並共用 leader 的結果。
+    只在同一個 process 內有效。等待者最多等待 timeout 秒 (預設 WAIT_TIMEOUT)。
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = WAIT_TIMEOUT if timeout is None else timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def begin(self, key):
+        """
+        登記 key 的計算。回傳 (call, is_leader)：
+        is_leader 為 True 時，呼叫端須計算並以 finish() 回報結果 (任何情況下都須呼叫，否則 key 不會釋放)；
+        否則呼叫 call.wait(self.timeout) 取得結果。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """由 leader 回報計算結果 (或例外)，並喚醒所有等待者。"""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.error = error
+        call.event.set()
+
+    def do(self, key, fn):
+        """
+        執行 fn() 並回傳 (結果, shared)；若相同 key 已在計算中，則等待並共用其結果 (shared 為 True)。
+        """
+        call, is_leader = self.begin(key)
+        if not is_leader:
+            return call.wait(self.timeout), True
+        result = error = None
+        try:
+            result = fn()
+        except BaseException as e:
+            # 包含 KeyboardInterrupt / SystemExit / gevent 的 Timeout 等：等待者同樣收到例外
+            error = e
+            raise
+        finally:
+            # 無論如何都釋放 key，之後相同的查詢才能重新計算
+            self.finish(key, call, result=result, error=error)
+        return result, False
+
+    def in_flight(self):
+        """目前進行中的 key 數量。"""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import pickle
+import logging
+
+
+# 模組與專案目錄設定
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(MODULE_DIR)
+TITLES_PATH = os.path.join(PROJECT_ROOT, "titles", "titles.json")
+# 預先編譯的書名表 (與 titles.json 同目錄)；格式改變時遞增版本
+COMPILED_NAME = "titles.pkl"
+COMPILED_VERSION = 1
+
+
+def compiled_path(titles_path=TITLES_PATH):
+    return os.path.join(os.path.dirname(titles_path), COMPILED_NAME)
+
+
+def parse_titles(full_data):
+    """
+    由 titles.json 的內容取得 {經號: [卷數, 書名]}：
+    外層只有一個 key (來源文件名稱) 且其值為 dict 時取其值，否則整個 dict 即為書名表。
+    格式錯誤時 raise ValueError。
+    """
+    if isinstance(full_data, dict) and full_data:
+        if len(full_data) == 1 and isinstance(list(full_data.values())[0], dict):
+            return list(full_data.values())[0]
+        return full_data
+    raise ValueError("titles.json 格式不正確")
+
+
+def compile_titles(titles_path=TITLES_PATH):
+    """
+    讀取 titles.json 並產生預先編譯的內容：
+    - books: {經號: [卷數, 書名]}
+    - body : /titles 回應的精簡 JSON bytes ({經號: [卷數, 書名]}，鍵排序)
+    """
+    with open(titles_path, "r", encoding="utf-8") as f:
+        books = parse_titles(json.load(f))
+    compact = {
+        key: [value[0], value[1]]
+        for key, value in books.items()
+        if isinstance(value, list) and len(value) >= 2
+    }
+    body = json.dumps(compact, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return {"version": COMPILED_VERSION, "books": books, "body": body}
+
+
+def write_compiled(titles_path=TITLES_PATH, logger=None):
+    """編譯 titles.json 並寫入 titles.pkl (先寫暫存檔再換上)，回傳編譯結果。"""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    compiled = compile_titles(titles_path)
+    path = compiled_path(titles_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logger.info(f"已更新書名表：{path}")
+    except OSError as e:
+        # 唯讀的佈署目錄等情況：只是下次啟動仍需重新編譯
+        logger.warning(f"書名表寫入失敗：{e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return compiled
+
+
+def load_titles(titles_path=TITLES_PATH, logger=None):
+    """
+    回傳 (書名表 {經號: [卷數, 書名]}, /titles 回應的 JSON bytes)。
+    titles.pkl 存在且不比 titles.json 舊時直接讀取 (不需解析 JSON 與判斷結構)，否則重新編譯並寫回。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    path = compiled_path(titles_path)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(titles_path):
+            with open(path, "rb") as f:
+                compiled = pickle.load(f)
+            if compiled.get("version") == COMPILED_VERSION:
+                return compiled["books"], compiled["body"]
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+        logger.debug(f"無法讀取預先編譯的書名表：{e}")
+    compiled = write_compiled(titles_path, logger)
+    return compiled["books"], compiled["body"]
+
+
+if __name__ == "__main__":
+    # 用法：python -m modules.title_map [titles.json 路徑]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    titles_path = sys.argv[1] if len(sys.argv) > 1 else TITLES_PATH
+    compiled = write_compiled(titles_path, logging.getLogger("title_map"))
+    print(f"{len(compiled['books'])} 本，/titles 回應 {len(compiled['body'])} bytes")
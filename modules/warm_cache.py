@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# 同時支援以套件 (modules.warm_cache) 或直接由 modules 目錄匯入
+if __package__:
+    from . import search_epub
+else:
+    import search_epub
+
+
+# 模組與專案目錄設定
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(MODULE_DIR)
+EPUB_DIR = os.path.join(PROJECT_ROOT, "epubs")
+# 平行處理的 process 數 (預設為 CPU 數)
+WARM_WORKERS = int(os.environ.get("WARM_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def _cache_mtime(epub_path):
+    epub_id = os.path.splitext(os.path.basename(epub_path))[0]
+    try:
+        return os.path.getmtime(os.path.join(search_epub.CACHE_DIR, f"{epub_id}.pkl"))
+    except OSError:
+        return None
+
+
+def _warm_one(job):
+    """
+    在 worker 中以 load_epub 建立一本 epub 的解析快取。
+    回傳 (經號, 耗時秒數, 頁數, 狀態)；狀態為 "written" (重新解析或升級後寫入)、"cached" (快取已是最新) 或 "error"。
+    """
+    epub_path, force = job
+    book_id = os.path.splitext(os.path.basename(epub_path))[0]
+    t0 = time.perf_counter()
+    before = _cache_mtime(epub_path)
+    try:
+        documents = search_epub.load_epub(epub_path, ignore_cache=force, clean=True)
+    except Exception:
+        documents = None
+    seconds = time.perf_counter() - t0
+    if documents is None:
+        return book_id, seconds, 0, "error"
+    status = "cached" if before is not None and _cache_mtime(epub_path) == before else "written"
+    return book_id, seconds, len(documents), status
+
+
+def warm(epub_paths, workers=None, force=False, logger=None):
+    """
+    平行預先解析所有 epub，建立 (或更新) modules/.cache_epub 的解析快取，之後的搜尋不需再解析 epub。
+    快取檔以暫存檔 + os.replace 寫入 (見 search_epub._write_epub_cache)，可與執行中的伺服器同時進行。
+    force 為 True 時忽略現有快取，全部重新解析。
+    回傳統計 dict (各狀態本數、總耗時、最慢的幾本)。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    if workers is None:
+        workers = WARM_WORKERS
+    t0 = time.time()
+    jobs = [(epub_path, force) for epub_path in epub_paths]
+    if workers <= 1 or len(jobs) <= 1:
+        results = map(_warm_one, jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_warm_one, jobs, chunksize=max(1, len(jobs) // (workers * 8)))
+
+    counts = {"written": 0, "cached": 0, "error": 0}
+    timings = []
+    try:
+        for book_id, seconds, pages, status in results:
+            counts[status] += 1
+            timings.append((seconds, book_id))
+            if status == "error":
+                logger.error(f"{book_id}：解析失敗")
+            else:
+                logger.info(f"{book_id}：{seconds:.3f} 秒，{pages} 頁，{status}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    timings.sort(reverse=True)
+    stats = dict(
+        counts,
+        books=len(jobs),
+        workers=workers,
+        seconds=round(time.time() - t0, 2),
+        slowest=[[book_id, round(seconds, 3)] for seconds, book_id in timings[:5]],
+    )
+    logger.info(f"解析快取預熱完成：{stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    # 用法：python -m modules.warm_cache [epub 目錄] [--workers N] [--force]
+    parser = argparse.ArgumentParser(description="平行預先解析所有 epub，建立解析快取")
+    parser.add_argument("epub_dir", nargs="?", default=EPUB_DIR, help="epub 目錄")
+    parser.add_argument("--workers", type=int, default=None, help="平行處理的 process 數")
+    parser.add_argument("--force", action="store_true", help="忽略現有快取，全部重新解析")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    epub_list = [os.path.join(args.epub_dir, fn) for fn in sorted(os.listdir(args.epub_dir)) if fn.endswith(".epub")]
+    stats = warm(epub_list, workers=args.workers, force=args.force, logger=logging.getLogger("warm_cache"))
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    sys.exit(1 if stats["error"] else 0)
@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# 同時支援以套件 (modules.words6_pipeline) 或直接由 modules 目錄匯入
+if __package__:
+    from . import multi_search, search_epub, result_transform
+    from .check_newer import check_newer
+    from .result_cache import ResultCache, make_key, normalize_query
+    from .search_words6 import collect_words6_terms
+else:
+    import multi_search
+    import search_epub
+    import result_transform
+    from check_newer import check_newer
+    from result_cache import ResultCache, make_key, normalize_query
+    from search_words6 import collect_words6_terms
+
+
+# 模組與專案目錄設定
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(MODULE_DIR)
+EPUB_DIR = os.path.join(PROJECT_ROOT, "epubs")
+CACHE_DIR = os.path.join(PROJECT_ROOT, "cache")
+TERMS_PATH = os.path.join(CACHE_DIR, "all_words.json")
+# 增量計算的中間狀態：每本經對所有名相的結果、上次處理的名相清單、check_newer 的檢查紀錄
+STATE_DIR = os.path.join(MODULE_DIR, ".cache_words6")
+# 寫入的快取須與 app.py 的 SEARCH_MODE / SEARCH_PARAMS 相同，app 才會使用
+SEARCH_MODE = "wildcard"
+SEARCH_PARAMS = {"default_len": 60}
+# 中間結果的格式版本：2 起每本經的結果含 match 位置 (hits / bounds)，寫入的快取含 paragraph_spans
+STATE_VERSION = 2
+# 平行處理的 worker 數 (預設為 CPU 數)
+PIPELINE_WORKERS = int(os.environ.get("WORDS6_WORKERS", "0")) or os.cpu_count() or 1
+
+# worker 行程內重複使用的自動機 (同一批名相只建立一次)
+_worker = {"terms": None, "automaton": None}
+
+
+def load_terms(terms_path, logger=None):
+    """
+    讀取名相清單：可以是字串 list (例如 cache/all_words.json)，
+    或 search_words6 使用的六詞表 dict (群首名相 -> 各分類字串)。
+    回傳正規化 (NFC) 後、不重複的名相 list。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    with open(terms_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = collect_words6_terms(data)
+    terms = {}
+    for term in data:
+        term = normalize_query(term)
+        if term:
+            terms[term] = None
+    logger.info(f"名相清單：{terms_path}，共 {len(terms)} 個")
+    return list(terms)
+
+
+def _book_id(epub_path):
+    return os.path.splitext(os.path.basename(epub_path))[0]
+
+
+def _book_state_path(state_dir, book_id):
+    return os.path.join(state_dir, "books", f"{book_id}.pkl")
+
+
+def _load_book_state(state_dir, book_id):
+    """讀取一本經的中間結果 {名相: 結果} (只保存有找到的名相)。"""
+    try:
+        with open(_book_state_path(state_dir, book_id), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+
+
+def _save_book_state(state_dir, book_id, found):
+    path = _book_state_path(state_dir, book_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(found, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _book_job(job):
+    """
+    在 worker 中以 multi_search 一次搜尋一本經的多個名相；只回傳有找到的名相。
+    與 app.run_search 相同附帶 match 位置，寫入快取的結果才有 paragraph_spans。
+    """
+    epub_path, terms, default_len = job
+    if _worker["terms"] != terms:
+        _worker["automaton"] = multi_search.prepare_terms(terms, mode=SEARCH_MODE)
+        _worker["terms"] = terms
+    found = multi_search.search_terms_one_epub(
+        epub_path, terms, automaton=_worker["automaton"], mode=SEARCH_MODE, default_len=default_len,
+        with_offsets=True)
+    return {term: result for term, result in found.items() if result["total"] > 0}
+
+
+def _run_jobs(jobs, workers, logger):
+    """依序回傳每個 job 的結果；workers > 1 時以 process pool 平行處理。"""
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield _book_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_book_job, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+
+
+def _check_changes(target_path, check_file, logger):
+    """
+    以 check_newer 找出 target_path 中變動的檔案。
+    檢查紀錄先寫到暫存檔，等整個流程成功後才以 _commit_check 換上，避免中途失敗時漏算變動。
+    """
+    tmp_file = check_file + ".pending"
+    if os.path.exists(check_file):
+        shutil.copyfile(check_file, tmp_file)
+    elif os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    files, changed = check_newer(target_path, tmp_file, logger=logger, fast=True)
+    return files, changed, tmp_file
+
+
+def _commit_check(check_file, tmp_file):
+    os.replace(tmp_file, check_file)
+
+
+def run_pipeline(terms_path=TERMS_PATH, epub_dir=EPUB_DIR, cache_dir=CACHE_DIR, state_dir=STATE_DIR,
+                 workers=None, full=False, logger=None):
+    """
+    以名相清單中的所有名相搜尋所有 epub，並把每個名相的結果寫入 app.py 使用的結果快取 (ResultCache)。
+    增量計算：以 check_newer 比對 epub 與名相清單，只重新搜尋變動的 epub (所有名相)
+    與新加入的名相 (所有 epub)；其餘 (經, 名相) 沿用上次的中間結果。
+    full 為 True 時忽略上次的中間結果，全部重新計算。
+    回傳統計 dict。
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    if workers is None:
+        workers = PIPELINE_WORKERS
+    t0 = time.time()
+    os.makedirs(state_dir, exist_ok=True)
+    state_path = os.path.join(state_dir, "state.json")
+    epub_check = os.path.join(state_dir, "epubs_check.json")
+    terms_check = os.path.join(state_dir, "terms_check.json")
+
+    state = {}
+    if not full and os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    if (state.get("mode") != SEARCH_MODE or state.get("params") != SEARCH_PARAMS
+            or state.get("version") != STATE_VERSION):
+        # 第一次執行、搜尋參數或中間結果的格式改變：全部重新計算
+        state = {}
+        for fn in (epub_check, terms_check):
+            if os.path.exists(fn):
+                os.remove(fn)
+
+    terms = load_terms(terms_path, logger=logger)
+    term_set = set(terms)
+    prev_terms = set(state.get("terms", []))
+    _, terms_changed, terms_tmp = _check_changes(os.path.abspath(terms_path), terms_check, logger)
+    new_terms = [t for t in terms if t not in prev_terms] if terms_changed or not state else []
+    removed_terms = prev_terms - term_set if terms_changed else set()
+
+    # epub 順序與 app.py 搜尋時相同 (os.listdir)
+    epub_paths = [os.path.join(epub_dir, fn) for fn in os.listdir(epub_dir) if fn.endswith(".epub")]
+    _, changed_files, epub_tmp = _check_changes(os.path.abspath(epub_dir), epub_check, logger)
+    changed_books = {_book_id(p) for p in changed_files if p.endswith(".epub")}
+    current_books = {_book_id(p) for p in epub_paths}
+    removed_books = set(state.get("books", [])) - current_books
+
+    jobs = []
+    job_books = []
+    for epub_path in epub_paths:
+        book_id = _book_id(epub_path)
+        if book_id in changed_books or not state:
+            jobs.append((epub_path, terms, SEARCH_PARAMS["default_len"]))
+        elif new_terms:
+            jobs.append((epub_path, new_terms, SEARCH_PARAMS["default_len"]))
+        else:
+            continue
+        job_books.append(book_id)
+    logger.info(f"變動的 epub：{len(changed_books)} 本，新增名相：{len(new_terms)} 個，"
+                f"移除名相：{len(removed_terms)} 個，需要搜尋：{len(jobs)} 本")
+
+    # 搜尋並更新每本經的中間結果，同時記錄結果有變動的名相
+    affected = set(new_terms)
+    for book_id, found in zip(job_books, _run_jobs(jobs, workers, logger)):
+        old = _load_book_state(state_dir, book_id)
+        if book_id in changed_books or not state:
+            merged = found
+            for term in set(old) | set(found):
+                if term in term_set and old.get(term) != found.get(term):
+                    affected.add(term)
+        else:
+            merged = {t: r for t, r in old.items() if t not in removed_terms}
+            merged.update(found)
+        _save_book_state(state_dir, book_id, merged)
+        logger.debug(f"已完成：{book_id}，找到 {len(found)} 個名相")
+    for book_id in removed_books:
+        old = _load_book_state(state_dir, book_id)
+        affected.update(t for t in old if t in term_set)
+        try:
+            os.remove(_book_state_path(state_dir, book_id))
+        except OSError:
+            pass
+    if removed_terms:
+        # 沒有重新搜尋的經，也要移除已刪除名相的中間結果
+        for book_id in current_books - set(job_books):
+            old = _load_book_state(state_dir, book_id)
+            if any(t in old for t in removed_terms):
+                _save_book_state(state_dir, book_id, {t: r for t, r in old.items() if t not in removed_terms})
+
+    # 彙整每個名相在所有經的結果，寫入結果快取
+    cache = ResultCache(cache_dir, epub_dir, logger=logger)
+    per_term = {term: {} for term in terms}
+    for epub_path in epub_paths:
+        book_id = _book_id(epub_path)
+        for term, result in _load_book_state(state_dir, book_id).items():
+            if term in per_term:
+                per_term[term][book_id] = result
+    written = refreshed = 0
+    for term in terms:
+        key = make_key(term, SEARCH_MODE, SEARCH_PARAMS)
+        # 結果沒有變動的名相只更新快取的語料庫指紋，不重寫檔案
+        if term not in affected and cache.refresh(key):
+            refreshed += 1
+            continue
+        results = per_term[term]
+        results["_stat_"] = search_epub.compute_stat(results)
+        results = result_transform.transform_results(results, term)
+        cache.put(key, results, term, SEARCH_MODE, SEARCH_PARAMS, fmt=result_transform.FORMAT, save=False)
+        written += 1
+    cache.flush()
+
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"mode": SEARCH_MODE, "params": SEARCH_PARAMS, "version": STATE_VERSION, "terms": terms,
+                   "books": sorted(current_books)}, f, ensure_ascii=False)
+    _commit_check(terms_check, terms_tmp)
+    _commit_check(epub_check, epub_tmp)
+
+    stats = {
+        "terms": len(terms),
+        "books_searched": len(jobs),
+        "new_terms": len(new_terms),
+        "written": written,
+        "refreshed": refreshed,
+        "seconds": round(time.time() - t0, 1),
+    }
+    logger.info(f"名相統計完成：{stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    # 用法：python -m modules.words6_pipeline [--terms 名相清單] [--epubs epub 目錄] [--cache cache 目錄] [--workers N] [--full]
+    parser = argparse.ArgumentParser(description="以名相清單搜尋所有 epub，增量更新搜尋結果快取")
+    parser.add_argument("--terms", default=TERMS_PATH, help="名相清單 (字串 list 或六詞表 dict 的 json 檔)")
+    parser.add_argument("--epubs", default=EPUB_DIR, help="epub 目錄")
+    parser.add_argument("--cache", default=CACHE_DIR, help="搜尋結果快取目錄")
+    parser.add_argument("--workers", type=int, default=None, help="平行處理的 worker 數")
+    parser.add_argument("--full", action="store_true", help="忽略上次的中間結果，全部重新計算")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    stats = run_pipeline(args.terms, args.epubs, args.cache, workers=args.workers, full=args.full,
+                         logger=logging.getLogger("words6_pipeline"))
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
@@ -0,0 +1,38 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+# 測試以 "from modules import ..." 匯入 (與 app.py 相同)，專案根目錄須在 sys.path 中
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+EPUB_DIR = os.path.join(PROJECT_ROOT, "epubs")
+# 測試用的小型 epub (各約 10 KB，解析只需幾毫秒)
+SMALL_BOOKS = ("T1034", "T1063", "T1259", "T1296")
+
+
+@pytest.fixture
+def epub_cache(tmp_path, monkeypatch):
+    """解析快取改寫到暫存目錄，測試不會改動 modules/.cache_epub。"""
+    from modules import search_epub
+
+    cache_dir = tmp_path / "cache_epub"
+    monkeypatch.setattr(search_epub, "CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture
+def epub_dir(tmp_path, epub_cache):
+    """複製 SMALL_BOOKS 到暫存目錄 (保留 mtime)，回傳目錄路徑；測試可任意修改其中的 epub。"""
+    target = tmp_path / "epubs"
+    target.mkdir()
+    for book_id in SMALL_BOOKS:
+        shutil.copy2(os.path.join(EPUB_DIR, f"{book_id}.epub"), target / f"{book_id}.epub")
+    return target
+
+
+def epub_paths(directory):
+    return sorted(os.path.join(directory, fn) for fn in os.listdir(directory) if fn.endswith(".epub"))
@@ -0,0 +1,183 @@
+import json
+import os
+
+import pytest
+
+from modules import ngram_index
+from modules.result_cache import ResultCache
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """import app 時結果快取與 log 改寫到暫存目錄 (app 在 import 時讀取環境變數)。"""
+    root = tmp_path_factory.mktemp("app")
+    overrides = {"RESULT_CACHE_DIR": str(root / "cache"), "APP_LOG_DIR": str(root / "logs")}
+    saved = {k: os.environ.get(k) for k in overrides}
+    os.environ.update(overrides)
+    try:
+        import app
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    return app
+
+
+@pytest.fixture
+def app(app_module, epub_dir, tmp_path, monkeypatch):
+    """只搜尋 SMALL_BOOKS (暫存複本)，每個測試使用空的結果快取，不使用 repo 中的 n-gram 索引。"""
+    monkeypatch.setattr(app_module, "EPUB_DIR", str(epub_dir))
+    monkeypatch.setattr(app_module, "result_cache", ResultCache(str(tmp_path / "cache"), str(epub_dir)))
+    monkeypatch.setattr(ngram_index, "get_index", lambda logger=None: None)
+    return app_module
+
+
+@pytest.fixture
+def client(app):
+    return app.app.test_client()
+
+
+def _post(client, path, **form):
+    response = client.post(path, data=form)
+    assert response.status_code == 200
+    return response
+
+
+def _paragraphs(client, **form):
+    return _post(client, "/search_paragraphs", **form).get_json()
+
+
+def _stream(client, **form):
+    response = _post(client, "/search_stream", **form)
+    assert response.mimetype == "application/x-ndjson"
+    body = response.get_data(as_text=True)
+    assert body.endswith("\n")
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_search_ajax_full(app, client):
+    data = _post(client, "/search_ajax", keyword="真言曰").get_json()["data"]
+    assert set(data) == {"T1259", "T1296"}
+    assert data["T1296"]["count"] == 14
+    assert data["T1296"]["book_key"] == "T1296"
+    assert all("真言曰" in p for p in data["T1296"]["paragraphs"])
+    # 第二次由快取 (預先壓縮的回應) 取得相同內容
+    assert _post(client, "/search_ajax", keyword="真言曰").get_json()["data"] == data
+    assert _post(client, "/search_ajax", keyword="").get_json() == {"error": "請輸入關鍵字"}
+
+
+def test_search_ajax_compact(app, client):
+    full = _post(client, "/search_ajax", keyword="印").get_json()["data"]
+    compact = _post(client, "/search_ajax", keyword="印", format="compact").get_json()
+    assert compact["format"] == "compact"
+    assert compact["fields"] == app.COMPACT_FIELDS
+    assert [row[0] for row in compact["data"]] == sorted(full)
+    for row in compact["data"]:
+        entry = dict(zip(compact["fields"], row))
+        expected = full[entry["book_key"]]
+        assert entry["count"] == expected["count"]
+        assert entry["paragraphs"] == expected["paragraphs"]
+        # pages 由 dict 改為 [[頁面名稱, 筆數], ...]
+        assert entry["pages"] == [[page, n] for page, n in expected["pages"].items()]
+
+    with_offsets = _post(client, "/search_ajax", keyword="印", format="compact", offsets="1").get_json()
+    assert with_offsets["fields"] == app.COMPACT_FIELDS + ["paragraph_spans"]
+    for row in with_offsets["data"]:
+        entry = dict(zip(with_offsets["fields"], row))
+        assert len(entry["paragraph_spans"]) == len(entry["paragraphs"])
+
+
+def test_search_summary(app, client):
+    full = _post(client, "/search_ajax", keyword="印").get_json()["data"]
+    summary = _post(client, "/search_summary", keyword="印").get_json()
+    assert set(summary["data"]) == set(full)
+    for key, entry in summary["data"].items():
+        assert "paragraphs" not in entry
+        assert entry["count"] == full[key]["count"]
+        assert entry["paragraph_count"] == len(full[key]["paragraphs"])
+    assert summary["stat"]["total"] == sum(entry["count"] for entry in full.values())
+
+    compact = _post(client, "/search_summary", keyword="印", format="compact").get_json()
+    assert compact["fields"] == app.COMPACT_SUMMARY_FIELDS
+    assert compact["stat"] == summary["stat"]
+    rows = {row[0]: dict(zip(compact["fields"], row)) for row in compact["data"]}
+    assert {k: v["paragraph_count"] for k, v in rows.items()} == \
+        {k: v["paragraph_count"] for k, v in summary["data"].items()}
+
+
+def test_search_paragraphs_cursor(app, client):
+    expected = _post(client, "/search_ajax", keyword="印").get_json()["data"]["T1296"]["paragraphs"]
+    assert len(expected) > 3
+    collected, offset, batches = [], 0, 0
+    while offset is not None:
+        batch = _paragraphs(client, keyword="印", book="T1296", offset=offset, limit=3)
+        assert batch["total"] == len(expected)
+        assert batch["offset"] == offset
+        assert len(batch["paragraphs"]) <= 3
+        collected.extend(batch["paragraphs"])
+        offset = batch["next_offset"]
+        batches += 1
+    assert collected == expected
+    assert batches == (len(expected) + 2) // 3
+
+    missing = _paragraphs(client, keyword="印", book="T0001", offsets="1")
+    assert missing["paragraphs"] == [] and missing["next_offset"] is None and missing["spans"] == []
+    assert "error" in _paragraphs(client, keyword="印", book="T1296", offset="x")
+
+
+def test_search_paragraphs_page_filter(app, client):
+    value = app.run_search("印")["T1296"]
+    pages = value["paragraph_pages"]
+    for page in dict.fromkeys(pages):
+        batch = _paragraphs(client, keyword="印", book="T1296", page=page, limit=500)
+        expected = [p for p, pg in zip(value["paragraphs"], pages) if pg == page]
+        assert batch["page"] == page
+        assert batch["paragraphs"] == expected
+        assert batch["total"] == len(expected)
+        assert batch["next_offset"] is None
+    assert _paragraphs(client, keyword="印", book="T1296", page="nonexistent.xhtml")["total"] == 0
+
+
+def test_search_paragraphs_spans(app, client):
+    for keyword in ("真言曰", "娑嚩訶"):
+        offset = 0
+        while offset is not None:
+            batch = _paragraphs(client, keyword=keyword, book="T1296", offset=offset, limit=4, offsets="1")
+            assert len(batch["spans"]) == len(batch["paragraphs"])
+            for paragraph, spans in zip(batch["paragraphs"], batch["spans"]):
+                assert spans
+                for s, e in spans:
+                    # 被 snippet 邊界截斷的 match 只保留落在段落內的部分
+                    if e - s == len(keyword):
+                        assert paragraph[s:e] == keyword
+                    else:
+                        assert s == 0 or e == len(paragraph)
+            offset = batch["next_offset"]
+    assert "spans" not in _paragraphs(client, keyword="真言曰", book="T1296")
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_search_stream_ndjson(app, client, cached, tmp_path, monkeypatch):
+    full = _post(client, "/search_ajax", keyword="印").get_json()["data"]
+    if not cached:
+        # 清空結果快取，由串流邊搜尋邊送出
+        monkeypatch.setattr(app, "result_cache", ResultCache(str(tmp_path / "stream"), app.EPUB_DIR))
+
+    lines = _stream(client, keyword="印")
+    assert [line["type"] for line in lines] == ["entry"] * len(full) + ["stat"]
+    assert {line["key"]: line["entry"] for line in lines[:-1]} == full
+    assert lines[-1]["stat"]["total"] == sum(entry["count"] for entry in full.values())
+
+    lines = _stream(client, keyword="印", format="compact", summary="1")
+    assert lines[0] == {"type": "fields", "fields": app.COMPACT_SUMMARY_FIELDS}
+    assert lines[-1]["type"] == "stat"
+    for line in lines[1:-1]:
+        entry = dict(zip(app.COMPACT_SUMMARY_FIELDS, line["row"]))
+        assert entry["book_key"] == line["key"]
+        assert entry["paragraph_count"] == len(full[line["key"]]["paragraphs"])
+
+    lines = _stream(client, keyword="印", format="compact", offsets="1")
+    assert lines[0]["fields"] == app.COMPACT_FIELDS + ["paragraph_spans"]
+    assert len(lines) == len(full) + 2
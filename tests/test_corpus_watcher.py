@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from modules import corpus_watcher
+from modules.result_cache import ResultCache
+
+
+@pytest.fixture
+def watch(tmp_path, epub_dir, monkeypatch):
+    # 不重建 repo 中已存在的 n-gram 索引 / 打包語料庫
+    monkeypatch.setattr(corpus_watcher, "rebuild_artifacts", lambda epub_dir, logger=None: None)
+    cache = ResultCache(str(tmp_path / "cache"), str(epub_dir), check_corpus=False)
+    check_file = str(tmp_path / "watch" / "epubs_check.json")
+    return cache, check_file
+
+
+def _touch(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_first_poll_only_records(watch, epub_dir):
+    cache, check_file = watch
+    stats = corpus_watcher.poll_once(cache, str(epub_dir), check_file)
+    assert stats["changed"] == 0
+    assert os.path.exists(check_file)
+    assert corpus_watcher.poll_once(cache, str(epub_dir), check_file)["changed"] == 0
+
+
+def test_failed_poll_is_retried(watch, epub_dir, monkeypatch):
+    cache, check_file = watch
+    corpus_watcher.poll_once(cache, str(epub_dir), check_file)
+    _touch(epub_dir / "T1296.epub")
+    os.remove(epub_dir / "T1034.epub")
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("update failed")
+
+    with monkeypatch.context() as m:
+        m.setattr(corpus_watcher, "update_results", fail)
+        with pytest.raises(RuntimeError):
+            corpus_watcher.poll_once(cache, str(epub_dir), check_file)
+    assert not os.path.exists(check_file + ".pending")
+
+    # 檢查紀錄沒有更新，下次檢查仍會處理同樣的變動
+    stats = corpus_watcher.poll_once(cache, str(epub_dir), check_file)
+    assert (stats["changed"], stats["removed"]) == (1, 1)
+    stats = corpus_watcher.poll_once(cache, str(epub_dir), check_file)
+    assert (stats["changed"], stats["removed"]) == (0, 0)
+
+
+@pytest.mark.parametrize("use_packed", [False, True])
+def test_packed_corpus_rebuilt_only_when_used(epub_dir, tmp_path, monkeypatch, use_packed):
+    corpus_path = tmp_path / "corpus.bin"
+    corpus_path.write_bytes(b"")
+    built = []
+    monkeypatch.setattr(corpus_watcher.ngram_index, "INDEX_PATH", str(tmp_path / "missing_index"))
+    monkeypatch.setattr(corpus_watcher.packed_corpus, "CORPUS_PATH", str(corpus_path))
+    monkeypatch.setattr(corpus_watcher.packed_corpus, "build_corpus",
+                        lambda epub_paths, logger=None: built.append(epub_paths))
+    monkeypatch.setattr(corpus_watcher.corpus_store, "USE_PACKED", use_packed)
+    corpus_watcher.rebuild_artifacts(str(epub_dir))
+    assert len(built) == (1 if use_packed else 0)
@@ -0,0 +1,33 @@
+import os
+import random
+
+import pytest
+
+from conftest import EPUB_DIR
+from modules import epub_text
+from modules.search_epub import clean_page_text
+
+# ebooklib + BeautifulSoup 為對照組 (requirements.txt 中有列出，沒有安裝時略過)
+pytest.importorskip("ebooklib")
+pytest.importorskip("bs4")
+
+# 抽樣比對的書本數 (完整比對見 python -m modules.epub_text --verify)
+SAMPLE_BOOKS = 12
+
+
+def _sample_epubs():
+    names = sorted(fn for fn in os.listdir(EPUB_DIR) if fn.endswith(".epub"))
+    # 固定種子，失敗時可重現；另外加入有分冊後綴 (T0852a 等) 的書
+    sample = set(random.Random(0).sample(names, min(SAMPLE_BOOKS, len(names))))
+    sample.update(fn for fn in names[:40] if not os.path.splitext(fn)[0][-1].isdigit())
+    return [os.path.join(EPUB_DIR, fn) for fn in sorted(sample)]
+
+
+@pytest.mark.parametrize("epub_path", _sample_epubs(), ids=lambda p: os.path.basename(p))
+def test_clean_text_matches_ebooklib(epub_path):
+    # 保證一致的是清理後的文字 (搜尋與解析快取使用的)；未清理的原始文字的空白可能不同
+    fast = epub_text.extract_documents(epub_path)
+    slow = epub_text.extract_documents_ebooklib(epub_path)
+    assert list(fast) == list(slow)
+    for page in slow:
+        assert clean_page_text(fast[page]) == clean_page_text(slow[page]), page
@@ -0,0 +1,45 @@
+import pytest
+
+from conftest import epub_paths
+from modules import multi_search, search_epub
+
+# 含重複 (大小寫)、regex 特殊字元 (literal 模式改為個別搜尋)、萬用字元與找不到的詞
+TERMS = ["真言曰", "娑嚩訶", "娑", "中節", "印", "(余何反)", "何反", "Unicode", "unicode", "oṃ",
+         "唵*", "*娑嚩訶", "印**中節", "不存在的詞", "真言曰"]
+
+
+@pytest.fixture
+def documents(epub_dir):
+    return {path: search_epub.load_epub(path, clean=True) for path in epub_paths(epub_dir)}
+
+
+def test_literal_mode_matches_per_term_search(documents):
+    for docs in documents.values():
+        found = multi_search.search_terms_in_documents(docs, TERMS, is_clean=True, mode="literal")
+        for term in TERMS:
+            assert found[term] == search_epub.search_in_documents(docs, term, is_clean=True), term
+
+
+@pytest.mark.parametrize("with_offsets", [False, True])
+def test_wildcard_mode_matches_per_term_search(documents, with_offsets):
+    automaton = multi_search.prepare_terms(TERMS, mode="wildcard")
+    for docs in documents.values():
+        found = multi_search.search_terms_in_documents(docs, TERMS, is_clean=True, automaton=automaton,
+                                                       with_offsets=with_offsets)
+        for term in TERMS:
+            expected = search_epub.search_with_wildcard_in_documents(docs, term, is_clean=True,
+                                                                     with_offsets=with_offsets)
+            assert found[term] == expected, term
+
+
+def test_one_epub_matches_per_term_search(epub_dir):
+    for path in epub_paths(epub_dir):
+        found = multi_search.search_terms_one_epub(path, TERMS, mode="wildcard", with_offsets=True)
+        for term in TERMS:
+            assert found[term] == search_epub.search_wildcard_one_epub(path, term, with_offsets=True), term
+
+
+def test_overlapping_terms_are_counted_like_str_count():
+    docs = {"p.xhtml": "娑娑娑娑嚩訶娑嚩"}
+    found = multi_search.search_terms_in_documents(docs, ["娑娑", "娑嚩", "娑"], is_clean=True, mode="wildcard")
+    assert [found[t]["total"] for t in ("娑娑", "娑嚩", "娑")] == [2, 2, 5]
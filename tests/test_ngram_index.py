@@ -0,0 +1,54 @@
+import os
+import shutil
+
+from conftest import epub_paths
+from modules import ngram_index, search_epub
+
+KEYWORDS = ["真言曰", "何反", "娑嚩訶", "*娑嚩訶", "真言*", "中節", "印**中節", "不存在的詞"]
+
+
+def _pages_with_matches(paths, keyword):
+    found = {}
+    for path in paths:
+        book_id = os.path.splitext(os.path.basename(path))[0]
+        result = search_epub.search_wildcard_one_epub(path, keyword, ignore_cache=True)
+        found[book_id] = set(result["pages"])
+    return found
+
+
+def test_candidate_pages_cover_all_matches(tmp_path, epub_dir):
+    paths = epub_paths(epub_dir)
+    index = ngram_index.build_index(paths, index_path=str(tmp_path / "index.pkl"))
+    for keyword in KEYWORDS:
+        candidates = ngram_index.candidate_pages(index, keyword, paths)
+        for book_id, pages in _pages_with_matches(paths, keyword).items():
+            assert candidates[book_id] is not None
+            assert pages <= candidates[book_id], (keyword, book_id)
+    # 沒有長度 >= NGRAM_SIZE 的字面片段時無法縮小範圍
+    assert ngram_index.candidate_pages(index, "唵*", paths) is None
+    assert ngram_index.candidate_pages(index, "*印", paths) is None
+
+
+def test_changed_epub_falls_back_to_full_scan(tmp_path, epub_dir, monkeypatch):
+    paths = epub_paths(epub_dir)
+    index = ngram_index.build_index(paths, index_path=str(tmp_path / "index.pkl"))
+    monkeypatch.setattr(ngram_index, "get_index", lambda logger=None: index)
+    changed, other = paths[0], paths[-1]
+    # 以另一本書的內容取代 (大小與 mtime 都改變)：索引對這本書已過期
+    shutil.copyfile(other, changed)
+    candidates = ngram_index.candidate_pages(index, "真言曰", paths)
+    assert candidates[os.path.splitext(os.path.basename(changed))[0]] is None
+    assert candidates[os.path.splitext(os.path.basename(other))[0]] is not None
+    # 過期的書整本掃描：使用索引的搜尋結果與不使用索引時相同
+    for keyword in KEYWORDS:
+        assert search_epub.search_wildcard_multiple_epubs_stat(paths, keyword, use_index=True) == \
+            search_epub.search_wildcard_multiple_epubs_stat(paths, keyword, use_index=False)
+    assert search_epub.search_wildcard_multiple_epubs_stat(paths, "真言曰")[
+        os.path.splitext(os.path.basename(changed))[0]]["total"] > 0
+
+
+def test_missing_book_is_scanned(tmp_path, epub_dir):
+    paths = epub_paths(epub_dir)
+    index = ngram_index.build_index(paths[:-1], index_path=str(tmp_path / "index.pkl"))
+    candidates = ngram_index.candidate_pages(index, "真言曰", paths)
+    assert candidates[os.path.splitext(os.path.basename(paths[-1]))[0]] is None
@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from modules import result_cache
+from modules.result_cache import ResultCache, make_key
+
+PARAMS = {"default_len": 60}
+
+
+def _results(book_id="T1034", total=1):
+    return {book_id: {"total": total, "pages": {"p1.xhtml": total}, "sentences": {"p1.xhtml": ["句子"] * total}},
+            "_stat_": {"total": total}}
+
+
+def _put(cache, keyword, **kwargs):
+    key = make_key(keyword, "wildcard", PARAMS)
+    cache.put(key, _results(**kwargs), keyword, "wildcard", PARAMS)
+    return key
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def test_entries_are_visible_across_instances(cache_dir, epub_dir):
+    a = ResultCache(cache_dir, str(epub_dir))
+    b = ResultCache(cache_dir, str(epub_dir))
+    k1 = _put(a, "真言曰")
+    k2 = _put(b, "娑嚩訶")
+    assert b.get(k1) == _results()
+    assert a.get(k2) == _results()
+    # 最後寫回中繼資料的行程不會蓋掉另一個行程的登記
+    a.flush()
+    b.flush()
+    with open(os.path.join(cache_dir, result_cache.MANIFEST_NAME), "r", encoding="utf-8") as f:
+        assert {k1, k2} <= set(json.load(f)["entries"])
+    assert {k1, k2} <= set(ResultCache(cache_dir, str(epub_dir)).keys())
+
+
+def test_eviction_is_shared(cache_dir, epub_dir):
+    a = ResultCache(cache_dir, str(epub_dir), max_entries=2)
+    b = ResultCache(cache_dir, str(epub_dir), max_entries=2)
+    keys = [_put(a, keyword) for keyword in ("一", "二", "三")]
+    assert a.stats()["evictions"] == 1
+    assert not os.path.exists(a.path_for(keys[0]))
+    assert b.get(keys[0]) is None
+    assert b.get(keys[1]) is not None and b.get(keys[2]) is not None
+
+
+def test_stale_entry_is_not_deleted_by_readers(cache_dir, epub_dir):
+    writer = ResultCache(cache_dir, str(epub_dir))
+    key = _put(writer, "真言曰")
+    path = os.path.join(epub_dir, "T1034.epub")
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+    reader = ResultCache(cache_dir, str(epub_dir))
+    assert reader.get(key) is None
+    assert reader.stats()["stale"] == 1
+    # 過期只當作查不到：結果檔仍在，由寫入端 (或 corpus_watcher) 更新
+    assert os.path.exists(reader.path_for(key))
+
+
+def test_response_is_tied_to_result_generation(cache_dir, epub_dir):
+    a = ResultCache(cache_dir, str(epub_dir))
+    b = ResultCache(cache_dir, str(epub_dir))
+    key = _put(a, "真言曰", total=1)
+    generation = b.get_entry(key)["generation"]
+    assert generation is not None
+    # b 讀到 R1 後，a (另一個行程或 corpus_watcher) 寫入 R2：由 R1 產生的回應不儲存
+    r2 = a.put(key, _results(total=2), "真言曰", "wildcard", PARAMS)
+    assert r2 != generation
+    assert b.put_response(key, "full", "gzip", b"R1", generation) is False
+    assert a.get_response(key, "full", "gzip") is None
+    assert b.put_response(key, "full", "gzip", b"R2", b.get_entry(key)["generation"]) is True
+    assert a.get_response(key, "full", "gzip") == b"R2"
+    # 不知道這個回應檔的行程改寫結果：回應檔仍在，而且比結果檔新，但記錄的世代不同，不再使用
+    c = ResultCache(cache_dir, str(epub_dir))
+    c.put(key, _results(total=3), "真言曰", "wildcard", PARAMS)
+    response_path = os.path.join(cache_dir, f"{key}.full.gz")
+    assert os.path.exists(response_path)
+    future = os.stat(a.path_for(key)).st_mtime_ns + 10 ** 9
+    os.utime(response_path, ns=(future, future))
+    assert a.get_response(key, "full", "gzip") is None
+    assert b.get_response(key, "full", "gzip") is None
+
+
+def test_legacy_file_is_read_only(cache_dir, epub_dir):
+    os.makedirs(cache_dir)
+    legacy_path = os.path.join(cache_dir, result_cache.legacy_name("如*佛") + ".json")
+    with open(legacy_path, "w", encoding="utf-8") as f:
+        json.dump(_results(), f, ensure_ascii=False)
+    before = os.stat(legacy_path)
+    cache = ResultCache(cache_dir, str(epub_dir))
+    key = make_key("如*佛", result_cache.LEGACY_MODE, result_cache.LEGACY_PARAMS)
+    assert key in cache.keys()
+    entry = cache.get_entry(key)
+    assert entry["format"] == "raw" and entry["keyword"] == "如*佛" and entry["result"] == _results()
+    after = os.stat(legacy_path)
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+
+
+def test_read_only_cache_writes_nothing(cache_dir, epub_dir):
+    key = _put(ResultCache(cache_dir, str(epub_dir)), "真言曰")
+    os.remove(os.path.join(cache_dir, result_cache.MANIFEST_NAME))
+    names = sorted(os.listdir(cache_dir))
+    cache = ResultCache(cache_dir, str(epub_dir), read_only=True)
+    assert cache.get(key) == _results()
+    assert cache.put_response(key, "full", "gzip", b"data", cache.get_entry(key)["generation"]) is False
+    with pytest.raises(PermissionError):
+        _put(cache, "娑嚩訶")
+    cache.flush()
+    assert sorted(os.listdir(cache_dir)) == names
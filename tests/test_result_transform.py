@@ -0,0 +1,90 @@
+import os
+import random
+
+import pytest
+
+from modules import result_transform, search_epub
+from conftest import EPUB_DIR
+
+ALPHABET = "佛法僧如來金剛aZ1，。"
+
+
+def _value(pages, keyword):
+    """以每頁的文字建立只有一個 snippet (整頁) 的原始搜尋結果，hits 由關鍵字的位置計算。"""
+    value = {"total": 0, "pages": {}, "sentences": {}, "hits": {}, "bounds": {}}
+    pattern = search_epub.compile_wildcard_pattern(keyword)
+    for page, text in pages.items():
+        starts = [m.start() for m in pattern.finditer(text)]
+        value["total"] += len(starts)
+        value["pages"][page] = len(starts)
+        value["sentences"][page] = [text]
+        value["hits"][page] = search_epub.match_hits(starts, keyword)
+        value["bounds"][page] = [[0, len(text)]]
+    return value
+
+
+def test_snippet_spans_clip_matches_at_boundaries():
+    hits = [[1, 3, []], [3, 7, []], [12, 14, []]]
+    bounds = [[0, 5], [5, 10], [10, 20]]
+    assert result_transform.snippet_spans(hits, bounds) == [[[1, 3], [3, 5]], [[0, 2]], [[2, 4]]]
+
+
+def test_shift_spans_drops_trimmed_matches():
+    assert result_transform._shift_spans([[0, 2], [3, 5]], 0) == [[0, 2], [3, 5]]
+    assert result_transform._shift_spans([[0, 2], [3, 5], [6, 8]], 4) == [[0, 1], [2, 4]]
+
+
+def test_spans_follow_overlap_trim():
+    value = _value({"p1.xhtml": "佛甲乙丙丁", "p2.xhtml": "丙丁佛戊佛"}, "佛")
+    book = result_transform.transform_book(value, "佛")
+    # 第二段開頭 "丙丁" 與前一段結尾重疊而被去除，高亮範圍隨之平移
+    assert book["paragraphs"] == ["佛甲乙丙丁", "佛戊佛"]
+    assert book["paragraph_pages"] == ["p1.xhtml", "p2.xhtml"]
+    assert book["paragraph_spans"] == [[[0, 1]], [[0, 1], [2, 3]]]
+    for paragraph, spans in zip(book["paragraphs"], book["paragraph_spans"]):
+        assert all(paragraph[s:e] == "佛" for s, e in spans)
+
+
+def test_wildcard_keyword_skips_trim():
+    value = _value({"p1.xhtml": "佛甲乙丙丁", "p2.xhtml": "丙丁佛戊佛己"}, "佛*")
+    book = result_transform.transform_book(value, "佛*")
+    # 含 '*' 的關鍵字不會字面出現在段落中，與沒有位置資訊時 (p.count) 相同，不去除重疊
+    assert book["paragraphs"] == ["佛甲乙丙丁", "丙丁佛戊佛己"]
+    assert book["paragraph_spans"] == [[[0, 2]], [[2, 4], [4, 6]]]
+    plain = {k: v for k, v in value.items() if k not in ("hits", "bounds")}
+    assert result_transform.transform_book(plain, "佛*")["paragraphs"] == book["paragraphs"]
+
+
+def _check_spans(book, keyword):
+    pattern = search_epub.compile_wildcard_pattern(keyword)
+    assert len(book["paragraph_spans"]) == len(book["paragraphs"])
+    for paragraph, spans in zip(book["paragraphs"], book["paragraph_spans"]):
+        for s, e in spans:
+            assert 0 <= s < e <= len(paragraph)
+            segment = paragraph[s:e]
+            if e - s == len(keyword):
+                assert pattern.fullmatch(segment), (paragraph, s, e)
+            else:
+                # 被 snippet 邊界截斷的 match 只保留落在段落內的部分
+                assert s == 0 or e == len(paragraph)
+
+
+@pytest.mark.parametrize("keyword", ["佛", "如來", "佛佛", "如*佛", "佛*", "*如來"])
+def test_spans_slice_keyword_random_text(keyword):
+    rng = random.Random(keyword)
+    documents = {f"p{i}.xhtml": "".join(rng.choice(ALPHABET) for _ in range(300)) for i in range(5)}
+    value = search_epub.search_with_wildcard_in_documents(documents, keyword, default_len=8, is_clean=True,
+                                                          with_offsets=True)
+    book = result_transform.transform_book(value, keyword)
+    _check_spans(book, keyword)
+    plain = {k: v for k, v in value.items() if k not in ("hits", "bounds")}
+    assert result_transform.transform_book(plain, keyword)["paragraphs"] == book["paragraphs"]
+
+
+@pytest.mark.parametrize("keyword", ["真言曰", "娑嚩訶", "中節"])
+def test_spans_slice_keyword_in_epub(keyword, epub_cache):
+    documents = search_epub.load_epub(os.path.join(EPUB_DIR, "T1296.epub"), clean=True)
+    value = search_epub.search_with_wildcard_in_documents(documents, keyword, is_clean=True, with_offsets=True)
+    book = result_transform.transform_book(value, keyword)
+    _check_spans(book, keyword)
+    assert sum(len(spans) for spans in book["paragraph_spans"]) >= 1
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from modules import search_epub
+
+# 隨機文字使用的字元：少量漢字 (讓 match 夠多、含重疊)、非漢字與標點
+ALPHABET = "佛法僧如來金剛aZ1，。(*"
+KEYWORDS = ["佛", "如來", "*佛", "佛*", "如*佛", "*如來**", "金**法", "佛佛", "**佛*佛", "a*", "(*", "。*。"]
+
+
+def _regex_starts(keyword, text):
+    return [m.start() for m in search_epub.compile_wildcard_pattern(keyword).finditer(text)]
+
+
+def test_plan_wildcard_splits_literals():
+    plan = search_epub.plan_wildcard("*金剛**")
+    assert plan["anchor"] == (1, "金剛")
+    assert plan["literals"] == []
+    assert plan["wildcards"] == [0, 3, 4]
+    assert plan["length"] == 5
+    assert search_epub.plan_wildcard("**") is None
+
+
+@pytest.mark.parametrize("keyword", KEYWORDS)
+def test_wildcard_planner_matches_regex(keyword):
+    rng = random.Random(keyword)
+    plan = search_epub.plan_wildcard(keyword)
+    for _ in range(200):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 40)))
+        assert search_epub.find_wildcard_matches(text, plan) == _regex_starts(keyword, text), text
+
+
+def test_wildcard_search_in_documents_matches_regex():
+    rng = random.Random(0)
+    documents = {f"p{i}.xhtml": "".join(rng.choice(ALPHABET) for _ in range(300)) for i in range(5)}
+    for keyword in KEYWORDS + ["**"]:
+        result = search_epub.search_with_wildcard_in_documents(documents, keyword, is_clean=True)
+        expected = {page: len(_regex_starts(keyword, text)) for page, text in documents.items()}
+        assert result["pages"] == {page: n for page, n in expected.items() if n}
+        assert result["total"] == sum(expected.values())
+
+
+def test_offsets_do_not_change_results():
+    rng = random.Random(1)
+    documents = {f"p{i}.xhtml": "".join(rng.choice(ALPHABET) for _ in range(300)) for i in range(5)}
+    for keyword in KEYWORDS:
+        plain = search_epub.search_with_wildcard_in_documents(documents, keyword, is_clean=True)
+        with_offsets = search_epub.search_with_wildcard_in_documents(documents, keyword, is_clean=True,
+                                                                     with_offsets=True)
+        assert {k: with_offsets[k] for k in plain} == plain
+        for page, starts in with_offsets["hits"].items():
+            assert len(starts) == plain["pages"][page]
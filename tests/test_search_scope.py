@@ -0,0 +1,53 @@
+import pytest
+
+from modules import search_scope
+
+BOOKS = {"T0848": ["7", "大毘盧遮那成佛神變加持經"], "T0852a": ["1", "分冊"], "T0852b": ["2", "分冊"],
+         "T0864A": ["1", "分冊"], "T0900": ["3", "範圍"], "T1034": ["1", "小"], "X0001": ["10", "續藏"]}
+
+
+def _selected(text):
+    scope = search_scope.parse_scope(text)
+    return sorted(book_id for book_id in BOOKS if search_scope.in_scope(scope, book_id, BOOKS))
+
+
+def test_empty_scope_is_none():
+    assert search_scope.parse_scope("") is None
+    assert search_scope.parse_scope(" ,， ") is None
+    assert _selected("") == sorted(BOOKS)
+
+
+def test_normalized_scope():
+    assert search_scope.parse_scope("t0848，T08* t0848-T0900 juans:1-3") == {
+        "ids": ["T0848"], "prefixes": ["T08"], "ranges": [["T", 848, 900]], "juans": [1, 3]}
+    # 大小寫、順序與重複不影響結果 (快取鍵相同)
+    assert search_scope.parse_scope("T0852A, t0848, T0848") == search_scope.parse_scope("t0848 t0852a")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("T0848", ["T0848"]),
+    ("t0848", ["T0848"]),
+    ("T0852A", ["T0852a"]),
+    ("t08*", ["T0848", "T0852a", "T0852b", "T0864A"]),
+    ("T0849-T0900", ["T0852a", "T0852b", "T0864A", "T0900"]),
+    ("T0848, X*", ["T0848", "X0001"]),
+    ("juans:1", ["T0852a", "T0864A", "T1034"]),
+    ("juans:5-", ["T0848", "X0001"]),
+    ("juans:-2", ["T0852a", "T0852b", "T0864A", "T1034"]),
+    ("T08* juans:2-3", ["T0852b"]),
+])
+def test_in_scope(text, expected):
+    assert _selected(text) == expected
+
+
+@pytest.mark.parametrize("text", ["juans:", "juans:3-1", "*", "T0*8*", "T0900-T0848", "T0848-X0900", "金剛", "T08-"])
+def test_malformed_scope_raises(text):
+    with pytest.raises(ValueError):
+        search_scope.parse_scope(text)
+
+
+def test_filter_epubs_keeps_order():
+    paths = ["/e/T1034.epub", "/e/T0848.epub", "/e/X0001.epub"]
+    assert search_scope.filter_epubs(paths, search_scope.parse_scope("T1034, x0001"), BOOKS) == \
+        ["/e/T1034.epub", "/e/X0001.epub"]
+    assert search_scope.filter_epubs(paths, None, BOOKS) == paths
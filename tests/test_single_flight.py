@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+from modules.single_flight import SingleFlight
+
+FOLLOWERS = 8
+
+
+class CountingFlight(SingleFlight):
+    """記錄加入等待的呼叫者數，讓測試確定所有 follower 都已登記後才讓 leader 完成。"""
+
+    def __init__(self):
+        super().__init__()
+        self.waiting = threading.Semaphore(0)
+
+    def begin(self, key):
+        call, is_leader = super().begin(key)
+        if not is_leader:
+            self.waiting.release()
+        return call, is_leader
+
+
+def test_concurrent_calls_share_one_computation():
+    flights = CountingFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    results = []
+    lock = threading.Lock()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"total": 3}
+
+    def worker():
+        value = flights.do("k", compute)
+        with lock:
+            results.append(value)
+
+    leader = threading.Thread(target=worker)
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=worker) for _ in range(FOLLOWERS)]
+    for t in followers:
+        t.start()
+    for _ in range(FOLLOWERS):
+        assert flights.waiting.acquire(timeout=5)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+    assert len(calls) == 1
+    assert [r for r, _ in results] == [{"total": 3}] * (FOLLOWERS + 1)
+    assert sum(1 for _, shared in results if not shared) == 1
+    assert flights.in_flight() == 0
+
+
+def test_error_is_shared_and_key_is_released():
+    flights = SingleFlight()
+    call, is_leader = flights.begin("k")
+    assert is_leader
+    follower, is_leader = flights.begin("k")
+    assert follower is call and not is_leader
+    flights.finish("k", call, error=ValueError("失敗"))
+    with pytest.raises(ValueError):
+        follower.wait()
+    # 完成後相同 key 重新計算
+    assert flights.do("k", lambda: 1) == (1, False)
+
+
+def test_different_keys_do_not_wait():
+    flights = SingleFlight()
+    call, _ = flights.begin("a")
+    assert flights.do("b", lambda: 2) == (2, False)
+    assert flights.in_flight() == 1
+    flights.finish("a", call, result=1)
+    assert call.wait() == 1
+
+
+class Interrupted(BaseException):
+    """模擬 KeyboardInterrupt / gevent Timeout 等不是 Exception 子類別的例外。"""
+
+
+def test_base_exception_releases_key():
+    flights = SingleFlight()
+
+    def interrupted():
+        raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        flights.do("k", interrupted)
+    assert flights.in_flight() == 0
+    assert flights.do("k", lambda: 1) == (1, False)
+
+
+def test_base_exception_reaches_waiters():
+    flights = SingleFlight()
+    call, _ = flights.begin("k")
+    follower, is_leader = flights.begin("k")
+    assert not is_leader
+    flights.finish("k", call, error=Interrupted())
+    with pytest.raises(Interrupted):
+        follower.wait(1)
+
+
+def test_wait_times_out():
+    flights = SingleFlight(timeout=0.05)
+    flights.begin("k")
+    with pytest.raises(TimeoutError):
+        flights.do("k", lambda: 1)